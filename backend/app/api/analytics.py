@@ -1,34 +1,33 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database.database import get_db
-from app.database import models
+from app.database import crud, models
 from app.schemas.analytics import UserAnalytics, SystemAnalytics
-from app.api.deps import get_current_user
-from app.database.models import User
+from app.api.deps import Identity, get_current_identity
 
 router = APIRouter()
 
 @router.get("/analytics/user")
-def user_analytics(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def user_analytics(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     user_email = current_user.email
 
-    total_emails = db.query(models.Email).filter(models.Email.user_email == user_email).count()
+    total_emails = db.query(models.Email).filter(crud.visible_emails(user_email)).count()
 
     total_attachments = (
         db.query(models.EmailAttachment)
         .join(models.Email, models.Email.email_id == models.EmailAttachment.email_id)
-        .filter(models.Email.user_email == user_email)
+        .filter(crud.visible_emails(user_email))
         .count()
     )
 
     # Priority Distribution
-    priorities = db.query(models.Email.priority).filter(models.Email.user_email == user_email).all()
+    priorities = db.query(models.Email.priority).filter(crud.visible_emails(user_email)).all()
     priority_count = {}
     for (p,) in priorities:
         priority_count[p] = priority_count.get(p, 0) + 1
 
     # Category Distribution
-    categories = db.query(models.Email.category).filter(models.Email.user_email == user_email).all()
+    categories = db.query(models.Email.category).filter(crud.visible_emails(user_email)).all()
     category_count = {}
     for (c,) in categories:
         category_count[c] = category_count.get(c, 0) + 1
@@ -36,13 +35,13 @@ def user_analytics(current_user: User = Depends(get_current_user), db: Session =
     # Total threads
     thread_count = (
         db.query(models.Email.thread_id)
-        .filter(models.Email.user_email == user_email)
+        .filter(crud.visible_emails(user_email))
         .distinct()
         .count()
     )
 
     # Average summary length
-    summaries = db.query(models.Email.summary).filter(models.Email.user_email == user_email).all()
+    summaries = db.query(models.Email.summary).filter(crud.visible_emails(user_email)).all()
     if summaries:
         # Filter out None summaries
         valid_summaries = [s[0] for s in summaries if s[0]]
@@ -56,7 +55,7 @@ def user_analytics(current_user: User = Depends(get_current_user), db: Session =
     # Activity timeline (emails/day)
     activity = (
         db.query(models.Email.timestamp)
-        .filter(models.Email.user_email == user_email)
+        .filter(crud.visible_emails(user_email))
         .all()
     )
 
@@ -79,7 +78,7 @@ def user_analytics(current_user: User = Depends(get_current_user), db: Session =
 
 
 @router.get("/analytics/system")
-def system_analytics(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def system_analytics(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
 
     total_users = db.query(models.Email.user_email).distinct().count()
     total_emails = db.query(models.Email).count()
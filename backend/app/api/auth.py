@@ -1,17 +1,17 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import RedirectResponse, JSONResponse
-from google_auth_oauthlib.flow import Flow
 from app.core.config import settings
 import requests
 import os
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.database.crud import get_user_by_email, create_user
+from app.database.writer import run_write
 from app.core.security import create_access_token
 from app.core.crypto import encrypt_data
 from datetime import timedelta
-from app.api.deps import get_current_user
-from app.database.models import User
+from app.api.deps import Identity, get_current_identity, get_request_token, invalidate_token, security_scheme
+from app.services import sync_schedule
 
 router = APIRouter()
 
@@ -41,6 +41,7 @@ def get_google_client_config():
 @router.get("/login-url")
 def login_url():
     """Generate Gmail OAuth URL"""
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
         get_google_client_config(),
         scopes=SCOPES,
@@ -57,6 +58,7 @@ def login_url():
 @router.get("/auth/callback")
 def auth_callback(code: str, db: Session = Depends(get_db)):
     """Google OAuth callback"""
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
         get_google_client_config(),
         scopes=SCOPES,
@@ -89,7 +91,7 @@ def auth_callback(code: str, db: Session = Depends(get_db)):
     # Check if user exists, create if not
     user = get_user_by_email(db, email=user_email)
     if not user:
-        user = create_user(db, email=user_email)
+        user = run_write(lambda s: create_user(s, email=user_email), exclusive=True)
     
     # Generate JWT
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -97,6 +99,7 @@ def auth_callback(code: str, db: Session = Depends(get_db)):
         data={"sub": user.email}, expires_delta=access_token_expires
     )
 
+    sync_schedule.record_activity(user.email)
     print(f"✅ Logged in as: {user_email}")
     
     response = RedirectResponse(
@@ -117,13 +120,14 @@ def auth_callback(code: str, db: Session = Depends(get_db)):
     return response
 
 @router.get("/me")
-def get_me(user: User = Depends(get_current_user)):
+def get_me(user: Identity = Depends(get_current_identity)):
     """Get current logged in user"""
     return {"email": user.email}
 
 @router.post("/logout")
-def logout():
+def logout(request: Request, credentials=Depends(security_scheme)):
     """Logout user by clearing cookie"""
+    invalidate_token(get_request_token(request, credentials))
     response = JSONResponse(content={"message": "Logged out successfully"})
     response.delete_cookie("access_token")
     return response
\ No newline at end of file
@@ -0,0 +1,61 @@
+import hashlib
+from functools import lru_cache
+from typing import Any, Callable
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.utils.ttl_cache import TTLCache
+
+# (user, path, query params, mailbox version) -> serialized JSON body
+response_cache = TTLCache(maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES, ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def _serialize(response_model, payload) -> bytes:
+    # Same validation / aliasing FastAPI applies for response_model
+    adapter = _adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(payload, from_attributes=True), by_alias=True)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip() for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def versioned_json(
+    request: Request,
+    db: Session,
+    user_email: str,
+    response_model: Any,
+    build: Callable[[], Any]
+) -> Response:
+    """
+    Serve a read-only mailbox view with an ETag derived from the user's mailbox
+    version. Returns 304 when If-None-Match matches. Otherwise serves a cached
+    body for this (user, path, params, version), or calls build() and caches
+    the result. Any write that bumps the version makes old entries unreachable.
+    """
+    version = crud.get_mailbox_version(db, user_email)
+    params = tuple(sorted(request.query_params.multi_items()))
+    key = (user_email, request.url.path, params, version)
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    etag = f'W/"{version}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = _serialize(response_model, build())
+        response_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,18 +1,20 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.database.database import get_db
-from app.database.models import Email, User
-from app.api.deps import get_current_user
+from app.database import crud
+from app.database.models import Email
+from app.api.deps import Identity, get_current_identity
 
 router = APIRouter()
 
 @router.get("/category-stats")
-def category_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    emails = db.query(Email).filter(Email.user_email == current_user.email).all()
+def category_stats(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    rows = (
+        db.query(Email.category, func.count(Email.email_id))
+        .filter(crud.visible_emails(current_user.email))
+        .group_by(Email.category)
+        .all()
+    )
 
-    stats = {}
-    for mail in emails:
-        cat = mail.category
-        stats[cat] = stats.get(cat, 0) + 1
-
-    return stats
\ No newline at end of file
+    return {cat: count for cat, count in rows}
\ No newline at end of file
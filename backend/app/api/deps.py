@@ -1,44 +1,101 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.database.database import get_db
-from app.database.crud import get_user_by_email
+from app.core.config import settings
+from app.database.database import get_db, SessionLocal
 from app.core.security import verify_token
 from app.database.models import User
+from app.utils.ttl_cache import TTLCache
 
 # Use HTTPBearer for JWT token support in Swagger UI
 security_scheme = HTTPBearer(auto_error=False)
 
-def get_current_user(
-    request: Request,
-    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+
+@dataclass(frozen=True)
+class Identity:
+    """The authenticated user, without an ORM session attached."""
+    id: int
+    email: str
+
+
+# Verified token -> Identity. Entries never outlive the token's own expiry.
+identity_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    token = None
+
+
+def get_request_token(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
     if credentials:
-        token = credentials.credentials
-    elif "access_token" in request.cookies:
-        token = request.cookies["access_token"]
-        
-    if not token:
-        raise credentials_exception
+        return credentials.credentials
+    return request.cookies.get("access_token")
+
+
+def invalidate_token(token: Optional[str]):
+    """Drop a token from the identity cache (e.g. on logout)."""
+    if token:
+        identity_cache.pop(token)
+
+
+def _resolve_identity(token: str) -> Identity:
+    identity = identity_cache.get(token)
+    if identity is not None:
+        return identity
 
     payload = verify_token(token)
     if payload is None:
-        raise credentials_exception
-        
+        raise _credentials_exception()
+
     email: str = payload.get("sub")
     if email is None:
-        raise credentials_exception
-        
-    user = get_user_by_email(db, email=email)
+        raise _credentials_exception()
+
+    db = SessionLocal()
+    try:
+        row = db.query(User.id, User.email).filter(User.email == email).first()
+    finally:
+        db.close()
+    if row is None:
+        raise _credentials_exception()
+
+    identity = Identity(id=row.id, email=row.email)
+    expires_at = None
+    if payload.get("exp"):
+        expires_at = time.monotonic() + (payload["exp"] - time.time())
+    identity_cache.set(token, identity, expires_at=expires_at)
+    return identity
+
+
+def get_current_identity(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme)
+) -> Identity:
+    """
+    Authenticate the request without loading the ORM User.
+
+    Verified tokens are cached for AUTH_CACHE_TTL_SECONDS, so most requests
+    skip both the JWT decode and the users lookup.
+    """
+    token = get_request_token(request, credentials)
+    if not token:
+        raise _credentials_exception()
+    return _resolve_identity(token)
+
+
+def get_current_user(
+    identity: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+) -> User:
+    """Authenticate and load the full User row, for endpoints that need it."""
+    user = db.get(User, identity.id)
     if user is None:
-        raise credentials_exception
-        
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    return user
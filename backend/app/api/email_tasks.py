@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timezone
 from app.database.database import get_db
-from app.database.models import EmailTask, Email, User
-from app.schemas.task import EmailTaskResponse, EmailTaskExtractionResponse
-from app.api.deps import get_current_user
+from app.database import crud
+from app.database.writer import run_write
+from app.database.models import EmailTask, Email
+from app.schemas.task import EmailTaskResponse, EmailTaskExtractionResponse, TaskAgendaResponse
+from app.api.deps import Identity, get_current_identity
+from app.api.caching import versioned_json
 from app.services.task_extractor import should_extract_tasks, extract_tasks_from_email
-from dateutil import parser
+from app.services import agenda, task_queue
+from app.utils.deadline_parser import resolve_timezone, to_utc_naive, utc_now
+from app.utils.pagination import decode_cursor, encode_cursor, parse_cursor_datetime
+from app.services.reminders import reminder_dispatcher
 from pydantic import BaseModel  
 router = APIRouter()
 
 @router.get("/tasks", response_model=List[EmailTaskResponse])
 def get_user_tasks(
+    request: Request,
     user_email: str = Query(..., description="User's email address"),
     completed: Optional[bool] = Query(None, description="Filter by completion status"),
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -24,19 +31,70 @@ def get_user_tasks(
     if user_email != current_user.email:
         raise HTTPException(status_code=403, detail="Not authorized to access these tasks")
 
-    query = db.query(EmailTask).filter(EmailTask.user_email == current_user.email)
+    def build():
+        query = db.query(EmailTask).filter(EmailTask.user_email == current_user.email)
 
-    if completed is not None:
-        query = query.filter(EmailTask.completed == completed)
+        if completed is not None:
+            query = query.filter(EmailTask.completed == completed)
 
-    tasks = query.order_by(EmailTask.created_at.desc()).all()
-    return tasks
+        return query.order_by(EmailTask.created_at.desc()).all()
+
+    return versioned_json(request, db, current_user.email, List[EmailTaskResponse], build)
+
+
+def _decode_agenda_cursor(cursor: Optional[str]):
+    """Decode a (deadline, task id) cursor; the deadline is null past the dated tasks."""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2 or not isinstance(values[1], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    deadline = parse_cursor_datetime(values[0])
+    if values[0] is not None and deadline is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return deadline, values[1]
+
+
+@router.get("/tasks/agenda", response_model=TaskAgendaResponse)
+def get_task_agenda(
+    bucket: Optional[str] = Query(None, description="overdue, today, week, later or no_deadline"),
+    completed: Optional[bool] = Query(False, description="Completion status; open tasks by default"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """
+    Tasks ordered by deadline and bucketed in the user's timezone, with the
+    number of tasks in each bucket. Pass `next_cursor` back for the next page.
+    """
+    if bucket is not None and bucket not in agenda.BUCKETS:
+        raise HTTPException(status_code=400, detail="Unknown bucket")
+    after = _decode_agenda_cursor(cursor)
+
+    tz = resolve_timezone(crud.get_user_timezones(db, [current_user.email]).get(current_user.email))
+    bounds = agenda.Bounds(datetime.now(timezone.utc), tz)
+    rows, has_more = agenda.agenda_page(db, current_user.email, bounds, limit, bucket, completed, after)
+
+    tasks = [
+        {**EmailTaskResponse.model_validate(task).model_dump(), "bucket": task_bucket}
+        for task, task_bucket in rows
+    ]
+    next_cursor = None
+    if has_more:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.deadline, last.id)
+    return {
+        "counts": agenda.bucket_counts(db, current_user.email, bounds, completed),
+        "tasks": tasks,
+        "next_cursor": next_cursor
+    }
 
 
 @router.get("/emails/{email_id}/tasks", response_model=List[EmailTaskResponse])
 def get_email_tasks(
     email_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -65,12 +123,14 @@ def get_email_tasks(
 @router.post("/emails/{email_id}/extract-tasks", response_model=EmailTaskExtractionResponse)
 def extract_tasks_on_demand(
     email_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
-    On-demand AI task extraction.
-    Checks pre-filter and existing tasks before calling AI.
+    Task extraction for one email. Emails synced since background extraction
+    exists are normally already done (or skipped by the pre-filter), so this
+    just returns their tasks; older, still-queued or failed emails are
+    extracted here.
     """
     
     # 1. Fetch Email & Verify Ownership
@@ -93,81 +153,55 @@ def extract_tasks_on_demand(
             "reason": "Tasks already exist",
             "tasks": existing_tasks
         }
+
+    # 3. Precomputed by the background extractor
+    if email.task_extraction == task_queue.DONE:
+        return {"skipped": False, "tasks": []}
+    if email.task_extraction == task_queue.SKIPPED:
+        return {"skipped": True, "reason": "low_signal_email", "tasks": []}
     
-    # 3. Run heuristic pre-filter
-    should_run = should_extract_tasks(
-        subject=email.subject or "",
-        body=email.body or "",
-        category=email.category,
-        priority=email.priority
-    )
-    
-    if not should_run:
-        return {
-            "skipped": True,
-            "reason": "low_signal_email",
-            "tasks": []
-        }
+    # 4. Run heuristic pre-filter (already passed by queued / failed emails)
+    if email.task_extraction is None:
+        should_run = should_extract_tasks(
+            subject=email.subject or "",
+            body=email.body or "",
+            category=email.category,
+            priority=email.priority
+        )
+        if not should_run:
+            return {
+                "skipped": True,
+                "reason": "low_signal_email",
+                "tasks": []
+            }
         
-    # 4. Run AI Extraction
-    # Note: AI extraction returns natural language deadline string. 
-    # We need to be careful saving to DateTime column.
-    
+    # 5. Run AI Extraction
     extraction_result = extract_tasks_from_email(email.subject, email.body)
-    
-    if not extraction_result.get("has_tasks", False):
-         return {
-            "skipped": False, # AI ran but found nothing
-            "tasks": []
-        }
-        
-    extracted_tasks_data = extraction_result.get("tasks", [])
-    new_task_objects = []
-    
+
     try:
-        for task_data in extracted_tasks_data:
-            # Deadline Parsing Logic
-            deadline_dt = None
-            raw_deadline = task_data.get("deadline")
-            if raw_deadline:
-                try:
-                    deadline_dt = parser.parse(raw_deadline, fuzzy=True)
-                except:
-                    deadline_dt = None # Keep as None if unparseable
-            
-            new_task = EmailTask(
-                email_id=email_id,
-                user_email=current_user.email,
-                task_text=task_data["task_text"],
-                deadline=deadline_dt,
-                source="ai",
-                completed=False,
-                created_at=datetime.now()
-            )
-            db.add(new_task)
-            new_task_objects.append(new_task)
-            
-        db.commit()
-        
-        # Refresh to get IDs
-        for t in new_task_objects:
-            db.refresh(t)
-            
-        return {
-            "skipped": False,
-            "tasks": new_task_objects
-        }
-        
+        tz = resolve_timezone(crud.get_user_timezones(db, [current_user.email]).get(current_user.email))
+        tasks = run_write(lambda s: task_queue.save_tasks(s, email_id, current_user.email, extraction_result,
+                                                          anchor=email.timestamp, tz=tz))
     except Exception as e:
-        db.rollback()
         print(f"Task persistence failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to save tasks")
 
+    if tasks is None:
+        # The background extractor finished this email first
+        tasks = db.query(EmailTask).filter(
+            EmailTask.email_id == email_id,
+            EmailTask.user_email == current_user.email
+        ).all()
+    return {
+        "skipped": False,
+        "tasks": tasks
+    }
+
 
 @router.patch("/tasks/{task_id}/complete", response_model=EmailTaskResponse)
 def toggle_task_completion(
     task_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -181,23 +215,32 @@ def toggle_task_completion(
     if task.user_email != current_user.email:
         raise HTTPException(status_code=403, detail="Not authorized to access this task")
         
-    try:
+    def _toggle(s):
+        task = s.get(EmailTask, task_id)
         task.completed = not task.completed
-        db.commit()
-        db.refresh(task)
+        crud.bump_mailbox_versions(s, [task.user_email])
+        s.flush()
         return task
+
+    try:
+        task = run_write(_toggle)
     except Exception as e:
-        db.rollback()
         import traceback
         traceback.print_exc()
         print(f"Task update failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to update task: {str(e)}")
 
+    if task.completed:
+        reminder_dispatcher.cancel(task_id)
+    elif task.reminder_time and not task.reminder_sent:
+        reminder_dispatcher.schedule(task_id, task.reminder_time)
+    return task
+
 
 @router.post("/tasks/{task_id}/add-to-calendar")
 def add_task_to_calendar(
     task_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -232,8 +275,8 @@ def add_task_to_calendar(
         start_time = task.deadline
         description_suffix = ""
     else:
-        # Default to 1 hour from now if no deadline
-        start_time = datetime.now() + timedelta(hours=1)
+        # Default to 1 hour from now if no deadline (deadlines are naive UTC)
+        start_time = utc_now() + timedelta(hours=1)
         description_suffix = "\n(No deadline specified in email, scheduled for +1h)"
 
     end_time = start_time + timedelta(hours=1)
@@ -257,9 +300,13 @@ def add_task_to_calendar(
         event = service.events().insert(calendarId='primary', body=event_body).execute()
         
         # 6. Update Task
-        task.calendar_event_id = event.get('id')
-        db.commit()
-        db.refresh(task)
+        def _link_event(s):
+            s.query(EmailTask).filter(EmailTask.id == task_id).update(
+                {EmailTask.calendar_event_id: event.get('id')}, synchronize_session=False
+            )
+            crud.bump_mailbox_versions(s, [current_user.email])
+
+        run_write(_link_event)
 
         return {
             "success": True,
@@ -267,7 +314,6 @@ def add_task_to_calendar(
         }
 
     except Exception as e:
-        db.rollback()
         print(f"Calendar API Error: {e}")
         
         # Check if it's a permissions error
@@ -289,7 +335,7 @@ class ReminderRequest(BaseModel):
 def set_task_reminder(
     task_id: int,
     request: ReminderRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -313,13 +359,19 @@ def set_task_reminder(
     if reminder_dt <= now:
         raise HTTPException(status_code=400, detail="Reminder time must be in the future")
 
+    due_at = to_utc_naive(reminder_dt)
     try:
-        task.reminder_time = request.reminder_time
-        task.reminder_sent = False
-        db.commit()
-        db.refresh(task)
-        return {"success": True, "reminder_time": task.reminder_time}
+        def _set_reminder(s):
+            s.query(EmailTask).filter(EmailTask.id == task_id).update(
+                {EmailTask.reminder_time: due_at, EmailTask.reminder_sent: False},
+                synchronize_session=False
+            )
+            crud.bump_mailbox_versions(s, [current_user.email])
+
+        run_write(_set_reminder)
+        if not task.completed:
+            reminder_dispatcher.schedule(task_id, due_at)
+        return {"success": True, "reminder_time": reminder_dt}
     except Exception as e:
-        db.rollback()
         print(f"Failed to set reminder: {e}")
         raise HTTPException(status_code=500, detail="Failed to set reminder")
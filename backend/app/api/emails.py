@@ -1,175 +1,68 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database.database import get_db
 from app.database import crud
-from app.database.models import Email, EmailAttachment, UserSummary, UserPreference, SenderRule, EmailReply
-from app.schemas.email import EmailListResponse, EmailDetail, SmartThread, ThreadGroup
-from app.services.gmail_service import authenticate_gmail, get_last_24h_emails, get_email_details, send_email_via_gmail
-from app.services.ai_service import summarize_email, analyze_emails_with_ai, smart_categorize_email, generate_smart_reply
-from app.services.thread_service import assign_smart_thread_id
-from app.services.priority_service import resolve_email_priority, get_auto_reply_rule
+from app.database.writer import run_write
+from app.database.models import Email, EmailAttachment, EmailBody
+from app.schemas.email import EmailListResponse, EmailDetail, ThreadGroupPage, SmartThreadPage, ThreadMembersPage
+from app.services.sync_jobs import sync_jobs
+from app.services.thread_service import list_thread_groups, get_group_previews, list_group_emails
+from app.services import events, sync_schedule
 from app.core.config import settings
+from app.utils.pagination import encode_cursor, decode_cursor, parse_cursor_datetime
+from app.utils.compression import decompress_text
 import os
-from app.api.deps import get_current_user
-from app.database.models import User
+from app.api.deps import Identity, get_current_identity
+from app.api.caching import versioned_json
 
 router = APIRouter()
 
 @router.get("/fetch-emails")
-def fetch_emails(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Fetch last 24h Gmail emails and summarize"""
+def fetch_emails(current_user: Identity = Depends(get_current_identity)):
+    """
+    Start a background sync of the last 24h of Gmail and return its job at once.
+    If a sync for this user is already queued or running, that job is returned.
+    Poll /sync-jobs/{job_id} (or listen for sync.finished on /events).
+    """
     user_email = current_user.email
     token_path = f"{settings.TOKENS_DIR}/{user_email}.json"
     if not os.path.exists(token_path):
         return {"error": f"No token found for {user_email}. Please re-login."}
 
-    try:
-        service = authenticate_gmail(user_email)
-    except Exception as e:
-        return {"error": "Authentication failed. Please re-login.", "details": str(e)}
-    
-    messages = get_last_24h_emails(service)
-    if not messages:
-        return {"overall_summary": "No new emails in last 24 hours", "emails": []}
-
-    # Fetch User Preferences & Rules
-    user_pref = db.query(UserPreference).filter(UserPreference.user_email == user_email).first()
-    sender_rules = db.query(SenderRule).filter(SenderRule.user_email == user_email).all()
-
-    emails = []
-    new_emails_count = 0
-    
-    # Process all fetched messages (or limit to reasonable batch size like 50)
-    for msg in messages[:50]:
-        # Optimization: Check if email already exists in DB
-        existing_email = db.query(Email).filter(Email.email_id == msg["id"], Email.user_email == user_email).first()
-        if existing_email:
-            continue
-
-        new_emails_count += 1
-        # Fix unpacking here too
-        sender, subject, preview, full_body, thread_id, attachments, timestamp, is_read = get_email_details(
-        service, msg["id"])
-        
-        # Safe summary generation (handles quota errors internally in ai_service)
-        summary = summarize_email(subject, full_body)
-        
-        category = smart_categorize_email(subject, full_body, sender)
-        smart_thread_id = assign_smart_thread_id(db, user_email, subject)
-
-        emails.append({
-            "email_id": msg["id"],
-            "from": sender,
-            "subject": subject,
-            "summary": summary,
-            "is_read": is_read
-        })
-
-        crud.save_email(
-            db=db,
-            email_id=msg["id"],
-            user_email=user_email,
-            sender=sender,
-            subject=subject,
-            body=full_body,
-            summary=summary,
-            priority="Medium", 
-            category=category,
-            thread_id=thread_id,
-            smart_thread_id=smart_thread_id,
-            attachments=attachments,
-            timestamp=timestamp,
-            is_read=is_read
-        )
+    sync_schedule.record_activity(user_email)
+    job = sync_jobs.submit(user_email)
+    return job.to_dict()
 
-        # Handle Auto-Reply Rule
-        reply_rule = get_auto_reply_rule(sender, sender_rules)
-        if reply_rule:
-            # Check if already replied
-            existing_reply = db.query(EmailReply).filter(
-                EmailReply.email_id == msg["id"],
-                EmailReply.is_auto == True
-            ).first()
-
-            if not existing_reply:
-                print(f"🤖 Auto-reply triggered for {sender}")
-                try:
-                    reply_content = generate_smart_reply(
-                        subject=subject,
-                        body=full_body,
-                        sender=sender,
-                        category=category,
-                        tone="Professional"
-                    )
-                    
-                    # Clean sender email for "To" field
-                    to_email = sender.split("<")[-1].replace(">", "").strip()
-
-                    # Send via Gmail
-                    send_email_via_gmail(
-                        user_email=user_email,
-                        to_email=to_email,
-                        subject=reply_content.get("subject", f"Re: {subject}"),
-                        body=reply_content.get("body", "Received.")
-                    )
-                    # Record reply
-                    crud.save_reply(
-                        db=db,
-                        email_id=msg["id"],
-                        user_email=user_email,
-                        reply_text=reply_content.get("body", ""),
-                        tone="Professional",
-                        is_auto=True
-                    )
-                except Exception as ar_e:
-                    print(f"Failed to auto-reply: {ar_e}")
-
-    
-    # Only run analysis if we actually fetched new emails
-    if emails:
-        ai_data = analyze_emails_with_ai(emails)
-
-        for email in emails:
-            match = next((p for p in ai_data.get("priorities", []) if p["subject"] == email["subject"]), None)
-            ai_priority = match["priority"] if match else "Medium"
-            
-            # Resolve Final Priority using Personalization
-            final_priority = resolve_email_priority(
-                sender=email["from"],
-                subject=email["subject"],
-                body=email["summary"],
-                ai_priority=ai_priority,
-                user_pref=user_pref,
-                sender_rules=sender_rules
-            )
-
-            email["priority"] = final_priority
-            crud.update_email_priority(db, email["email_id"], final_priority)
-
-        # Save overall summary to DB
-        if "overall_summary" in ai_data:
-            crud.save_user_summary(db, user_email, ai_data["overall_summary"])
-
-    return {
-        "overall_summary": "Sync complete.",
-        "new_emails_count": new_emails_count,
-        "emails": emails
-    }
+@router.get("/sync-jobs/{job_id}")
+def get_sync_job(job_id: str, current_user: Identity = Depends(get_current_identity)):
+    """Status and progress counts (listed, fetched, enriched, prioritized, failed) of a sync job."""
+    job = sync_jobs.get(job_id)
+    if not job or job.user_email != current_user.email:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job.to_dict()
 
 
 
 @router.get("/emails", response_model=EmailListResponse)
 def get_emails_from_db(
+    request: Request,
     priority: str = Query("All", description="Filter by priority"),
     folder: str = Query("inbox", description="Folder: inbox or sent"), # Added folder param
     skip: int = 0,
     limit: int = 50,
-    current_user: User = Depends(get_current_user), 
+    current_user: Identity = Depends(get_current_identity), 
     db: Session = Depends(get_db)
 ):
-    """Fetch emails directly from DB (fast load)"""
-    query = db.query(Email).filter(Email.user_email == current_user.email)
+    """Fetch emails directly from DB (fast load). Supports ETag / If-None-Match."""
+    return versioned_json(
+        request, db, current_user.email, EmailListResponse,
+        lambda: _email_list(db, current_user, priority, folder, skip, limit)
+    )
+
+def _email_list(db: Session, current_user: Identity, priority: str, folder: str, skip: int, limit: int):
+    query = db.query(Email).filter(crud.visible_emails(current_user.email))
 
     if folder == "sent":
         # Sent emails: sender contains user email (rudimentary check) or exact match
@@ -224,17 +117,17 @@ def get_emails_from_db(
     }
 
 @router.get("/email/{email_id}", response_model=EmailDetail)
-def get_full_email(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_full_email(email_id: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
+    sync_schedule.record_activity(current_user.email)
 
     return {
         "email_id": email.email_id,
         "from_": email.sender,
         "subject": email.subject,
         "body": email.body,
-        "body": email.body,
         "timestamp": email.timestamp,
         "is_archived": email.is_archived,
         "is_deleted": email.is_deleted,
@@ -248,83 +141,114 @@ def get_full_email(email_id: str, current_user: User = Depends(get_current_user)
         ]
     }
 
-@router.get("/smart-threads")
-def get_smart_threads(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    emails = db.query(Email).filter(Email.user_email == current_user.email).all()
+def _decode_page_cursor(cursor: Optional[str]):
+    """Decode a (timestamp, key) cursor, rejecting malformed values with 400."""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    ts = parse_cursor_datetime(values[0]) if values and len(values) == 2 else None
+    if ts is None or not isinstance(values[1], str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ts, values[1]
 
-    grouped = {}
-    for email in emails:
-        if email.smart_thread_id not in grouped:
-            grouped[email.smart_thread_id] = []
-        grouped[email.smart_thread_id].append({
-            "email_id": email.email_id,
-            "subject": email.subject,
-            "summary": email.summary,
-            "priority": email.priority,
-            "category": email.category,
-            "timestamp": email.timestamp
-        })
 
-    thread_list = [
-        {"smart_thread_id": tid, "emails": msgs}
-        for tid, msgs in grouped.items()
+def _group_page(db: Session, user_email: str, mode: str, limit: int, cursor: Optional[str]):
+    rows, has_more = list_thread_groups(db, user_email, mode, limit, after=_decode_page_cursor(cursor))
+    previews = get_group_previews(db, user_email, mode, [r.group_key for r in rows])
+
+    groups = [
+        {
+            "group_key": str(r.group_key),
+            "count": r.email_count,
+            "latest_timestamp": r.latest_timestamp,
+            "latest": previews.get(r.group_key)
+        }
+        for r in rows
     ]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1].latest_timestamp, rows[-1].group_key)
+    return groups, next_cursor
 
-    return {"smart_threads": thread_list}
 
-@router.get("/threads")
-def get_threads(
-    mode: str = "subject",     # default threading
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    emails = db.query(Email).filter(Email.user_email == current_user.email).all()
-    if not emails:
-        return {"threads": []}
+def _members_page(db: Session, user_email: str, mode: str, group_key: str, limit: int, cursor: Optional[str]):
+    rows, has_more = list_group_emails(db, user_email, mode, group_key, limit, after=_decode_page_cursor(cursor))
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].email_id)
+    return {
+        "group_key": group_key,
+        "emails": [dict(r._mapping) for r in rows],
+        "next_cursor": next_cursor
+    }
 
-    grouped = {}
 
-    for email in emails:
-        if mode == "subject":
-            # In original code, it called assign_smart_thread_id again?
-            # Actually no, it called assign_smart_thread_id in the original route.
-            # But we already have smart_thread_id stored in DB.
-            # Ideally we should use the stored one.
-            key = email.smart_thread_id or "Unthreaded"
-        elif mode == "category":
-            key = email.category or "Uncategorized"
-        elif mode == "priority":
-            key = email.priority or "Medium"
-        elif mode == "sender":
-            key = email.sender.split("<")[0].strip()   # clean sender name
-        elif mode == "date":
-            key = email.timestamp.date()
-        else:
-            key = "Other"
-
-        if key not in grouped:
-            grouped[key] = []
-
-        grouped[key].append({
-            "email_id": email.email_id,
-            "sender": email.sender,
-            "subject": email.subject,
-            "summary": email.summary,
-            "priority": email.priority,
-            "category": email.category,
-            "thread_id": email.thread_id,
-            "timestamp": email.timestamp
-        })
+@router.get("/smart-threads", response_model=SmartThreadPage)
+def get_smart_threads(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """Smart threads with counts and latest timestamp, paginated by cursor."""
+    groups, next_cursor = _group_page(db, current_user.email, "subject", limit, cursor)
+    return {
+        "smart_threads": [
+            {
+                "smart_thread_id": g["group_key"],
+                "count": g["count"],
+                "latest_timestamp": g["latest_timestamp"],
+                "latest": g["latest"]
+            }
+            for g in groups
+        ],
+        "next_cursor": next_cursor
+    }
 
-    thread_list = [
-        {"group_key": str(key), "emails": msgs}
-        for key, msgs in grouped.items()
-    ]
+@router.get("/smart-threads/{smart_thread_id}/emails", response_model=ThreadMembersPage)
+def get_smart_thread_emails(
+    smart_thread_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """Lazily expand one smart thread."""
+    return _members_page(db, current_user.email, "subject", smart_thread_id, limit, cursor)
 
-    return {"threads": thread_list}
+@router.get("/threads", response_model=ThreadGroupPage)
+def get_threads(
+    request: Request,
+    mode: str = "subject",     # default threading
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """
+    Thread groups for the given mode (subject, category, priority, sender, date).
+    Grouping runs in SQL; members are loaded separately via /threads/emails.
+    """
+    def build():
+        groups, next_cursor = _group_page(db, current_user.email, mode, limit, cursor)
+        return {"threads": groups, "next_cursor": next_cursor}
+
+    return versioned_json(request, db, current_user.email, ThreadGroupPage, build)
+
+@router.get("/threads/emails", response_model=ThreadMembersPage)
+def get_thread_emails(
+    group_key: str = Query(..., description="group_key returned by /threads"),
+    mode: str = "subject",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """Lazily expand one thread group."""
+    return _members_page(db, current_user.email, mode, group_key, limit, cursor)
 
 @router.get("/attachments")
-def list_attachments(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_attachments(email_id: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     # Verify email belongs to user first to prevent IDOR
     email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
     if not email:
@@ -345,23 +269,30 @@ def list_attachments(email_id: str, current_user: User = Depends(get_current_use
 @router.get("/search")
 def search_emails(
     q: str = Query(..., description="Search text"),
-    current_user: User = Depends(get_current_user),
+    body: bool = Query(False, description="Also match inside email bodies"),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
-    """Search emails by subject, sender, body, or summary"""
+    """
+    Search emails by subject, sender, summary, or priority. Bodies are stored
+    compressed, so they are only searched with body=true, which scans the
+    user's SEARCH_BODY_MAX_EMAILS newest emails.
+    """
 
     query_str = f"%{q.lower()}%"
 
-    results = db.query(Email).filter(
-        Email.user_email == current_user.email,
-        (
-            Email.subject.ilike(query_str) |
-            Email.sender.ilike(query_str) |
-            Email.body.ilike(query_str) |
-            Email.summary.ilike(query_str) |
-            Email.priority.ilike(query_str)
-        )
-    ).all()
+    matches = (
+        Email.subject.ilike(query_str) |
+        Email.sender.ilike(query_str) |
+        Email.summary.ilike(query_str) |
+        Email.priority.ilike(query_str)
+    )
+    if body:
+        body_ids = _search_bodies(db, current_user.email, q)
+        if body_ids:
+            matches = matches | Email.email_id.in_(body_ids)
+
+    results = db.query(Email).filter(crud.visible_emails(current_user.email), matches).all()
 
     return [
         {
@@ -375,65 +306,87 @@ def search_emails(
         for e in results
     ]
 
+
+def _search_bodies(db: Session, user_email: str, q: str) -> List[str]:
+    """IDs of the user's newest emails whose decompressed body contains `q` (case-insensitive)."""
+    needle = q.lower()
+    newest = (
+        db.query(Email.email_id)
+        .filter(crud.visible_emails(user_email))
+        .order_by(Email.timestamp.desc())
+        .limit(settings.SEARCH_BODY_MAX_EMAILS)
+        .subquery()
+    )
+    rows = (
+        db.query(EmailBody.email_id, EmailBody.codec, EmailBody.data)
+        .filter(EmailBody.email_id.in_(select(newest.c.email_id)))
+        .yield_per(500)
+    )
+    return [
+        email_id for email_id, codec, data in rows
+        if needle in (decompress_text(codec, data) or "").lower()
+    ]
+
 from datetime import datetime
 
-@router.post("/email/{email_id}/archive")
-def archive_email(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
-    if not email:
+def _update_user_email(email_id: str, user_email: str, values: dict):
+    """Apply a column update to one of the user's emails through the writer queue."""
+    def _update(s):
+        updated = s.query(Email).filter(
+            Email.email_id == email_id,
+            Email.user_email == user_email
+        ).update(values, synchronize_session=False)
+        if updated:
+            crud.bump_mailbox_versions(s, [user_email])
+        return updated
+
+    updated = run_write(_update)
+    if not updated:
         raise HTTPException(status_code=404, detail="Email not found")
-    
-    email.is_archived = True
-    email.archived_at = datetime.now()
-    email.is_deleted = False # Ensure not deleted if archived
-    db.commit()
+    # Let the user's other open tabs/devices update in place
+    events.publish(user_email, events.EMAIL_UPDATED, email_id=email_id,
+                   changes={column.key: value for column, value in values.items()})
+
+@router.post("/email/{email_id}/archive")
+def archive_email(email_id: str, current_user: Identity = Depends(get_current_identity)):
+    _update_user_email(email_id, current_user.email, {
+        Email.is_archived: True,
+        Email.archived_at: datetime.now(),
+        Email.is_deleted: False # Ensure not deleted if archived
+    })
     return {"success": True, "message": "Email archived"}
 
 @router.post("/email/{email_id}/unarchive")
-def unarchive_email(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
-    if not email:
-        raise HTTPException(status_code=404, detail="Email not found")
-    
-    email.is_archived = False
-    email.archived_at = None
-    db.commit()
+def unarchive_email(email_id: str, current_user: Identity = Depends(get_current_identity)):
+    _update_user_email(email_id, current_user.email, {
+        Email.is_archived: False,
+        Email.archived_at: None
+    })
     return {"success": True, "message": "Email unarchived"}
 
 @router.post("/email/{email_id}/delete")
-def delete_email(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
-    if not email:
-        raise HTTPException(status_code=404, detail="Email not found")
-    
-    email.is_deleted = True
-    email.deleted_at = datetime.now()
-    db.commit()
+def delete_email(email_id: str, current_user: Identity = Depends(get_current_identity)):
+    _update_user_email(email_id, current_user.email, {
+        Email.is_deleted: True,
+        Email.deleted_at: datetime.now()
+    })
     return {"success": True, "message": "Email deleted"}
 
 @router.post("/email/{email_id}/restore")
-def restore_email(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
-    if not email:
-        raise HTTPException(status_code=404, detail="Email not found")
-    
-    email.is_deleted = False
-    email.deleted_at = None
-    db.commit()
+def restore_email(email_id: str, current_user: Identity = Depends(get_current_identity)):
+    _update_user_email(email_id, current_user.email, {
+        Email.is_deleted: False,
+        Email.deleted_at: None
+    })
     return {"success": True, "message": "Email restored"}
 
 @router.post("/email/{email_id}/read")
-def mark_email_read(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
-    if not email:
-        raise HTTPException(status_code=404, detail="Email not found")
-    
-    email.is_read = True
-    db.commit()
+def mark_email_read(email_id: str, current_user: Identity = Depends(get_current_identity)):
+    _update_user_email(email_id, current_user.email, {Email.is_read: True})
     return {"success": True, "message": "Email marked as read"}
 
 @router.post("/email/{email_id}/quick-summary")
-def quick_summary(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def quick_summary(email_id: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     """Generate a very short 1-2 sentence summary on demand."""
     email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
     if not email:
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.api.deps import Identity, get_current_identity
+from app.services.events import get_broker, format_sse
+
+router = APIRouter()
+
+
+@router.get("/events")
+async def event_stream(request: Request, current_user: Identity = Depends(get_current_identity)):
+    """
+    Server-Sent Events stream of mailbox changes for the current user
+    (emails.new, email.updated, emails.priority, reminder.fired,
+    outbound.updated). Use with EventSource; the auth cookie is sent
+    automatically.
+    """
+    broker = get_broker()
+    sub = broker.subscribe(current_user.email)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=settings.EVENT_HEARTBEAT_SECONDS)
+                if event is None:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
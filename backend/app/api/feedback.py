@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, Form, Request
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.database import crud, models
+from app.database.writer import run_write
 from app.schemas.feedback import FeedbackResponse
-from app.api.deps import get_current_user
-from app.database.models import User, Email
+from app.api.deps import Identity, get_current_identity
+from app.database.models import Email
 
 router = APIRouter()
 
@@ -14,7 +15,7 @@ async def feedback(
     priority: str = Form(None),
     is_correct: str = Form(None),
     request: Request = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """Save user feedback to ORM database"""
@@ -37,12 +38,12 @@ async def feedback(
     if not email:
          return {"success": False, "error": "Email not found or access denied"}
 
-    crud.create_feedback(db, email_id, priority, is_correct_bool)
+    run_write(lambda s: crud.create_feedback(s, email_id, priority, is_correct_bool), exclusive=True)
 
     return {"success": True, "message": "Feedback saved successfully"}
 
 @router.get("/feedback")
-def feedback_list(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def feedback_list(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     """Return all feedback records"""
     feedbacks = db.query(models.Feedback).order_by(models.Feedback.timestamp.desc()).all()
     return [
@@ -56,7 +57,7 @@ def feedback_list(current_user: User = Depends(get_current_user), db: Session =
     ]
 
 @router.get("/feedback-stats")
-def feedback_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def feedback_stats(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     """Get feedback statistics"""
     total = db.query(models.Feedback).count()
     correct = db.query(models.Feedback).filter(models.Feedback.is_correct == True).count()
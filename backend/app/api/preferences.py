@@ -2,16 +2,31 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 import json
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from app.database.database import get_db
-from app.database.models import UserPreference, SenderRule, User
+from app.database.writer import run_write
+from app.database.models import UserPreference, SenderRule
 from app.schemas.preferences import (
     UserPreferenceCreate, UserPreferenceResponse,
     SenderRuleCreate, SenderRuleResponse
 )
-from app.api.deps import get_current_user
+from app.api.deps import Identity, get_current_identity
+from app.services import priority_service
 
 router = APIRouter()
 
+
+def _reprioritize_senders(db: Session, user_email: str, rule: priority_service.Rule) -> int:
+    """Apply a rule change to the user's existing mail from the rule's senders."""
+    if rule.force_priority:
+        changes = run_write(lambda s: priority_service.force_rule_priority(s, user_email, rule))
+        priority_service.publish_priorities(user_email, changes)
+        return len(changes)
+    # No forced priority (any more): re-score those senders from their stored AI priority
+    return priority_service.rescore(user_email, priority_service.get_matcher(db, user_email),
+                                    where=priority_service.sender_clause(rule.sender_email))
+
+
 # --------------------------
 # User Preferences Endpoints
 # --------------------------
@@ -19,32 +34,53 @@ router = APIRouter()
 @router.post("/preferences", response_model=UserPreferenceResponse)
 def create_or_update_preferences(
     pref_data: UserPreferenceCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
-    Create or update user preferences (Role, Interests, About).
+    Create or update user preferences (Role, Interests, About). With
+    apply_to_existing, changed interests also re-score emails already synced.
     """
-    pref = db.query(UserPreference).filter(UserPreference.user_email == current_user.email).first()
+    if pref_data.timezone:
+        try:
+            ZoneInfo(pref_data.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail="Unknown timezone")
 
     # Convert list to JSON string for storage
     interests_str = json.dumps(pref_data.interests) if pref_data.interests else "[]"
 
-    if pref:
-        pref.primary_role = pref_data.primary_role
-        pref.interests = interests_str
-        pref.about_user = pref_data.about_user
-    else:
-        pref = UserPreference(
-            user_email=current_user.email,
-            primary_role=pref_data.primary_role,
-            interests=interests_str,
-            about_user=pref_data.about_user
-        )
-        db.add(pref)
-
-    db.commit()
-    db.refresh(pref)
+    def _save(s):
+        pref = s.query(UserPreference).filter(UserPreference.user_email == current_user.email).first()
+        interests_changed = ((pref.interests if pref else None) or "[]") != interests_str
+        if pref:
+            pref.primary_role = pref_data.primary_role
+            pref.interests = interests_str
+            pref.about_user = pref_data.about_user
+            if pref_data.timezone is not None:  # older clients don't send it
+                pref.timezone = pref_data.timezone or None
+        else:
+            pref = UserPreference(
+                user_email=current_user.email,
+                primary_role=pref_data.primary_role,
+                interests=interests_str,
+                about_user=pref_data.about_user,
+                timezone=pref_data.timezone or None
+            )
+            s.add(pref)
+        s.flush()
+        s.refresh(pref)
+        return pref, interests_changed
+
+    pref, interests_changed = run_write(_save)
+    priority_service.invalidate(current_user.email)
+
+    reprioritized = None
+    if pref_data.apply_to_existing:
+        reprioritized = 0
+        if interests_changed:
+            reprioritized = priority_service.rescore(
+                current_user.email, priority_service.get_matcher(db, current_user.email))
 
     # Convert back to list for response
     # We can use a property or helper, but Pydantic expects a dict/object to validate
@@ -55,14 +91,16 @@ def create_or_update_preferences(
         primary_role=pref.primary_role,
         interests=json.loads(pref.interests) if pref.interests else [],
         about_user=pref.about_user,
-        created_at=pref.created_at
+        timezone=pref.timezone,
+        created_at=pref.created_at,
+        reprioritized_count=reprioritized
     )
     return pref_response
 
 
 @router.get("/preferences", response_model=UserPreferenceResponse)
 def get_preferences(
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -87,6 +125,7 @@ def get_preferences(
         primary_role=pref.primary_role,
         interests=json.loads(pref.interests) if pref.interests else [],
         about_user=pref.about_user,
+        timezone=pref.timezone,
         created_at=pref.created_at
     )
 
@@ -98,39 +137,46 @@ def get_preferences(
 @router.post("/sender-rules", response_model=SenderRuleResponse)
 def create_or_update_sender_rule(
     rule_data: SenderRuleCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
-    Create or update a rule for a specific sender.
+    Create or update a rule for a specific sender. With apply_to_existing the
+    rule is also applied to emails already synced from that sender.
     """
-    existing_rule = db.query(SenderRule).filter(
-        SenderRule.user_email == current_user.email,
-        SenderRule.sender_email == rule_data.sender_email
-    ).first()
-
-    if existing_rule:
-        existing_rule.force_priority = rule_data.force_priority
-        existing_rule.auto_reply = rule_data.auto_reply
-        db.commit()
-        db.refresh(existing_rule)
-        return existing_rule
-    else:
-        new_rule = SenderRule(
-            user_email=current_user.email,
-            sender_email=rule_data.sender_email,
-            force_priority=rule_data.force_priority,
-            auto_reply=rule_data.auto_reply
-        )
-        db.add(new_rule)
-        db.commit()
-        db.refresh(new_rule)
-        return new_rule
+    def _save(s):
+        rule = s.query(SenderRule).filter(
+            SenderRule.user_email == current_user.email,
+            SenderRule.sender_email == rule_data.sender_email
+        ).first()
+        if rule:
+            rule.force_priority = rule_data.force_priority
+            rule.auto_reply = rule_data.auto_reply
+        else:
+            rule = SenderRule(
+                user_email=current_user.email,
+                sender_email=rule_data.sender_email,
+                force_priority=rule_data.force_priority,
+                auto_reply=rule_data.auto_reply
+            )
+            s.add(rule)
+        s.flush()
+        s.refresh(rule)
+        return rule
+
+    rule = run_write(_save)
+    priority_service.invalidate(current_user.email)
+
+    response = SenderRuleResponse.model_validate(rule)
+    if rule_data.apply_to_existing:
+        response.reprioritized_count = _reprioritize_senders(
+            db, current_user.email, priority_service.Rule(rule.id, rule.sender_email, rule.force_priority, rule.auto_reply))
+    return response
 
 
 @router.get("/sender-rules", response_model=List[SenderRuleResponse])
 def get_sender_rules(
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
@@ -142,20 +188,30 @@ def get_sender_rules(
 @router.delete("/sender-rules/{rule_id}")
 def delete_sender_rule(
     rule_id: int,
-    current_user: User = Depends(get_current_user),
+    apply_to_existing: bool = False,
+    current_user: Identity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """
-    Delete a sender rule by ID.
+    Delete a sender rule by ID. With ?apply_to_existing=true, emails from the
+    rule's senders are re-scored without it.
     """
-    rule = db.query(SenderRule).filter(
-        SenderRule.id == rule_id,
-        SenderRule.user_email == current_user.email
-    ).first()
-
-    if not rule:
+    def _delete(s):
+        rule = s.query(SenderRule).filter(
+            SenderRule.id == rule_id,
+            SenderRule.user_email == current_user.email
+        ).first()
+        if not rule:
+            return None
+        s.delete(rule)
+        return priority_service.Rule(rule.id, rule.sender_email, None, rule.auto_reply)
+
+    deleted = run_write(_delete)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Rule not found")
+    priority_service.invalidate(current_user.email)
 
-    db.delete(rule)
-    db.commit()
-    return {"success": True, "message": "Rule deleted"}
+    response = {"success": True, "message": "Rule deleted"}
+    if apply_to_existing:
+        response["reprioritized_count"] = _reprioritize_senders(db, current_user.email, deleted)
+    return response
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.database.database import get_db
 from app.database import crud
-from app.database.models import Email, EmailReply
+from app.database.writer import run_write
+from app.database.models import Email, EmailReply, OutboundEmail
 from app.services.ai_service import generate_smart_reply
-from app.services.gmail_service import send_email_via_gmail
+from app.services import mail_outbox
+from app.services.mail_outbox import mail_sender
 from app.schemas.reply import ReplyResponse, SendReplyRequest, AutoReplyRequest, DraftSaveRequest, DraftResponse, SendEmailRequest
-from app.api.deps import get_current_user
-from app.database.models import User
+from app.api.deps import Identity, get_current_identity
 
 router = APIRouter()
 
 @router.post("/generate-reply", response_model=ReplyResponse)
-def generate_reply(email_id: str, tone: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def generate_reply(email_id: str, tone: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
 
     if not email:
@@ -47,7 +49,7 @@ def generate_reply(email_id: str, tone: str, current_user: User = Depends(get_cu
 @router.post('/draft')
 def save_draft(
     draft_req: DraftSaveRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Identity = Depends(get_current_identity),
     db:Session = Depends(get_db)
 ):
     # Verify email ownership
@@ -55,51 +57,53 @@ def save_draft(
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
         
-    crud.save_draft(db, draft_req.email_id, current_user.email, draft_req.draft_text, draft_req.tone)
+    run_write(lambda s: crud.save_draft(s, draft_req.email_id, current_user.email, draft_req.draft_text, draft_req.tone),
+              exclusive=True)
     return {"success": True}
 
-from datetime import datetime
+def _queue_email(user_email: str, idempotency_key: Optional[str], **fields) -> dict:
+    """
+    Queue an email for the background sender and return its status. Clients
+    may pass an Idempotency-Key header so a retried request queues nothing new.
+    """
+    key = f"{user_email}:{idempotency_key}" if idempotency_key else None
+    try:
+        queued = run_write(lambda s: mail_outbox.to_dict(
+            mail_outbox.enqueue_email(s, user_email, idempotency_key=key, **fields)
+        ))
+    except Exception as e:
+        print(f"Failed to queue email: {e}")
+        raise HTTPException(status_code=500, detail="Failed to queue email")
+    mail_sender.wake()
+    return queued
 
 @router.post("/send-email")
 def send_email_endpoint(
     req: SendEmailRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Identity = Depends(get_current_identity),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    try:
-        result = send_email_via_gmail(
-            user_email=current_user.email,
-            to_email=req.to_email,
-            subject=req.subject,
-            body=req.body
-        )
-        
-        # Save to DB so it appears in Sent
-        crud.save_email(
-            db=db,
-            email_id=result["id"],
-            user_email=current_user.email,
-            sender=current_user.email, # Explicitly set sender as current user
-            subject=req.subject,
-            body=req.body,
-            summary="Sent message",
-            priority="Medium",
-            category="Personal",
-            thread_id=result.get("threadId"),
-            smart_thread_id=None,
-            attachments=[],
-            timestamp=datetime.now()
-        )
-
-        return {"success": True, "message_id": result["id"]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Queue a new email. It shows in Sent once delivered (outbound.updated on /events)."""
+    queued = _queue_email(
+        current_user.email, idempotency_key,
+        kind=mail_outbox.NEW, to_email=req.to_email, subject=req.subject, body=req.body
+    )
+    return {"success": True, **queued}
+
+@router.get("/outbound/{outbound_id}")
+def get_outbound_email(outbound_id: int, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
+    """Delivery status of a queued email: queued, sending, sent or failed."""
+    row = db.get(OutboundEmail, outbound_id)
+    if not row or row.user_email != current_user.email:
+        raise HTTPException(status_code=404, detail="Outbound email not found")
+    return mail_outbox.to_dict(row)
 
 @router.post("/send-reply")
 def send_reply(
     req: SendReplyRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     # Fetch original email to get sender information
     email = db.query(Email).filter(Email.email_id == req.email_id, Email.user_email == current_user.email).first()
@@ -110,33 +114,26 @@ def send_reply(
     # reply goes back to original sender
     to_email = email.sender.split("<")[-1].replace(">", "").strip()
 
-    result = send_email_via_gmail(
-        user_email=email.user_email,
-        to_email=to_email,
-        subject=f"Re: {email.subject}",
-        body=req.reply_text
+    # The reply is recorded and the draft deleted once Gmail accepts it
+    queued = _queue_email(
+        email.user_email, idempotency_key,
+        kind=mail_outbox.REPLY, email_id=req.email_id, to_email=to_email,
+        subject=f"Re: {email.subject}", body=req.reply_text, tone="manual"
     )
 
-    crud.save_reply(
-        db=db,
-        email_id=req.email_id,
-        user_email=email.user_email,
-        reply_text=req.reply_text,
-        tone="manual",
-        is_auto=False
-    )
-    
-    # Delete draft if exists
-    crud.delete_draft(db, req.email_id, email.user_email)
-
     return {
         "success": True,
-        "message_id": result["id"],
-        "sent_to": to_email
+        "sent_to": to_email,
+        **queued
     }
 
 @router.post("/auto-reply")
-def auto_reply(req: AutoReplyRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def auto_reply(
+    req: AutoReplyRequest,
+    current_user: Identity = Depends(get_current_identity),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     email = db.query(Email).filter(Email.email_id == req.email_id, Email.user_email == current_user.email).first()
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
@@ -155,31 +152,21 @@ def auto_reply(req: AutoReplyRequest, current_user: User = Depends(get_current_u
 
     to_email = email.sender.split("<")[-1].replace(">", "").strip()
 
-    result = send_email_via_gmail(
-        user_email=email.user_email,
-        to_email=to_email,
-        subject=f"Re: {email.subject}",
-        body=reply_body
-    )
-
-    crud.save_reply(
-        db=db,
-        email_id=req.email_id,
-        user_email=email.user_email,
-        reply_text=reply,
-        tone=req.tone,
-        is_auto=True
+    queued = _queue_email(
+        email.user_email, idempotency_key,
+        kind=mail_outbox.AUTO_REPLY, email_id=req.email_id, to_email=to_email,
+        subject=f"Re: {email.subject}", body=reply_body, tone=req.tone
     )
 
     return {
         "success": True,
         "generated_reply": reply,
         "sent_to": to_email,
-        "message_id": result["id"]
+        **queued
     }
 
 @router.get("/all-drafts")
-def get_all_drafts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_drafts(current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     # Logic inlined here using DB directly or need new crud method if complex
     # Original did a join logic manually
     from app.database.models import EmailDraft
@@ -201,7 +188,7 @@ def get_all_drafts(current_user: User = Depends(get_current_user), db: Session =
     return result
 
 @router.get("/drafts")
-def get_draft(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_draft(email_id: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     from app.database.models import EmailDraft
     draft = (db.query(EmailDraft).filter_by(email_id=email_id, user_email=current_user.email).first())
 
@@ -215,7 +202,7 @@ def get_draft(email_id: str, current_user: User = Depends(get_current_user), db:
     }
 
 @router.get("/replies")
-def get_replies(email_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_replies(email_id: str, current_user: Identity = Depends(get_current_identity), db: Session = Depends(get_db)):
     # Verify ownership
     email = db.query(Email).filter(Email.email_id == email_id, Email.user_email == current_user.email).first()
     if not email:
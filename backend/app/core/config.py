@@ -11,6 +11,118 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite:///./feedback.db"
+    # Connection pool (server databases such as PostgreSQL)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Single-writer queue (SQLite): writes queued within the window share one commit
+    DB_WRITE_QUEUE: bool = True
+    DB_WRITE_BATCH_MAX: int = 64
+    DB_WRITE_BATCH_WAIT_MS: int = 5
+
+    # Per-process startup work (turn off in extra workers or one-off processes)
+    RUN_MIGRATIONS_ON_STARTUP: bool = True
+    RUN_SCHEDULER: bool = True
+
+    # Background /fetch-emails jobs
+    SYNC_JOB_WORKERS: int = 2
+    SYNC_JOB_RETENTION_SECONDS: int = 3600
+    # Fetched and enriched emails are written (and checkpointed) this many at a time
+    SYNC_CHECKPOINT_EVERY: int = 10
+
+    # Reminders fire from an in-memory heap on the scheduler worker. It re-reads
+    # every pending reminder each REMINDER_RESYNC_SECONDS and the ones due soon
+    # each REMINDER_POLL_SECONDS, which bounds the delay of a reminder set on
+    # another worker
+    REMINDER_RESYNC_SECONDS: int = 300
+    REMINDER_POLL_SECONDS: int = 5
+
+    # Adaptive sync cadence (sync_schedules table). Each user's interval aims
+    # for SYNC_TARGET_NEW_EMAILS per sync at their observed arrival rate,
+    # shortened while they are active and stretched to the max when idle.
+    SYNC_MIN_INTERVAL_MINUTES: int = 10
+    SYNC_MAX_INTERVAL_MINUTES: int = 360
+    SYNC_ACTIVE_INTERVAL_MINUTES: int = 15
+    SYNC_ACTIVE_WINDOW_MINUTES: int = 60
+    SYNC_IDLE_AFTER_DAYS: int = 7
+    SYNC_TARGET_NEW_EMAILS: float = 5.0
+    SYNC_RATE_SMOOTHING: float = 0.3
+    SYNC_JITTER_FRACTION: float = 0.2
+    # Most scheduled syncs started per minute, across all workers
+    SYNC_BUDGET_PER_TICK: int = 10
+    # Activity is written at most once per window per user and process
+    SYNC_ACTIVITY_WRITE_SECONDS: int = 300
+
+    # Job leases (job_leases table): how long a crashed worker blocks a job
+    SYNC_LEASE_SECONDS: int = 300
+    SYNC_DISPATCH_LEASE_SECONDS: int = 50
+    RETENTION_LEASE_SECONDS: int = 600
+
+    # Push notifications (ntfy). Queued in notification_outbox and sent in the
+    # background; a user's notifications within the digest window go out as one.
+    NOTIFICATION_TOPIC: str | None = None
+    NTFY_BASE_URL: str = "https://ntfy.sh"
+    NOTIFY_DIGEST_WINDOW_SECONDS: int = 60
+    NOTIFY_POLL_SECONDS: int = 10
+    NOTIFY_BATCH_SIZE: int = 200
+    NOTIFY_MAX_ATTEMPTS: int = 6
+    NOTIFY_BACKOFF_BASE_SECONDS: int = 15
+    NOTIFY_BACKOFF_MAX_SECONDS: int = 900
+    NOTIFY_CONNECT_TIMEOUT_SECONDS: float = 3
+    NOTIFY_READ_TIMEOUT_SECONDS: float = 10
+    NOTIFY_LEASE_SECONDS: int = 60
+
+    # Concurrent AI calls when generating a sync batch's auto-replies
+    AUTO_REPLY_CONCURRENCY: int = 4
+    # Syncs that retry a pending auto-reply whose generation failed before giving up
+    AUTO_REPLY_MAX_ATTEMPTS: int = 3
+
+    # Background task extraction: emails that pass the pre-filter during a
+    # sync are sent to the model this many per call
+    TASK_EXTRACTION_BATCH_SIZE: int = 8
+    TASK_EXTRACTION_POLL_SECONDS: int = 30
+    TASK_EXTRACTION_LEASE_SECONDS: int = 300
+    # Emails whose extraction failed (e.g. a model outage) are retried with backoff
+    TASK_EXTRACTION_MAX_ATTEMPTS: int = 5
+    TASK_EXTRACTION_BACKOFF_BASE_SECONDS: int = 60
+    TASK_EXTRACTION_BACKOFF_MAX_SECONDS: int = 3600
+    # Minimum task_signal_score (see task_extractor) for an email to reach the model
+    TASK_PREFILTER_THRESHOLD: float = 2.0
+
+    # Compiled sender-rule/interest matchers, cached per user. Changes made
+    # on another worker are picked up once the entry expires.
+    SENDER_MATCHER_TTL_SECONDS: int = 300
+    SENDER_MATCHER_MAX_ENTRIES: int = 1024
+    # Rows per write when re-scoring existing mail after a preference change
+    REPRIORITIZE_BATCH_SIZE: int = 500
+
+    # Outbound mail (outbound_emails). Sends run on a small pool with at most
+    # MAIL_PER_USER_CONCURRENCY in flight per user across all workers.
+    MAIL_SEND_WORKERS: int = 4
+    MAIL_PER_USER_CONCURRENCY: int = 1
+    MAIL_POLL_SECONDS: int = 5
+    MAIL_SEND_MAX_ATTEMPTS: int = 5
+    MAIL_BACKOFF_BASE_SECONDS: int = 30
+    MAIL_BACKOFF_MAX_SECONDS: int = 1800
+    # A send still "sending" after this long is assumed dead and re-checked
+    MAIL_CLAIM_SECONDS: int = 300
+    # Workers claim under a short lease so the per-user count can't race
+    MAIL_CLAIM_LEASE_SECONDS: int = 30
+    GMAIL_SERVICE_CACHE_SECONDS: int = 1800
+
+    # Push events (/events). "memory" only reaches clients on the same worker.
+    EVENT_BROKER: str = "memory"
+    EVENT_QUEUE_SIZE: int = 100
+    EVENT_HEARTBEAT_SECONDS: int = 15
+
+    # Retention: trashed / archived emails are purged in chunks by the scheduler
+    TRASH_RETENTION_DAYS: int = 30
+    ARCHIVE_RETENTION_DAYS: int = 90
+    RETENTION_INTERVAL_MINUTES: int = 60
+    RETENTION_CHUNK_SIZE: int = 200
+    RETENTION_VACUUM_PAGES: int = 500
 
     # Gmail
 
@@ -27,6 +139,14 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "supersecretkey" # TODO: Change in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440 # 24 hours
+    # Verified token -> user identity cache (per process)
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 4096
+    # Cached /emails, /threads, /tasks bodies keyed by mailbox version
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: int = 600
+    # /search?body=true decompresses at most this many of the user's newest bodies
+    SEARCH_BODY_MAX_EMAILS: int = 2000
     TOKEN_ENCRYPTION_KEY: str = Field(..., description="Key for encrypting OAuth tokens")
 
 
@@ -1,7 +1,12 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, bindparam, update
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.sqlite import insert
+from app.database.dialects import insert_ignore
 from sqlalchemy.exc import IntegrityError
-from app.database.models import Email, EmailAttachment, UserSummary, EmailDraft, EmailReply, Feedback, User
+from app.database.models import Email, EmailAttachment, EmailBody, UserSummary, EmailDraft, EmailReply, Feedback, User, MailboxVersion, SyncState, UserPreference
+from app.utils.compression import compress_text
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
@@ -14,14 +19,59 @@ def create_user(db: Session, email: str):
     return user
 
 
+def visible_emails(user_email: str):
+    """
+    Filter for the user's emails that finished the sync pipeline. Rows still
+    being fetched or enriched have no summary, category or real priority yet,
+    so lists, search and counts leave them out.
+    """
+    return and_(Email.user_email == user_email, Email.sync_stage == "prioritized")
+
+
+def get_mailbox_version(db: Session, user_email: str) -> int:
+    version = db.query(MailboxVersion.version).filter(MailboxVersion.user_email == user_email).scalar()
+    return version or 0
+
+
+def bump_mailbox_versions(db: Session, user_emails: Iterable[str]):
+    """
+    Increment the mailbox version of each user. Call it in the same transaction
+    as any write that changes what /emails, /threads or /tasks return.
+    Does not commit.
+    """
+    user_emails = sorted({u for u in user_emails if u})
+    if not user_emails:
+        return
+    db.execute(
+        insert_ignore(db, MailboxVersion, ['user_email']),
+        [{"user_email": u, "version": 0} for u in user_emails]
+    )
+    db.execute(
+        update(MailboxVersion)
+        .where(MailboxVersion.user_email.in_(user_emails))
+        .values(version=MailboxVersion.version + 1)
+    )
+
+
+def update_sync_state(db: Session, user_email: str, **fields):
+    """
+    Upsert the user's sync checkpoint (see SyncState). pending_ids may be a
+    list; it is stored as JSON. Does not commit.
+    """
+    if "pending_ids" in fields and fields["pending_ids"] is not None:
+        fields["pending_ids"] = json.dumps(fields["pending_ids"])
+    db.execute(insert_ignore(db, SyncState, ['user_email']), [{"user_email": user_email, "stage": "idle"}])
+    if fields:
+        db.execute(update(SyncState).where(SyncState.user_email == user_email).values(**fields))
+
+
 def save_email(db: Session, email_id, user_email, sender, subject, body, summary, priority, category, thread_id, smart_thread_id, attachments, timestamp, is_read=False):
     try:
-        stmt = insert(Email).values(
+        stmt = insert_ignore(db, Email, ['email_id']).values(
             email_id=email_id,
             user_email=user_email,
             sender=sender,
             subject=subject,
-            body=body,
             summary=summary,
             priority=priority,
             category=category,
@@ -29,24 +79,29 @@ def save_email(db: Session, email_id, user_email, sender, subject, body, summary
             smart_thread_id=smart_thread_id,
             timestamp=timestamp,
             is_read=is_read
-        ).on_conflict_do_nothing(
-            index_elements=['email_id']  # UNIQUE column
         )
 
         db.execute(stmt)
 
+        codec, data = compress_text(body)
+        body_stmt = insert_ignore(db, EmailBody, ['email_id']).values(
+            email_id=email_id,
+            codec=codec,
+            data=data
+        )
+        db.execute(body_stmt)
+
         for att in attachments:
-            att_stmt = insert(EmailAttachment).values(
+            att_stmt = insert_ignore(db, EmailAttachment, ['attachment_id']).values(
                 email_id=email_id,
                 filename=att["filename"],
                 mime_type=att["mime_type"],
                 size=att["size"],
                 attachment_id=att["attachment_id"]
-            ).on_conflict_do_nothing(
-                index_elements=['attachment_id']  # unique key
             )
             db.execute(att_stmt)
 
+        bump_mailbox_versions(db, [user_email])
         db.commit()
 
     except IntegrityError:
@@ -56,10 +111,145 @@ def save_email(db: Session, email_id, user_email, sender, subject, body, summary
         db.rollback()
         print(f"Error saving email: {e}")
 
+def _email_batch_rows(emails: List[dict]):
+    """Split save_email-style dicts into executemany parameter lists per table."""
+    email_rows, body_rows, attachment_rows = [], [], []
+    for e in emails:
+        email_rows.append({
+            "email_id": e["email_id"],
+            "user_email": e["user_email"],
+            "sender": e.get("sender"),
+            "subject": e.get("subject"),
+            "summary": e.get("summary"),
+            "priority": e.get("priority") or "Medium",
+            "category": e.get("category"),
+            "thread_id": e.get("thread_id"),
+            "smart_thread_id": e.get("smart_thread_id"),
+            "timestamp": e.get("timestamp"),
+            "is_read": e.get("is_read", False),
+            "sync_stage": e.get("sync_stage") or "prioritized"
+        })
+        codec, data = compress_text(e.get("body"))
+        body_rows.append({"email_id": e["email_id"], "codec": codec, "data": data})
+        for att in e.get("attachments") or []:
+            attachment_rows.append({
+                "email_id": e["email_id"],
+                "filename": att["filename"],
+                "mime_type": att["mime_type"],
+                "size": att["size"],
+                "attachment_id": att["attachment_id"]
+            })
+    return email_rows, body_rows, attachment_rows
+
+
+def _execute_email_batch(db: Session, emails: List[dict], priority_updates: Dict[str, str]):
+    email_rows, body_rows, attachment_rows = _email_batch_rows(emails)
+    if email_rows:
+        db.execute(insert_ignore(db, Email, ['email_id']), email_rows)
+        db.execute(insert_ignore(db, EmailBody, ['email_id']), body_rows)
+    if attachment_rows:
+        db.execute(insert_ignore(db, EmailAttachment, ['attachment_id']), attachment_rows)
+    if priority_updates:
+        update_email_priorities(db, priority_updates, commit=False)
+    bump_mailbox_versions(db, [row["user_email"] for row in email_rows])
+
+
+def save_email_batch(db: Session, emails: List[dict], priority_updates: Optional[Dict[str, str]] = None) -> List[dict]:
+    """
+    Persist a whole sync batch in one transaction.
+
+    `emails` holds dicts with the same fields as save_email; `priority_updates`
+    maps email_id -> priority for rows already in the database. Inserts use
+    executemany. If the batch fails, rows are retried one by one so a single
+    bad row does not sink the rest.
+
+    Returns one outcome per input email:
+    {"email_id": ..., "status": "inserted" | "exists" | "error", "error": str | None}
+    """
+    priority_updates = priority_updates or {}
+    ids = [e["email_id"] for e in emails]
+    existing = set()
+    if ids:
+        existing = {
+            email_id for (email_id,) in
+            db.query(Email.email_id).filter(Email.email_id.in_(ids)).all()
+        }
+
+    outcomes = []
+    new_emails = []
+    seen = set()
+    for e in emails:
+        if e["email_id"] in existing or e["email_id"] in seen:
+            outcomes.append({"email_id": e["email_id"], "status": "exists", "error": None})
+        else:
+            seen.add(e["email_id"])
+            new_emails.append(e)
+            outcomes.append({"email_id": e["email_id"], "status": "inserted", "error": None})
+
+    try:
+        _execute_email_batch(db, new_emails, priority_updates)
+        db.commit()
+        return outcomes
+    except Exception as e:
+        db.rollback()
+        print(f"Batch save failed, retrying row by row: {e}")
+
+    by_id = {o["email_id"]: o for o in outcomes if o["status"] == "inserted"}
+    for email in new_emails:
+        try:
+            _execute_email_batch(db, [email], {})
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            by_id[email["email_id"]].update(status="error", error=str(e))
+
+    if priority_updates:
+        try:
+            update_email_priorities(db, priority_updates)
+        except Exception as e:
+            db.rollback()
+            print(f"Error updating priorities: {e}")
+
+    return outcomes
+
+
+def update_email_priorities(db: Session, priority_updates: Dict[str, str], commit: bool = True, sync_stage: Optional[str] = None,
+                            ai_priorities: Optional[Dict[str, str]] = None):
+    """
+    Set priorities for many emails with a single executemany UPDATE.
+    Pass sync_stage to advance the rows' pipeline checkpoint in the same statement,
+    and ai_priorities (same keys) to store the model's priority alongside.
+    """
+    if not priority_updates:
+        return
+    table = Email.__table__
+    values = {"priority": bindparam("b_priority")}
+    if sync_stage:
+        values["sync_stage"] = sync_stage
+    if ai_priorities is not None:
+        values["ai_priority"] = bindparam("b_ai_priority")
+    stmt = (
+        update(table)
+        .where(table.c.email_id == bindparam("b_email_id"))
+        .values(**values)
+    )
+    db.execute(stmt, [
+        {"b_email_id": email_id, "b_priority": priority, "b_ai_priority": (ai_priorities or {}).get(email_id)}
+        for email_id, priority in priority_updates.items()
+    ])
+    bump_mailbox_versions(db, [
+        user_email for (user_email,) in
+        db.query(Email.user_email).filter(Email.email_id.in_(list(priority_updates))).distinct()
+    ])
+    if commit:
+        db.commit()
+
+
 def update_email_priority(db: Session, email_id: str, new_priority: str):
     email_obj = db.query(Email).filter(Email.email_id == email_id).first()
     if email_obj:
         email_obj.priority = new_priority
+        bump_mailbox_versions(db, [email_obj.user_email])
         db.commit()
 
 def get_user_summary(db: Session, user_email: str):
@@ -72,6 +262,7 @@ def save_user_summary(db: Session, user_email: str, summary_text: str):
     else:
         new_summary = UserSummary(user_email=user_email, summary=summary_text)
         db.add(new_summary)
+    bump_mailbox_versions(db, [user_email])
     db.commit()
 
 def create_feedback(db: Session, email_id: str, priority: str, is_correct: bool):
@@ -96,14 +287,15 @@ def save_draft(db: Session, email_id: str, user_email: str, draft_text: str, ton
         db.add(draft)
     db.commit()
     
-def delete_draft(db: Session, email_id: str, user_email: str):
+def delete_draft(db: Session, email_id: str, user_email: str, commit: bool = True):
     db.query(EmailDraft).filter(
         EmailDraft.email_id == email_id,
         EmailDraft.user_email == user_email
     ).delete()
-    db.commit()
+    if commit:
+        db.commit()
 
-def save_reply(db: Session, email_id: str, user_email: str, reply_text: str, tone: str, is_auto: bool):
+def save_reply(db: Session, email_id: str, user_email: str, reply_text: str, tone: str, is_auto: bool, commit: bool = True):
     reply_record = EmailReply(
         email_id=email_id,
         user_email=user_email,
@@ -112,5 +304,34 @@ def save_reply(db: Session, email_id: str, user_email: str, reply_text: str, ton
         is_auto=is_auto
     )
     db.add(reply_record)
-    db.commit()
-    return reply_record
\ No newline at end of file
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+    return reply_record
+
+def add_sent_email(db: Session, user_email: str, email_id: str, thread_id: Optional[str], subject: str, body: str):
+    """Store a message the user sent so it shows in the Sent folder. Does not commit."""
+    _execute_email_batch(db, [{
+        "email_id": email_id,
+        "user_email": user_email,
+        "sender": user_email,
+        "subject": subject,
+        "body": body,
+        "summary": "Sent message",
+        "priority": "Medium",
+        "category": "Personal",
+        "thread_id": thread_id,
+        "timestamp": datetime.now()
+    }], {})
+
+
+def get_user_timezones(db: Session, user_emails: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Each user's timezone preference (None if unset), in one query."""
+    user_emails = list({u for u in user_emails if u})
+    if not user_emails:
+        return {}
+    timezones = dict.fromkeys(user_emails)
+    timezones.update(db.query(UserPreference.user_email, UserPreference.timezone)
+                     .filter(UserPreference.user_email.in_(user_emails)).all())
+    return timezones
@@ -1,16 +1,93 @@
-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 from app.core.config import settings
 
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout waits instead of failing."""
+    cursor = dbapi_connection.cursor()
+    # Takes effect on a new database; an existing one needs migrations.vacuum()
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _set_writer_pragmas(dbapi_connection, connection_record):
+    _set_sqlite_pragmas(dbapi_connection, connection_record)
+    # Let SQLAlchemy emit BEGIN itself so SAVEPOINTs behave (pysqlite quirk)
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    # Take the write lock up front instead of upgrading a read transaction later
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def is_sqlite_url(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_memory_sqlite_url(url: str) -> bool:
+    database = make_url(url).database
+    return is_sqlite_url(url) and database in (None, "", ":memory:")
+
+
+def create_db_engine(url: str = None, writer: bool = False, **overrides):
+    """
+    Build an engine for any supported backend.
+
+    SQLite gets thread-sharing, WAL pragmas and (for the writer connection)
+    BEGIN IMMEDIATE. Server databases get a connection pool sized by
+    DB_POOL_SIZE / DB_MAX_OVERFLOW with pre-ping and recycling, so several
+    uvicorn workers can share one database.
+    """
+    url = url or settings.DATABASE_URL
+
+    if is_sqlite_url(url):
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if is_memory_sqlite_url(url):
+            kwargs["poolclass"] = StaticPool
+        elif writer:
+            kwargs.update(pool_size=1, max_overflow=0)
+        kwargs.update(overrides)
+
+        db_engine = create_engine(url, **kwargs)
+        if not is_memory_sqlite_url(url):
+            event.listen(db_engine, "connect", _set_writer_pragmas if writer else _set_sqlite_pragmas)
+            if writer:
+                event.listen(db_engine, "begin", _begin_immediate)
+        return db_engine
+
+    kwargs = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+    kwargs.update(overrides)
+    return create_engine(url, **kwargs)
+
+
+IS_SQLITE = is_sqlite_url(settings.DATABASE_URL)
+
 # Engine setup
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine()
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Dedicated connection for the single writer thread (see app/database/writer.py)
+if IS_SQLITE and not is_memory_sqlite_url(settings.DATABASE_URL):
+    writer_engine = create_db_engine(writer=True)
+else:
+    writer_engine = engine
+
+WriterSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=writer_engine)
+
 # Base for ORM models
 Base = declarative_base()
 
@@ -20,4 +97,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
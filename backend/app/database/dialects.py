@@ -0,0 +1,47 @@
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import GenericFunction
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, model, index_elements):
+    """
+    INSERT ... that silently skips rows conflicting on `index_elements`,
+    for whichever backend the session is bound to.
+    """
+    dialect = db.get_bind().dialect.name
+    table = getattr(model, "__table__", model)
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+        return insert(table).prefix_with("IGNORE")
+
+    from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing(index_elements=index_elements)
+
+
+class str_position(GenericFunction):
+    """1-based position of `substring` in `string` (0 if absent), on any backend."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(str_position)
+def _compile_str_position(element, compiler, **kw):
+    string, substring = list(element.clauses)
+    return f"instr({compiler.process(string, **kw)}, {compiler.process(substring, **kw)})"
+
+
+@compiles(str_position, "postgresql")
+def _compile_str_position_pg(element, compiler, **kw):
+    string, substring = list(element.clauses)
+    return f"strpos({compiler.process(string, **kw)}, {compiler.process(substring, **kw)})"
+
+
+@compiles(str_position, "mysql")
+def _compile_str_position_mysql(element, compiler, **kw):
+    string, substring = list(element.clauses)
+    return f"locate({compiler.process(substring, **kw)}, {compiler.process(string, **kw)})"
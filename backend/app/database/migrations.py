@@ -0,0 +1,303 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once; applied versions are recorded in `schema_migrations`.
+Run them with `python migrate_db.py` (or at startup); failures are raised, not
+swallowed. Migrations must be idempotent so that a database created by
+`Base.metadata.create_all` (which already has the latest schema) can run them
+safely.
+
+Migrations never run a full VACUUM: it rewrites the whole SQLite file while
+holding the database lock, which would block startup. `migrate_db.py` runs it
+once afterwards (see vacuum()).
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, bindparam, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from app.database.database import engine as default_engine, Base
+from app.database.models import EmailBody, EmailTask
+from app.utils.compression import compress_text
+
+BODY_BATCH_SIZE = 500
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    """
+    Register a migration. Transactional migrations receive a Connection inside
+    a transaction; non-transactional ones receive the Engine and manage their
+    own batches (e.g. data copies).
+    """
+    def decorator(fn):
+        MIGRATIONS.append((version, name, transactional, fn))
+        return fn
+    return decorator
+
+
+def _columns(bind, table: str):
+    return {c["name"] for c in inspect(bind).get_columns(table)}
+
+
+def _create_indexes(conn, table_name: str, indexes):
+    # Build detached Index objects: Index(name, table.c...) would attach a
+    # duplicate to the model's table and break later create_all calls.
+    table = Table(table_name, MetaData(), *[Column(c) for c in {c for _, cols in indexes for c in cols}])
+    for name, columns in indexes:
+        Index(name, *[table.c[c] for c in columns]).create(conn, checkfirst=True)
+
+
+# --------------------------
+# Migrations
+# --------------------------
+
+@migration(1, "email state columns")
+def add_email_state_columns(conn):
+    existing = _columns(conn, "emails")
+    for column, ddl in [
+        ("is_archived", "BOOLEAN DEFAULT FALSE"),
+        ("is_deleted", "BOOLEAN DEFAULT FALSE"),
+        ("is_read", "BOOLEAN DEFAULT FALSE"),
+        ("archived_at", "TIMESTAMP"),
+        ("deleted_at", "TIMESTAMP"),
+    ]:
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE emails ADD COLUMN {column} {ddl}"))
+            print(f"Migration: added emails.{column}")
+
+
+@migration(2, "move bodies to email_bodies", transactional=False)
+def move_email_bodies(engine):
+    """Move inline emails.body values into compressed email_bodies rows, then drop the column."""
+    if "body" not in _columns(engine, "emails"):
+        return
+
+    Base.metadata.create_all(bind=engine, tables=[EmailBody.__table__])
+
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT e.email_id, e.body FROM emails e "
+                "LEFT JOIN email_bodies b ON b.email_id = e.email_id "
+                "WHERE b.email_id IS NULL LIMIT :limit"
+            ), {"limit": BODY_BATCH_SIZE}).all()
+            if not rows:
+                break
+
+            params = []
+            for email_id, body in rows:
+                codec, data = compress_text(body)
+                params.append({"email_id": email_id, "codec": codec, "data": data})
+            conn.execute(EmailBody.__table__.insert(), params)
+            moved += len(rows)
+    print(f"Migration: moved {moved} email bodies to email_bodies")
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE emails DROP COLUMN body"))
+    # The space freed by the dropped column is reclaimed by vacuum()
+
+
+@migration(3, "performance indexes")
+def add_performance_indexes(conn):
+    # /emails folder views: user + state filters, newest first
+    # /emails?priority=..., analytics priority distribution
+    # /threads (subject/date/sender) and analytics timeline
+    _create_indexes(conn, "emails", [
+        ("ix_emails_user_state_ts", ["user_email", "is_deleted", "is_archived", "timestamp"]),
+        ("ix_emails_user_priority_ts", ["user_email", "priority", "timestamp"]),
+        ("ix_emails_user_thread_ts", ["user_email", "smart_thread_id", "timestamp"]),
+        ("ix_emails_user_category", ["user_email", "category"]),
+        ("ix_emails_user_ts", ["user_email", "timestamp"]),
+        # Retention: trash / archive expiry
+        ("ix_emails_deleted_at", ["is_deleted", "deleted_at"]),
+        ("ix_emails_archived_at", ["is_archived", "archived_at"]),
+    ])
+    _create_indexes(conn, "email_tasks", [
+        # Reminder dispatcher: due, unsent, open reminders
+        ("ix_tasks_reminder_due", ["reminder_sent", "completed", "reminder_time"]),
+        # /tasks list
+        ("ix_tasks_user_completed_created", ["user_email", "completed", "created_at"]),
+    ])
+
+
+@migration(4, "incremental auto-vacuum", transactional=False)
+def enable_incremental_vacuum(engine):
+    """Let the retention job hand free pages back with PRAGMA incremental_vacuum."""
+    # On an existing database the mode only takes effect with a full VACUUM,
+    # which is left to vacuum() (python migrate_db.py) rather than startup
+    if vacuum_pending(engine):
+        print("Migration: incremental auto-vacuum needs a one-time VACUUM; run `python migrate_db.py`")
+
+
+@migration(5, "email sync stage")
+def add_email_sync_stage(conn):
+    # Existing rows went through the old all-at-once pipeline, so they are done
+    if "sync_stage" not in _columns(conn, "emails"):
+        conn.execute(text("ALTER TABLE emails ADD COLUMN sync_stage VARCHAR NOT NULL DEFAULT 'prioritized'"))
+        print("Migration: added emails.sync_stage")
+    _create_indexes(conn, "emails", [
+        ("ix_emails_user_sync_stage", ["user_email", "sync_stage"]),
+    ])
+
+
+@migration(6, "email ai priority")
+def add_email_ai_priority(conn):
+    # Existing rows stay NULL: their priority may already include a rule or
+    # interest boost, so it is not the model's verdict. Re-scoring skips them.
+    if "ai_priority" not in _columns(conn, "emails"):
+        conn.execute(text("ALTER TABLE emails ADD COLUMN ai_priority VARCHAR"))
+        print("Migration: added emails.ai_priority")
+
+
+@migration(7, "email task extraction status")
+def add_email_task_extraction(conn):
+    # Existing rows stay NULL: they are extracted on demand, as before
+    if "task_extraction" not in _columns(conn, "emails"):
+        conn.execute(text("ALTER TABLE emails ADD COLUMN task_extraction VARCHAR"))
+        print("Migration: added emails.task_extraction")
+    _create_indexes(conn, "emails", [
+        ("ix_emails_task_extraction_ts", ["task_extraction", "timestamp"]),
+    ])
+
+
+@migration(8, "user timezone")
+def add_user_timezone(conn):
+    if "timezone" not in _columns(conn, "user_preferences"):
+        conn.execute(text("ALTER TABLE user_preferences ADD COLUMN timezone VARCHAR"))
+        print("Migration: added user_preferences.timezone")
+
+
+@migration(9, "task agenda index")
+def add_task_agenda_index(conn):
+    _create_indexes(conn, "email_tasks", [
+        ("ix_tasks_user_completed_deadline", ["user_email", "completed", "deadline"]),
+    ])
+
+
+@migration(10, "email auto-reply state")
+def add_email_auto_reply_state(conn):
+    columns = _columns(conn, "emails")
+    if "auto_reply_state" not in columns:
+        conn.execute(text("ALTER TABLE emails ADD COLUMN auto_reply_state VARCHAR"))
+        print("Migration: added emails.auto_reply_state")
+    if "auto_reply_attempts" not in columns:
+        conn.execute(text("ALTER TABLE emails ADD COLUMN auto_reply_attempts INTEGER NOT NULL DEFAULT 0"))
+        print("Migration: added emails.auto_reply_attempts")
+    _create_indexes(conn, "emails", [
+        ("ix_emails_user_auto_reply", ["user_email", "auto_reply_state"]),
+    ])
+
+
+@migration(11, "email task extraction retries")
+def add_email_task_extraction_retries(conn):
+    columns = _columns(conn, "emails")
+    if "task_extraction_attempts" not in columns:
+        conn.execute(text("ALTER TABLE emails ADD COLUMN task_extraction_attempts INTEGER NOT NULL DEFAULT 0"))
+        print("Migration: added emails.task_extraction_attempts")
+    if "task_extraction_next_attempt_at" not in columns:
+        conn.execute(text("ALTER TABLE emails ADD COLUMN task_extraction_next_attempt_at TIMESTAMP"))
+        print("Migration: added emails.task_extraction_next_attempt_at")
+
+
+@migration(12, "task times in utc")
+def convert_task_times_to_utc(conn):
+    # Deadlines and reminder times were stored as server-local wall time;
+    # they are naive UTC now, like the deadlines the parser produces
+    def _utc(value):
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None else None
+
+    table = EmailTask.__table__
+    rows = conn.execute(
+        select(table.c.id, table.c.deadline, table.c.reminder_time)
+        .where((table.c.deadline.isnot(None)) | (table.c.reminder_time.isnot(None)))
+    ).all()
+    if rows:
+        conn.execute(
+            update(table).where(table.c.id == bindparam("b_id"))
+            .values(deadline=bindparam("b_deadline"), reminder_time=bindparam("b_reminder_time")),
+            [{"b_id": row.id, "b_deadline": _utc(row.deadline), "b_reminder_time": _utc(row.reminder_time)}
+             for row in rows]
+        )
+        print(f"Migration: converted {len(rows)} task time(s) to UTC")
+
+
+# --------------------------
+# Runner
+# --------------------------
+
+def applied_versions(bind=None):
+    bind = bind or default_engine
+    _metadata.create_all(bind=bind)
+    with bind.connect() as conn:
+        return {v for (v,) in conn.execute(select(schema_migrations.c.version))}
+
+
+def _record(conn, version: int, name: str):
+    conn.execute(schema_migrations.insert().values(
+        version=version, name=name, applied_at=datetime.now()
+    ))
+
+
+def vacuum_pending(bind=None) -> bool:
+    """Whether a SQLite database still needs the one-time VACUUM that turns on incremental auto-vacuum."""
+    bind = bind or default_engine
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect() as conn:
+        return conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2
+
+
+def vacuum(bind=None) -> bool:
+    """
+    Rewrite a SQLite database with incremental auto-vacuum on, reclaiming all
+    free space. Holds the database lock for the whole rewrite (seconds to
+    minutes on a large mailbox), so run it offline. Returns whether it ran.
+    """
+    bind = bind or default_engine
+    if not vacuum_pending(bind):
+        return False
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # The pragma only sticks if VACUUM runs on the same connection
+        conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+    return True
+
+
+def run_migrations(bind=None):
+    """Apply pending migrations in version order. Returns the versions applied."""
+    bind = bind or default_engine
+    Base.metadata.create_all(bind=bind)
+    done = applied_versions(bind)
+
+    applied = []
+    for version, name, transactional, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        print(f"Applying migration {version}: {name}")
+        try:
+            if transactional:
+                with bind.begin() as conn:
+                    fn(conn)
+                    _record(conn, version, name)
+            else:
+                fn(bind)
+                with bind.begin() as conn:
+                    _record(conn, version, name)
+        except IntegrityError:
+            # Another process recorded this version first
+            print(f"Migration {version} already applied elsewhere")
+            continue
+        except Exception as e:
+            print(f"Migration {version} ({name}) failed: {e}")
+            raise
+        applied.append(version)
+    return applied
@@ -1,7 +1,8 @@
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, LargeBinary, Index, func, ForeignKey
 from sqlalchemy.orm import relationship
 from app.database.database import Base
+from app.utils.compression import compress_text, decompress_text
 
 class Feedback(Base):
     """ORM model for feedback records."""
@@ -22,9 +23,9 @@ class Email(Base):
     user_email = Column(String, nullable=False, index=True)
     sender = Column(String, nullable=True)
     subject = Column(String, nullable=True)
-    body = Column(String, nullable=True)
     summary = Column(String, nullable=True)
     priority = Column(String, default="Medium")
+    ai_priority = Column(String, nullable=True)  # model priority before sender rules / interests
     category = Column(String, default="Uncategorized")
     thread_id = Column(String)
     smart_thread_id = Column(String, nullable=True)
@@ -34,8 +35,62 @@ class Email(Base):
     is_read = Column(Boolean, default=False)
     archived_at = Column(DateTime(timezone=True), nullable=True)
     deleted_at = Column(DateTime(timezone=True), nullable=True)
+    # Ingest pipeline checkpoint: fetched -> enriched -> prioritized (see sync_service)
+    sync_stage = Column(String, nullable=False, default="prioritized", server_default="prioritized")
+    # Background task extraction (see task_queue): queued / skipped / done / failed,
+    # NULL for mail synced before it existed
+    task_extraction = Column(String, nullable=True)
+    task_extraction_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    task_extraction_next_attempt_at = Column(DateTime, nullable=True)  # NULL: no retry pending
+    # Rule-based auto-reply (see sync_service.auto_reply_stage): pending / queued /
+    # failed, NULL when no rule applied
+    auto_reply_state = Column(String, nullable=True)
+    auto_reply_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Composite indexes match the hot query shapes (see migrations.py, version 3)
+    __table_args__ = (
+        Index("ix_emails_user_state_ts", "user_email", "is_deleted", "is_archived", "timestamp"),
+        Index("ix_emails_user_priority_ts", "user_email", "priority", "timestamp"),
+        Index("ix_emails_user_thread_ts", "user_email", "smart_thread_id", "timestamp"),
+        Index("ix_emails_user_category", "user_email", "category"),
+        Index("ix_emails_user_ts", "user_email", "timestamp"),
+        Index("ix_emails_deleted_at", "is_deleted", "deleted_at"),
+        Index("ix_emails_archived_at", "is_archived", "archived_at"),
+        Index("ix_emails_user_sync_stage", "user_email", "sync_stage"),
+        Index("ix_emails_task_extraction_ts", "task_extraction", "timestamp"),
+        Index("ix_emails_user_auto_reply", "user_email", "auto_reply_state"),
+    )
 
     attachments = relationship("EmailAttachment", back_populates="email")
+    # Body lives in its own table and is only loaded when accessed
+    body_record = relationship("EmailBody", uselist=False, lazy="select", cascade="all, delete-orphan")
+
+    @property
+    def body(self):
+        return self.body_record.text if self.body_record else None
+
+    @body.setter
+    def body(self, value):
+        if self.body_record is None:
+            self.body_record = EmailBody()
+        self.body_record.text = value
+
+
+class EmailBody(Base):
+    """Compressed email bodies, kept out of the emails table so list queries stay small."""
+    __tablename__ = "email_bodies"
+
+    email_id = Column(String, ForeignKey("emails.email_id"), primary_key=True)
+    codec = Column(String, nullable=False, default="zlib")
+    data = Column(LargeBinary, nullable=True)
+
+    @property
+    def text(self):
+        return decompress_text(self.codec, self.data)
+
+    @text.setter
+    def text(self, value):
+        self.codec, self.data = compress_text(value)
 
 
 class EmailAttachment(Base):
@@ -82,6 +137,97 @@ class UserSummary(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class SyncState(Base):
+    """Per-user checkpoint of the Gmail sync, so an interrupted run resumes where it stopped."""
+    __tablename__ = "sync_states"
+
+    user_email = Column(String, primary_key=True)
+    stage = Column(String, nullable=False, default="idle")  # listed, fetching, enriching, prioritizing, idle
+    pending_ids = Column(String, nullable=True)  # JSON list of listed Gmail IDs not yet stored
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    last_error = Column(String, nullable=True)
+
+
+class SyncSchedule(Base):
+    """When each user's mailbox is next synced, and the signals that set the pace (see services/sync_schedule.py)."""
+    __tablename__ = "sync_schedules"
+
+    user_email = Column(String, primary_key=True)
+    next_run_at = Column(DateTime, nullable=False, index=True)
+    interval_seconds = Column(Integer, nullable=False)
+    arrival_rate = Column(Float, nullable=False, default=0.0)  # smoothed new emails per hour
+    last_synced_at = Column(DateTime, nullable=True)
+    last_active_at = Column(DateTime, nullable=True)  # last login / opened email
+
+
+class NotificationOutbox(Base):
+    """Push notifications waiting to be delivered by the background sender (see services/notification.py)."""
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_email = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # alert, reminder
+    title = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_outbox_user_status", "user_email", "status"),
+    )
+
+
+class OutboundEmail(Base):
+    """Emails queued for sending through Gmail by the outbound sender (see services/mail_outbox.py)."""
+    __tablename__ = "outbound_emails"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String, nullable=False, unique=True)
+    user_email = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # new, reply, auto_reply
+    email_id = Column(String, nullable=True)  # email being replied to
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    tone = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    claimed_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    gmail_message_id = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbound_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_outbound_user_status", "user_email", "status"),
+    )
+
+
+class JobLease(Base):
+    """Time-limited ownership of a background job, shared by all workers (see services/leases.py)."""
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)  # e.g. "reminders", "sync:<user_email>"
+    owner = Column(String, nullable=True)    # hostname:pid:nonce of the holding process
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, nullable=True)
+
+
+class MailboxVersion(Base):
+    """Per-user counter bumped by every mailbox write; drives ETags and the response cache."""
+    __tablename__ = "mailbox_versions"
+
+    user_email = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -106,6 +252,12 @@ class EmailTask(Base):
     reminder_time = Column(DateTime, nullable=True)
     reminder_sent = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index("ix_tasks_reminder_due", "reminder_sent", "completed", "reminder_time"),
+        Index("ix_tasks_user_completed_created", "user_email", "completed", "created_at"),
+        Index("ix_tasks_user_completed_deadline", "user_email", "completed", "deadline"),
+    )
+
 
 class UserPreference(Base):
     """Store user-specific preferences for personalization."""
@@ -116,6 +268,7 @@ class UserPreference(Base):
     primary_role = Column(String, nullable=True)  # e.g. "Software Engineer", "Student"
     interests = Column(String, nullable=True)     # stored as JSON string or comma-separated
     about_user = Column(String, nullable=True)    # Free text for context
+    timezone = Column(String, nullable=True)      # IANA name, e.g. "Europe/Berlin"; server local if unset
     created_at = Column(DateTime, server_default=func.now())
 
 
@@ -0,0 +1,160 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database.database import IS_SQLITE, WriterSessionLocal
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """
+    Serializes database writes through one thread and one connection.
+
+    Jobs are callables taking a Session. Jobs queued close together are run
+    in a single transaction (group commit), each inside its own SAVEPOINT so a
+    failing job does not roll back its neighbours. Such jobs must not commit
+    or roll back themselves. Jobs submitted with exclusive=True run alone and
+    own their transaction (they may commit, e.g. crud helpers).
+    """
+
+    def __init__(self, session_factory=WriterSessionLocal, max_batch: int = 64, max_wait: float = 0.005):
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Drain queued writes and stop the writer thread."""
+        thread = self._thread
+        if thread and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, fn: Callable[[Session], Any], exclusive: bool = False) -> Future:
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Cannot submit a write from inside a writer job")
+        self.start()
+        future = Future()
+        self._queue.put((fn, future, exclusive))
+        return future
+
+    def run(self, fn: Callable[[Session], Any], exclusive: bool = False, timeout: float = 30) -> Any:
+        """Submit a write and block until it is committed. Re-raises the job's exception."""
+        return self.submit(fn, exclusive).result(timeout)
+
+    def _loop(self):
+        pending = None
+        while True:
+            job = pending if pending is not None else self._queue.get()
+            pending = None
+            if job is _STOP:
+                return
+
+            if job[2]:
+                self._run_exclusive(job)
+                continue
+
+            # Coalesce whatever arrives within the wait window into one commit
+            batch = [job]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP or nxt[2]:
+                    pending = nxt
+                    break
+                batch.append(nxt)
+            self._run_group(batch)
+
+    def _run_exclusive(self, job):
+        fn, future, _ = job
+        if not future.set_running_or_notify_cancel():
+            return
+        db = self._session_factory()
+        try:
+            result = fn(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            db.close()
+
+    def _run_group(self, batch):
+        db = self._session_factory()
+        outcomes = []
+        try:
+            for fn, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with db.begin_nested():
+                        result = fn(db)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Group commit failed: {e}")
+            outcomes = [(future, None, err or e) for future, _, err in outcomes]
+        finally:
+            db.close()
+
+        for future, result, err in outcomes:
+            if err is not None:
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+
+
+def _run_inline(fn: Callable[[Session], Any]) -> Any:
+    """Fallback when the queue is disabled: run the write in its own session."""
+    db = WriterSessionLocal()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+writer = DatabaseWriter(
+    max_batch=settings.DB_WRITE_BATCH_MAX,
+    max_wait=settings.DB_WRITE_BATCH_WAIT_MS / 1000
+)
+atexit.register(writer.stop)
+
+
+def run_write(fn: Callable[[Session], Any], exclusive: bool = False, timeout: float = 30) -> Any:
+    """
+    Execute a write job and wait for its commit.
+
+    On SQLite (with DB_WRITE_QUEUE on) the job goes through the single writer
+    thread; otherwise it runs inline in a fresh session.
+    """
+    if IS_SQLITE and settings.DB_WRITE_QUEUE:
+        return writer.run(fn, exclusive=exclusive, timeout=timeout)
+    return _run_inline(fn)
@@ -1,74 +1,62 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.sheduler import start_scheduler
-from app.database.database import Base, engine
-from app.api import auth, emails, replies, feedback, analytics, categories, email_tasks, preferences
+from app.database.migrations import run_migrations
+from app.services.sync_jobs import sync_jobs
+from app.services.reminders import reminder_dispatcher
+from app.services.notification import notification_sender
+from app.services.mail_outbox import mail_sender
+from app.services.task_queue import task_extraction_worker
+from app.api import auth, emails, replies, feedback, analytics, categories, email_tasks, preferences, events
 from dotenv import load_dotenv
 load_dotenv()
 
 
-# Create tables automatically
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup work happens here rather than at import time, so importing
+    app.main is cheap. Set RUN_MIGRATIONS_ON_STARTUP / RUN_SCHEDULER to false
+    in processes that should skip it (e.g. all but one uvicorn worker).
+    """
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        run_migrations()
+
+    scheduler = None
+    if settings.RUN_SCHEDULER:
+        scheduler = start_scheduler()
+        reminder_dispatcher.start()
+        notification_sender.start()
+        mail_sender.start()
+        task_extraction_worker.start()
+    try:
+        yield
+    finally:
+        if scheduler:
+            scheduler.shutdown(wait=False)
+            reminder_dispatcher.stop()
+            notification_sender.stop()
+            mail_sender.stop()
+            task_extraction_worker.stop()
+        sync_jobs.shutdown(wait=False)
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
-# Start API Scheduler
-start_scheduler()
-
-from sqlalchemy.orm import Session
-from app.database.database import SessionLocal
-from app.database.models import Email
-from datetime import datetime, timedelta
-
-@app.on_event("startup")
-def cleanup_emails():
-    """Cleanup old emails on startup"""
-    try:
-        db: Session = SessionLocal()
-        now = datetime.now()
-        
-        # Trash: 30 days
-        trash_limit = now - timedelta(days=30)
-        db.query(Email).filter(Email.is_deleted == True, Email.deleted_at < trash_limit).delete()
-        
-        # Archive: 90 days
-        archive_limit = now - timedelta(days=90)
-        db.query(Email).filter(Email.is_archived == True, Email.archived_at < archive_limit).delete()
-        
-        db.commit()
-        db.close()
-        print("Cleanup completed.")
-    except Exception as e:
-        print(f"Cleanup failed: {e}")
-
-    try:
-        # DB Migration for is_read column (Hackathon safe)
-        db: Session = SessionLocal()
-        from sqlalchemy import text
-        try:
-            db.execute(text("ALTER TABLE emails ADD COLUMN is_read BOOLEAN DEFAULT 0"))
-            db.commit()
-            print("Migration: Added is_read column.")
-        except Exception as e:
-            # Column likely exists
-            # print(f"Migration skipped (likely exists): {e}")
-            pass
-        db.close()
-    except Exception:
-        pass
-
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
-    allow_headers=["Authorization", "Content-Type", "Accept"],
+    allow_headers=["Authorization", "Content-Type", "Accept", "Idempotency-Key"],
 )
 
 # Include Routers
@@ -80,6 +68,7 @@ app.include_router(analytics.router, tags=["Analytics"])
 app.include_router(categories.router, tags=["Categories"])
 app.include_router(email_tasks.router, tags=["Tasks"])
 app.include_router(preferences.router, prefix="/user", tags=["Preferences"])
+app.include_router(events.router, tags=["Events"])
 
 @app.get("/")
 def root():
@@ -48,4 +48,46 @@ class SmartThread(BaseModel):
 
 class ThreadGroup(BaseModel):
     group_key: str
-    emails: List[SmartThreadItem]
\ No newline at end of file
+    emails: List[SmartThreadItem]
+
+class ThreadPreview(BaseModel):
+    email_id: str
+    subject: Optional[str] = None
+    summary: Optional[str] = None
+
+class ThreadGroupSummary(BaseModel):
+    group_key: str
+    count: int
+    latest_timestamp: Optional[datetime] = None
+    latest: Optional[ThreadPreview] = None
+
+class ThreadGroupPage(BaseModel):
+    threads: List[ThreadGroupSummary]
+    next_cursor: Optional[str] = None
+
+class SmartThreadSummary(BaseModel):
+    smart_thread_id: str
+    count: int
+    latest_timestamp: Optional[datetime] = None
+    latest: Optional[ThreadPreview] = None
+
+class SmartThreadPage(BaseModel):
+    smart_threads: List[SmartThreadSummary]
+    next_cursor: Optional[str] = None
+
+class ThreadMember(BaseModel):
+    email_id: str
+    sender: Optional[str] = None
+    subject: Optional[str] = None
+    summary: Optional[str] = None
+    priority: Optional[str] = None
+    category: Optional[str] = None
+    thread_id: Optional[str] = None
+    smart_thread_id: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    is_read: Optional[bool] = False
+
+class ThreadMembersPage(BaseModel):
+    group_key: str
+    emails: List[ThreadMember]
+    next_cursor: Optional[str] = None
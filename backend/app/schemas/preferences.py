@@ -7,14 +7,16 @@ class UserPreferenceBase(BaseModel):
     primary_role: Optional[str] = None
     interests: Optional[List[str]] = None # Transformed to/from JSON/CSV in logic if needed
     about_user: Optional[str] = None
+    timezone: Optional[str] = None # IANA name, used to resolve task deadlines
 
 class UserPreferenceCreate(UserPreferenceBase):
-    pass
+    apply_to_existing: bool = False # Re-score already synced emails when interests change
 
 class UserPreferenceResponse(UserPreferenceBase):
     id: int
     user_email: str
     created_at: datetime
+    reprioritized_count: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -26,12 +28,13 @@ class SenderRuleBase(BaseModel):
     auto_reply: bool = False
 
 class SenderRuleCreate(SenderRuleBase):
-    pass
+    apply_to_existing: bool = False # Also re-prioritize already synced emails from this sender
 
 class SenderRuleResponse(SenderRuleBase):
     id: int
     user_email: str
     created_at: datetime
+    reprioritized_count: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -1,11 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, field_serializer
+from typing import Dict, Optional, List
+from datetime import datetime, timezone
 
 class EmailTaskResponse(BaseModel):
     id: int
     task_text: str
     deadline: Optional[datetime] = None
+    reminder_time: Optional[datetime] = None
     completed: bool
     source: str
     created_at: Optional[datetime] = None
@@ -14,7 +15,22 @@ class EmailTaskResponse(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_serializer("deadline", "reminder_time")
+    def serialize_utc(self, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored as naive UTC; send the offset so clients don't read them as local time
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
 class EmailTaskExtractionResponse(BaseModel):
     skipped: bool
     tasks: List[EmailTaskResponse]
     reason: Optional[str] = None
+
+class AgendaTaskResponse(EmailTaskResponse):
+    bucket: str
+
+class TaskAgendaResponse(BaseModel):
+    counts: Dict[str, int]
+    tasks: List[AgendaTaskResponse]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,115 @@
+"""
+Task agenda: a user's tasks bucketed by deadline in SQL.
+
+Buckets, relative to now in the user's timezone:
+  overdue      deadline already passed
+  today        due before midnight
+  week         due before next Monday
+  later        due after that
+  no_deadline  no deadline
+
+Bucket order follows deadline order, so a page is simply the next tasks by
+(deadline, id), dated tasks first, then undated ones by id. Both halves
+are range scans on ix_tasks_user_completed_deadline.
+"""
+from datetime import datetime, time, timedelta, timezone, tzinfo
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import Session
+from app.database.models import EmailTask
+
+OVERDUE = "overdue"
+TODAY = "today"
+WEEK = "week"
+LATER = "later"
+NO_DEADLINE = "no_deadline"
+BUCKETS = [OVERDUE, TODAY, WEEK, LATER, NO_DEADLINE]
+
+
+class Bounds:
+    """Bucket boundaries as naive UTC, the way EmailTask.deadline is stored."""
+
+    def __init__(self, now: datetime, tz: tzinfo):
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        local_today = now.astimezone(tz).date()
+
+        def _utc(day):
+            return datetime.combine(day, time(0), tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+        self.now = now.astimezone(timezone.utc).replace(tzinfo=None)
+        self.tomorrow = _utc(local_today + timedelta(days=1))
+        self.next_week = _utc(local_today + timedelta(days=7 - local_today.weekday()))
+
+    def bucket_expr(self):
+        deadline = EmailTask.deadline
+        return case(
+            (deadline.is_(None), NO_DEADLINE),
+            (deadline < self.now, OVERDUE),
+            (deadline < self.tomorrow, TODAY),
+            (deadline < self.next_week, WEEK),
+            else_=LATER
+        )
+
+    def bucket_range(self, bucket: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """[start, end) of a dated bucket."""
+        return {
+            OVERDUE: (None, self.now),
+            TODAY: (self.now, self.tomorrow),
+            WEEK: (self.tomorrow, self.next_week),
+            LATER: (self.next_week, None),
+        }[bucket]
+
+
+def _scope(user_email: str, completed: Optional[bool]):
+    conditions = [EmailTask.user_email == user_email]
+    if completed is not None:
+        conditions.append(EmailTask.completed == completed)
+    return conditions
+
+
+def bucket_counts(db: Session, user_email: str, bounds: Bounds, completed: Optional[bool] = False) -> Dict[str, int]:
+    """Number of tasks in every bucket, with one GROUP BY."""
+    bucket = bounds.bucket_expr().label("bucket")
+    counts = dict.fromkeys(BUCKETS, 0)
+    counts.update(db.execute(
+        select(bucket, func.count()).where(*_scope(user_email, completed)).group_by(bucket)
+    ).all())
+    return counts
+
+
+def agenda_page(db: Session, user_email: str, bounds: Bounds, limit: int, bucket: Optional[str] = None,
+                completed: Optional[bool] = False, after: Optional[Tuple[Optional[datetime], int]] = None):
+    """
+    One page of tasks in agenda order, each row with its bucket. `after` is
+    the (deadline, id) of the last task on the previous page. Returns
+    (rows, has_more).
+    """
+    columns = (EmailTask, bounds.bucket_expr().label("bucket"))
+    rows: List = []
+
+    after_deadline, after_id = after if after is not None else (None, None)
+    undated_only = after is not None and after_deadline is None
+
+    if bucket != NO_DEADLINE and not undated_only:
+        query = select(*columns).where(*_scope(user_email, completed), EmailTask.deadline.isnot(None))
+        if bucket is not None:
+            start, end = bounds.bucket_range(bucket)
+            if start is not None:
+                query = query.where(EmailTask.deadline >= start)
+            if end is not None:
+                query = query.where(EmailTask.deadline < end)
+        if after is not None:
+            query = query.where(or_(
+                EmailTask.deadline > after_deadline,
+                and_(EmailTask.deadline == after_deadline, EmailTask.id > after_id)
+            ))
+        rows = db.execute(query.order_by(EmailTask.deadline, EmailTask.id).limit(limit + 1)).all()
+
+    if bucket in (None, NO_DEADLINE) and len(rows) <= limit:
+        query = select(*columns).where(*_scope(user_email, completed), EmailTask.deadline.is_(None))
+        if undated_only:
+            query = query.where(EmailTask.id > after_id)
+        rows += db.execute(query.order_by(EmailTask.id).limit(limit + 1 - len(rows))).all()
+
+    return rows[:limit], len(rows) > limit
@@ -1,21 +1,27 @@
 import json
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 from app.core.config import settings
-from app.services.notification import send_notification
 load_dotenv()
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+_client = None
+
+def get_client():
+    """Build the OpenRouter client on first use (importing openai is slow)."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(
+            base_url="https://openrouter.ai/api/v1",
+            api_key=os.getenv("OPENAI_API_KEY")
+        )
+    return _client
 
 # Helper for safe API calls
 def safe_chat_completion(model, messages, max_tokens=1000, temperature=0.7):
     """Wraps OpenAI API calls with error handling for OpenRouter/Credits."""
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=model,
             messages=messages,
             max_tokens=max_tokens,
@@ -103,19 +109,8 @@ def analyze_emails_with_ai(emails):
         elif raw_output.startswith("```"):
             raw_output = raw_output[3:-3].strip()
             
-        analysis=json.loads(raw_output)
-        high_priority_exists = any(
-            p.get("priority", "").lower() == "high"
-            for p in analysis.get("priorities", [])
-        )
-
-        if  high_priority_exists:
-           
-
-            summary = analysis.get("overall_summary", "Urgent email detected.")
-            send_notification(summary)
-            print(f"High Priority Alert: {summary}")
-            # send_notification(summary) # Placeholder for future implementation
+        # High-priority alerts are queued by the sync pipeline once the
+        # personalized priorities are known (see sync_service)
         return json.loads(raw_output)
     except Exception as e:
         err_str = str(e)
@@ -175,6 +170,38 @@ def categorize_email_with_ai(subject, body, sender=None):
         return "Personal"
 
 def generate_smart_reply(subject, body, sender, category, tone):
+    try:
+        return _generate_reply(subject, body, sender, category, tone)
+    except Exception as e:
+        err_str = str(e)
+        fallback_msg = "Could not generate reply."
+        if "AI_QUOTA_EXCEEDED" in err_str:
+             fallback_msg = "⚠️ AI Quota Exceeded. Please check billing or try again later."
+        
+        return {"subject": f"Re: {subject}", "body": fallback_msg}
+
+def generate_smart_replies(emails, tone, max_workers=4):
+    """
+    Generate replies for several emails concurrently. `emails` holds dicts with
+    subject, body, sender and category. Returns one {"subject", "body"} dict
+    per email, or None where generation failed (never a fallback text, so
+    callers can't send one by mistake).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _one(email):
+        try:
+            return _generate_reply(email["subject"], email["body"], email["sender"], email["category"], tone)
+        except Exception as e:
+            print(f"Reply generation failed for {email['subject']!r}: {e}")
+            return None
+
+    if not emails:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(emails)))) as pool:
+        return list(pool.map(_one, emails))
+
+def _generate_reply(subject, body, sender, category, tone):
     prompt = f"""
     You are an intelligent email assistant. Write a reply to this email.
 
@@ -199,28 +226,20 @@ def generate_smart_reply(subject, body, sender, category, tone):
     }}
     """
 
-    try:
-        content = safe_chat_completion(
-            model="arcee-ai/trinity-large-preview:free",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.4
-        )
-        
-        # Clean markdown
-        if content.startswith("```json"):
-            content = content[7:-3].strip()
-        elif content.startswith("```"):
-            content = content[3:-3].strip()
-            
-        return json.loads(content)
-    except Exception as e:
-        err_str = str(e)
-        fallback_msg = "Could not generate reply."
-        if "AI_QUOTA_EXCEEDED" in err_str:
-             fallback_msg = "⚠️ AI Quota Exceeded. Please check billing or try again later."
+    content = safe_chat_completion(
+        model="arcee-ai/trinity-large-preview:free",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=500,
+        temperature=0.4
+    )
+    
+    # Clean markdown
+    if content.startswith("```json"):
+        content = content[7:-3].strip()
+    elif content.startswith("```"):
+        content = content[3:-3].strip()
         
-        return {"subject": f"Re: {subject}", "body": fallback_msg}
+    return json.loads(content)
 
 def infer_category_from_sender(sender):
     if not sender: return None
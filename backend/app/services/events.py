@@ -0,0 +1,123 @@
+"""
+Per-user event fan-out for the /events stream.
+
+Publishers (the sync pipeline, the scheduler, API writes) call publish() from
+any thread after their write has committed. Subscribers are SSE connections
+running on the event loop. The broker is chosen by settings.EVENT_BROKER;
+the in-process one only reaches clients connected to the same worker, so a
+shared backend (e.g. Redis pub/sub) can be plugged in via register_broker().
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+
+# Event types
+EMAILS_NEW = "emails.new"
+EMAIL_UPDATED = "email.updated"
+EMAILS_PRIORITY = "emails.priority"
+REMINDER_FIRED = "reminder.fired"
+SYNC_FINISHED = "sync.finished"
+OUTBOUND_UPDATED = "outbound.updated"
+
+
+class Subscription:
+    """One client's queue of pending events."""
+
+    def __init__(self, user_email: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.user_email = user_email
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, event: dict):
+        # Runs on the subscriber's loop. A slow client drops its oldest events
+        # rather than growing without bound; it can resync with /emails.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InMemoryBroker:
+    """Process-local pub/sub. Thread-safe publish; subscribers live on an event loop."""
+
+    def __init__(self, queue_size: int = 100):
+        self._queue_size = queue_size
+        self._subscribers: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_email: str) -> Subscription:
+        sub = Subscription(user_email, asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_email, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_email)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_email]
+
+    def publish(self, user_email: str, event: dict):
+        with self._lock:
+            subs = list(self._subscribers.get(user_email, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:
+                # Loop already closed; the connection is going away
+                self.unsubscribe(sub)
+
+    def subscriber_count(self, user_email: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_email, ()))
+
+
+_BROKER_FACTORIES: Dict[str, Callable[[], object]] = {
+    "memory": lambda: InMemoryBroker(queue_size=settings.EVENT_QUEUE_SIZE),
+}
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def register_broker(name: str, factory: Callable[[], object]):
+    """Make a broker backend selectable with EVENT_BROKER=<name>."""
+    _BROKER_FACTORIES[name] = factory
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                factory = _BROKER_FACTORIES.get(settings.EVENT_BROKER)
+                if factory is None:
+                    raise ValueError(f"Unknown EVENT_BROKER: {settings.EVENT_BROKER}")
+                _broker = factory()
+    return _broker
+
+
+def publish(user_email: str, event_type: str, **data):
+    """Send a compact event to the user's open streams. Never raises."""
+    event = {"type": event_type, "at": datetime.now().isoformat(), **data}
+    try:
+        get_broker().publish(user_email, event)
+    except Exception as e:
+        print(f"Event publish failed ({event_type}): {e}")
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=_json_default)}\n\n"
@@ -2,19 +2,18 @@ import os
 import base64
 import datetime
 import ssl
+import threading
 import requests
 
-from bs4 import BeautifulSoup
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from email.mime.text import MIMEText
 from app.core.config import settings
 from app.core.crypto import encrypt_data, decrypt_data
+from app.utils.ttl_cache import TTLCache
 import json
 
+# Google client libraries and bs4 are imported inside the functions that use
+# them so that importing this module (and app.main) stays cheap.
+
 # Ignore SSL verification warnings
 ssl._create_default_https_context = ssl._create_unverified_context
 requests.packages.urllib3.disable_warnings()
@@ -30,6 +29,10 @@ SCOPES = [
 
 def get_credentials(user_email: str):
     """Retrieve and refresh Google OAuth credentials."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     os.makedirs(settings.TOKENS_DIR, exist_ok=True)
     token_path = f"{settings.TOKENS_DIR}/{user_email}.json"
 
@@ -82,13 +85,34 @@ def get_credentials(user_email: str):
 
 def authenticate_gmail(user_email: str):
     """Authenticate Gmail service."""
+    from googleapiclient.discovery import build
     creds = get_credentials(user_email)
     if not creds:
         return None
     return build('gmail', 'v1', credentials=creds)
 
+# Built Gmail clients, reused by the outbound mail sender. A client (its
+# httplib2 connection) is not thread-safe, so each thread gets its own:
+# with MAIL_PER_USER_CONCURRENCY > 1 one user's mail is sent from several.
+_gmail_services = TTLCache(maxsize=256, ttl=settings.GMAIL_SERVICE_CACHE_SECONDS)
+
+def get_gmail_service(user_email: str):
+    """authenticate_gmail(), cached per user and calling thread."""
+    key = (user_email, threading.get_ident())
+    service = _gmail_services.get(key)
+    if service is None:
+        service = authenticate_gmail(user_email)
+        if service is not None:
+            _gmail_services.set(key, service)
+    return service
+
+def forget_gmail_service(user_email: str):
+    """Drop the calling thread's client for the user (e.g. after a failed send)."""
+    _gmail_services.pop((user_email, threading.get_ident()))
+
 def get_calendar_service(user_email: str):
     """Authenticate Google Calendar service."""
+    from googleapiclient.discovery import build
     creds = get_credentials(user_email)
     if not creds:
         return None
@@ -106,6 +130,7 @@ def decode_base64(data):
     return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
 
 def html_to_text(html):
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "lxml")
     for tag in soup(["script", "style"]):
         tag.decompose()
@@ -186,12 +211,15 @@ def get_email_details(service, msg_id):
 
     return sender, subject, preview, full_text, thread_id, attachments, timestamp, is_read
 
-def send_email_via_gmail(user_email, to_email, subject, body):
-    service = authenticate_gmail(user_email)
+def send_email_via_gmail(user_email, to_email, subject, body, message_id=None, service=None):
+    """Send a plain-text email. `message_id` sets the Message-ID header (see find_sent_message)."""
+    service = service or authenticate_gmail(user_email)
 
     message = MIMEText(body)
     message["to"] = to_email
     message["subject"] = subject
+    if message_id:
+        message["Message-ID"] = message_id
 
     raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
 
@@ -202,4 +230,12 @@ def send_email_via_gmail(user_email, to_email, subject, body):
         body=send_body
     ).execute()
 
-    return sent_msg
\ No newline at end of file
+    return sent_msg
+
+def find_sent_message(service, message_id):
+    """The Gmail message with this Message-ID header, if it was already sent."""
+    results = service.users().messages().list(
+        userId="me", q=f"rfc822msgid:{message_id}", includeSpamTrash=True, maxResults=1
+    ).execute()
+    messages = results.get("messages", [])
+    return messages[0] if messages else None
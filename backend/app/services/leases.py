@@ -0,0 +1,133 @@
+"""
+Database-backed leases so several workers can run the same scheduler without
+duplicating work.
+
+A lease is a row in job_leases. Acquiring it is a single conditional UPDATE
+(free, expired, or already ours), so exactly one process wins. Holders renew
+while they work; if a worker dies its lease simply expires and another worker
+takes the job over on its next tick.
+
+Scheduled jobs hold their lease for the whole interval (hold_seconds) instead
+of releasing it when the run ends. Each worker's scheduler fires at its own
+offset, so a released lease would let another worker run the same job again
+within the same interval.
+"""
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from app.database.dialects import insert_ignore
+from app.database.models import JobLease
+from app.database.writer import run_write
+
+# Identity of this process
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _acquire(db: Session, name: str, owner: str, ttl_seconds: float) -> bool:
+    now = _now()
+    db.execute(insert_ignore(db, JobLease, ['name']), [{"name": name, "owner": None, "expires_at": now}])
+    result = db.execute(
+        update(JobLease)
+        .where(
+            JobLease.name == name,
+            or_(JobLease.owner.is_(None), JobLease.owner == owner, JobLease.expires_at < now)
+        )
+        .values(owner=owner, expires_at=now + timedelta(seconds=ttl_seconds), acquired_at=now)
+    )
+    return result.rowcount == 1
+
+
+def _renew(db: Session, name: str, owner: str, ttl_seconds: float) -> bool:
+    result = db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.owner == owner)
+        .values(expires_at=_now() + timedelta(seconds=ttl_seconds))
+    )
+    return result.rowcount == 1
+
+
+def _release(db: Session, name: str, owner: str):
+    db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.owner == owner)
+        .values(owner=None, expires_at=_now())
+    )
+
+
+def _hold(db: Session, name: str, owner: str, until: datetime):
+    db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.owner == owner)
+        .values(expires_at=until)
+    )
+
+
+def try_acquire(name: str, ttl_seconds: float, owner: str = OWNER_ID) -> bool:
+    return run_write(lambda s: _acquire(s, name, owner, ttl_seconds))
+
+
+def renew(name: str, ttl_seconds: float, owner: str = OWNER_ID) -> bool:
+    return run_write(lambda s: _renew(s, name, owner, ttl_seconds))
+
+
+def release(name: str, owner: str = OWNER_ID):
+    run_write(lambda s: _release(s, name, owner))
+
+
+def hold(name: str, until: datetime, owner: str = OWNER_ID):
+    run_write(lambda s: _hold(s, name, owner, until))
+
+
+@contextmanager
+def lease(name: str, ttl_seconds: float, keep_alive: bool = False, hold_seconds: Optional[float] = None):
+    """
+    Hold a lease for the duration of the block. Yields False (and runs no
+    renewals) if another live worker holds it. With keep_alive, a background
+    thread renews the lease every ttl/3 so long jobs do not lose it. With
+    hold_seconds (a scheduled job's interval), a block that succeeds keeps the
+    lease until hold_seconds after it was acquired instead of releasing it.
+    """
+    acquired_at = _now()
+    if not try_acquire(name, ttl_seconds):
+        yield False
+        return
+
+    stop = threading.Event()
+    renewer = None
+    if keep_alive:
+        def _keep_alive():
+            while not stop.wait(ttl_seconds / 3):
+                try:
+                    if not renew(name, ttl_seconds):
+                        print(f"⚠️ Lost lease {name}")
+                        return
+                except Exception as e:
+                    print(f"Lease renewal failed for {name}: {e}")
+
+        renewer = threading.Thread(target=_keep_alive, name=f"lease-{name}", daemon=True)
+        renewer.start()
+    succeeded = False
+    try:
+        yield True
+        succeeded = True
+    finally:
+        stop.set()
+        if renewer:
+            renewer.join()
+        try:
+            if succeeded and hold_seconds is not None:
+                hold(name, max(acquired_at + timedelta(seconds=hold_seconds), _now()))
+            else:
+                release(name)
+        except Exception as e:
+            print(f"Lease release failed for {name}: {e}")
@@ -0,0 +1,276 @@
+"""
+Outbound mail queue.
+
+/send-email, /send-reply, /auto-reply and sync auto-replies add a row to
+outbound_emails and return; an OutboundMailSender delivers the rows through
+Gmail in the background:
+
+  - rows are claimed with a conditional UPDATE (queued -> sending), so any
+    number of workers can run a sender; claims are made under the
+    "mail-claim" lease, one worker at a time, so a user never has more than
+    MAIL_PER_USER_CONCURRENCY sends in flight across all of them;
+  - each row has an idempotency key: enqueueing the same key twice returns
+    the first row, and the key also fixes the Message-ID header, so a retry
+    (after an error or a crashed worker) first asks Gmail whether the
+    message already went out instead of sending it again;
+  - failures back off exponentially and give up after MAIL_SEND_MAX_ATTEMPTS.
+"""
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.dialects import insert_ignore
+from app.database.models import OutboundEmail
+from app.database.writer import run_write
+from app.services import events, leases
+from app.services.workers import PollingWorker
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+NEW = "new"
+REPLY = "reply"
+AUTO_REPLY = "auto_reply"
+
+
+def auto_reply_key(email_id: str) -> str:
+    """Idempotency key of the automatic reply to an email: at most one per email."""
+    return f"auto-reply:{email_id}"
+
+
+def message_id_for(idempotency_key: str) -> str:
+    digest = hashlib.sha1(idempotency_key.encode("utf-8")).hexdigest()
+    return f"<{digest}@mailpilot>"
+
+
+def enqueue_email(db: Session, user_email: str, kind: str, to_email: str, subject: str, body: str,
+                  email_id: Optional[str] = None, tone: Optional[str] = None,
+                  idempotency_key: Optional[str] = None, now: Optional[datetime] = None) -> OutboundEmail:
+    """
+    Queue an email and return its row. If `idempotency_key` was used before,
+    the existing row is returned unchanged. Does not commit; call
+    mail_sender.wake() after the commit.
+    """
+    now = now or datetime.now()
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    db.execute(insert_ignore(db, OutboundEmail, ['idempotency_key']), [{
+        "idempotency_key": idempotency_key,
+        "user_email": user_email,
+        "kind": kind,
+        "email_id": email_id,
+        "to_email": to_email,
+        "subject": subject,
+        "body": body,
+        "tone": tone,
+        "status": QUEUED,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }])
+    return db.scalars(select(OutboundEmail).where(OutboundEmail.idempotency_key == idempotency_key)).one()
+
+
+def to_dict(row: OutboundEmail) -> dict:
+    return {
+        "outbound_id": row.id,
+        "status": row.status,
+        "kind": row.kind,
+        "to_email": row.to_email,
+        "subject": row.subject,
+        "attempts": row.attempts,
+        "created_at": row.created_at,
+        "sent_at": row.sent_at,
+        "message_id": row.gmail_message_id,
+        "error": row.last_error,
+    }
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(settings.MAIL_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), settings.MAIL_BACKOFF_MAX_SECONDS)
+
+
+def _claimable(now: datetime):
+    # Due queued rows, plus "sending" rows whose claim ran out (worker crashed mid-send)
+    return or_(
+        and_(OutboundEmail.status == QUEUED, OutboundEmail.next_attempt_at <= now),
+        and_(OutboundEmail.status == SENDING, OutboundEmail.claimed_until <= now)
+    )
+
+
+def claim_batch(db: Session, now: datetime, limit: int, per_user: int) -> List[dict]:
+    """
+    Claim up to `limit` sendable rows, oldest first, keeping each user at or
+    below `per_user` sends in flight. Does not commit.
+    """
+    if limit <= 0:
+        return []
+    in_flight: Dict[str, int] = dict(db.execute(
+        select(OutboundEmail.user_email, func.count())
+        .where(OutboundEmail.status == SENDING, OutboundEmail.claimed_until > now)
+        .group_by(OutboundEmail.user_email)
+    ).all())
+    candidates = db.execute(
+        select(OutboundEmail.id, OutboundEmail.user_email)
+        .where(_claimable(now))
+        .order_by(OutboundEmail.created_at, OutboundEmail.id)
+        .limit(limit * 4)
+    ).all()
+
+    claimed = []
+    for row_id, user_email in candidates:
+        if len(claimed) >= limit:
+            break
+        if in_flight.get(user_email, 0) >= per_user:
+            continue
+        result = db.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.id == row_id, _claimable(now))
+            .values(
+                status=SENDING,
+                attempts=OutboundEmail.attempts + 1,
+                claimed_until=now + timedelta(seconds=settings.MAIL_CLAIM_SECONDS)
+            )
+        )
+        if result.rowcount == 1:
+            in_flight[user_email] = in_flight.get(user_email, 0) + 1
+            claimed.append(row_id)
+    if not claimed:
+        return []
+    rows = db.scalars(select(OutboundEmail).where(OutboundEmail.id.in_(claimed)).order_by(OutboundEmail.id)).all()
+    return [
+        {column.key: getattr(row, column.key) for column in OutboundEmail.__table__.columns}
+        for row in rows
+    ]
+
+
+def mark_sent(db: Session, job: dict, gmail_message: dict, now: datetime, record: bool = True, error: Optional[str] = None):
+    """Record a delivered email, plus (if `record`) its Sent copy / reply record. Does not commit."""
+    db.execute(
+        update(OutboundEmail)
+        .where(OutboundEmail.id == job["id"])
+        .values(status=SENT, sent_at=now, claimed_until=None, last_error=error,
+                gmail_message_id=gmail_message.get("id"))
+    )
+    if not record:
+        return
+    if job["kind"] == NEW:
+        crud.add_sent_email(db, job["user_email"], gmail_message["id"], gmail_message.get("threadId"),
+                            job["subject"], job["body"])
+    else:
+        crud.save_reply(db, email_id=job["email_id"], user_email=job["user_email"], reply_text=job["body"],
+                        tone=job["tone"] or "manual", is_auto=job["kind"] == AUTO_REPLY, commit=False)
+        if job["kind"] == REPLY:
+            crud.delete_draft(db, job["email_id"], job["user_email"], commit=False)
+
+
+def mark_failed(db: Session, job: dict, error: str, now: datetime) -> str:
+    """Schedule a retry, or fail the row for good after MAIL_SEND_MAX_ATTEMPTS. Does not commit."""
+    status = FAILED if job["attempts"] >= settings.MAIL_SEND_MAX_ATTEMPTS else QUEUED
+    db.execute(
+        update(OutboundEmail)
+        .where(OutboundEmail.id == job["id"])
+        .values(status=status, claimed_until=None, last_error=error[:500],
+                next_attempt_at=now + timedelta(seconds=backoff_seconds(job["attempts"])))
+    )
+    return status
+
+
+def deliver(job: dict) -> str:
+    """Send one claimed row through Gmail and record the outcome. Returns the new status."""
+    # Imported here: the Gmail client is loaded on first use
+    from app.services.gmail_service import get_gmail_service, forget_gmail_service, send_email_via_gmail, find_sent_message
+
+    message_id = message_id_for(job["idempotency_key"])
+    try:
+        service = get_gmail_service(job["user_email"])
+        if not service:
+            raise RuntimeError("Authentication failed. Please re-login.")
+        sent = None
+        if job["attempts"] > 1:
+            # An earlier attempt may have reached Gmail before failing
+            sent = find_sent_message(service, message_id)
+        if sent is None:
+            sent = send_email_via_gmail(job["user_email"], job["to_email"], job["subject"], job["body"],
+                                        message_id=message_id, service=service)
+    except Exception as e:
+        error = str(e)
+        forget_gmail_service(job["user_email"])
+        print(f"❌ Sending email {job['id']} for {job['user_email']} failed: {error}")
+        status = run_write(lambda s: mark_failed(s, job, error, datetime.now()))
+        if status == FAILED:
+            events.publish(job["user_email"], events.OUTBOUND_UPDATED, outbound_id=job["id"],
+                           status=FAILED, subject=job["subject"], error=error)
+        return status
+
+    try:
+        run_write(lambda s: mark_sent(s, job, sent, datetime.now()))
+    except Exception as e:
+        # Delivered either way; never let a bookkeeping error cause a resend
+        error = f"Sent, but not recorded: {e}"[:500]
+        print(f"Recording sent email {job['id']} failed: {e}")
+        run_write(lambda s: mark_sent(s, job, sent, datetime.now(), record=False, error=error))
+    events.publish(job["user_email"], events.OUTBOUND_UPDATED, outbound_id=job["id"],
+                   status=SENT, subject=job["subject"], kind=job["kind"])
+    return SENT
+
+
+class OutboundMailSender(PollingWorker):
+    """Claims queued emails every MAIL_POLL_SECONDS (or when woken) and sends them on a thread pool."""
+
+    name = "mail-outbox"
+
+    def __init__(self, max_workers: int = 4, per_user: int = 1, poll_seconds: float = 5):
+        super().__init__(poll_seconds)
+        self._max_workers = max_workers
+        self._per_user = per_user
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._wake.set()
+
+    def run_once(self) -> int:
+        with self._lock:
+            capacity = self._max_workers - self._in_flight
+        if capacity <= 0:
+            return 0
+        # The in-flight count and the claims must not interleave with another worker's
+        with leases.lease("mail-claim", settings.MAIL_CLAIM_LEASE_SECONDS) as acquired:
+            if not acquired:
+                return 0
+            jobs = run_write(lambda s: claim_batch(s, datetime.now(), capacity, self._per_user))
+        for job in jobs:
+            with self._lock:
+                self._in_flight += 1
+            self._executor.submit(deliver, job).add_done_callback(self._done)
+        return len(jobs)
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="mail-send")
+        super().start()
+
+    def stop(self, timeout: Optional[float] = 5):
+        super().stop(timeout)
+        if self._executor is not None:
+            # Unsent claims expire after MAIL_CLAIM_SECONDS and are retried
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+mail_sender = OutboundMailSender(
+    max_workers=settings.MAIL_SEND_WORKERS,
+    per_user=settings.MAIL_PER_USER_CONCURRENCY,
+    poll_seconds=settings.MAIL_POLL_SECONDS
+)
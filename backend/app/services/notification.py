@@ -1,31 +1,188 @@
-import requests
-import os 
+"""
+Push notifications through ntfy, via an outbox.
 
-from dotenv import load_dotenv
+Callers never talk to ntfy: they add a row to notification_outbox with
+enqueue_notification(), ideally in the same transaction as the change that
+caused it. A background NotificationSender delivers the rows:
 
-load_dotenv()
-NOTIFICATION_TOPIC=os.getenv("NOTIFICATION_TOPIC")
+  - each user's pending notifications are sent as one message (a digest when
+    there are several); alerts wait NOTIFY_DIGEST_WINDOW_SECONDS first so a
+    burst coalesces, reminders go out right away;
+  - requests share one pooled HTTP session with connect/read timeouts;
+  - failures are retried with exponential backoff and marked failed after
+    NOTIFY_MAX_ATTEMPTS.
 
-def send_notification(summary: str, title: str = "High Alert Emails"):
-    headers={
-        "Title": title
-    }
+A slow or unreachable ntfy server therefore only delays notifications, never
+the sync pipeline or the reminder dispatcher.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database.database import SessionLocal
+from app.database.models import NotificationOutbox
+from app.database.writer import run_write
+from app.services import leases
+from app.services.workers import PollingWorker
 
+PENDING = "pending"
+FAILED = "failed"
 
+ALERT = "alert"
+REMINDER = "reminder"
 
-    if not NOTIFICATION_TOPIC:
-        print("⚠️ Warning: NOTIFICATION_TOPIC is not set. Skipping notification.")
-        return
 
-    try:
-        response = requests.post(
-            f"https://ntfy.sh/{NOTIFICATION_TOPIC}",
-            data=summary.encode("utf-8"),
-            headers=headers
+def enqueue_notification(db: Session, user_email: str, message: str, title: str = "High Alert Emails",
+                         kind: str = ALERT, now: Optional[datetime] = None):
+    """Queue a notification. Does not commit; call notification_sender.wake() after the commit."""
+    now = now or datetime.now()
+    delay = settings.NOTIFY_DIGEST_WINDOW_SECONDS if kind == ALERT else 0
+    db.add(NotificationOutbox(
+        user_email=user_email,
+        kind=kind,
+        title=title,
+        message=message,
+        status=PENDING,
+        attempts=0,
+        created_at=now,
+        next_attempt_at=now + timedelta(seconds=delay),
+    ))
+    db.flush()
+
+
+def build_digest(rows: List[NotificationOutbox]):
+    """(title, message) for one user's pending notifications, oldest first."""
+    if len(rows) == 1:
+        return rows[0].title, rows[0].message
+    lines = [f"• {row.title}: {row.message}" for row in rows]
+    return f"{len(rows)} notifications", "\n".join(lines)
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(settings.NOTIFY_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), settings.NOTIFY_BACKOFF_MAX_SECONDS)
+
+
+class NtfyTransport:
+    """POSTs to ntfy over a pooled session. Raises on any failure."""
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                self._session = session
+            return self._session
+
+    def send(self, title: str, message: str):
+        response = self._get_session().post(
+            f"{settings.NTFY_BASE_URL}/{settings.NOTIFICATION_TOPIC}",
+            data=message.encode("utf-8"),
+            headers={"Title": title.encode("utf-8")},
+            timeout=(settings.NOTIFY_CONNECT_TIMEOUT_SECONDS, settings.NOTIFY_READ_TIMEOUT_SECONDS)
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"ntfy returned {response.status_code}: {response.text[:200]}")
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+def _record_results(db: Session, sent_ids: List[int], failures: List[tuple], now: datetime):
+    if sent_ids:
+        db.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(sent_ids)))
+    for row_id, attempts, error in failures:
+        failed = attempts >= settings.NOTIFY_MAX_ATTEMPTS
+        db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == row_id)
+            .values(
+                attempts=attempts,
+                last_error=error[:500],
+                status=FAILED if failed else PENDING,
+                next_attempt_at=now + timedelta(seconds=backoff_seconds(attempts))
+            )
         )
-        if response.status_code == 200:
-            print(f"✅ Notification sent to ntfy.sh/{NOTIFICATION_TOPIC}")
-        else:
-            print(f"❌ Notification failed: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"❌ Notification Exception: {e}")
\ No newline at end of file
+
+
+def deliver_pending(db: Session, transport, now: Optional[datetime] = None) -> int:
+    """
+    Send one message per user that has a due notification, folding in all of
+    that user's pending rows. Returns the number of messages sent.
+    """
+    now = now or datetime.now()
+    due_users = select(NotificationOutbox.user_email).where(
+        NotificationOutbox.status == PENDING,
+        NotificationOutbox.next_attempt_at <= now
+    ).distinct().limit(settings.NOTIFY_BATCH_SIZE)
+    rows = db.scalars(
+        select(NotificationOutbox)
+        .where(NotificationOutbox.status == PENDING, NotificationOutbox.user_email.in_(due_users))
+        .order_by(NotificationOutbox.created_at, NotificationOutbox.id)
+    ).all()
+    if not rows:
+        return 0
+
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row.user_email].append(row)
+
+    if not settings.NOTIFICATION_TOPIC:
+        print("⚠️ Warning: NOTIFICATION_TOPIC is not set. Dropping notifications.")
+        run_write(lambda s: _record_results(s, [row.id for row in rows], [], now))
+        return 0
+
+    sent_ids, failures, sent = [], [], 0
+    for user_email, user_rows in by_user.items():
+        title, message = build_digest(user_rows)
+        try:
+            transport.send(title, message)
+            sent_ids.extend(row.id for row in user_rows)
+            sent += 1
+        except Exception as e:
+            print(f"❌ Notification for {user_email} failed: {e}")
+            failures.extend((row.id, row.attempts + 1, str(e)) for row in user_rows)
+    run_write(lambda s: _record_results(s, sent_ids, failures, now))
+    if sent:
+        print(f"✅ Sent {sent} notification(s) to ntfy.sh/{settings.NOTIFICATION_TOPIC}")
+    return sent
+
+
+class NotificationSender(PollingWorker):
+    """Drains the outbox every NOTIFY_POLL_SECONDS, or sooner when woken."""
+
+    name = "notifications"
+
+    def __init__(self, poll_seconds: float = 10, transport=None):
+        super().__init__(poll_seconds)
+        self._transport = transport or NtfyTransport()
+
+    def run_once(self):
+        # Several workers may run a sender; one drains the outbox at a time
+        with leases.lease("notifications", settings.NOTIFY_LEASE_SECONDS, keep_alive=True) as acquired:
+            if not acquired:
+                return
+            db = SessionLocal()
+            try:
+                deliver_pending(db, self._transport)
+            finally:
+                db.close()
+
+    def stop(self, timeout: Optional[float] = 5):
+        super().stop(timeout)
+        self._transport.close()
+
+
+notification_sender = NotificationSender(poll_seconds=settings.NOTIFY_POLL_SECONDS)
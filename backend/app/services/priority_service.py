@@ -1,6 +1,144 @@
+"""
+Personalized priority and auto-reply resolution.
+
+A user's sender rules and interests are compiled once into a PriorityMatcher:
+  - rules for a full address ("boss@corp.com") go in a dict keyed by address,
+  - rules for a domain ("@corp.com") go in a dict keyed by domain,
+  - any other rule text, and the interests, go in Aho-Corasick automatons,
+so resolving an email costs one pass over its sender and text however many
+rules the user has. Matchers are cached per user (get_matcher) and dropped
+with invalidate() when /user/preferences or /user/sender-rules change; other
+workers pick the change up within SENDER_MATCHER_TTL_SECONDS.
+
+Changes can also be applied to mail already synced, without model calls:
+a forced priority is one UPDATE over the rule's senders (force_rule_priority),
+and anything else re-scores the stored ai_priority in batches (rescore).
+"""
 import json
-from typing import List, Optional
-from app.database.models import UserPreference, SenderRule
+from collections import namedtuple
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, func, not_, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.models import Email, UserPreference, SenderRule
+from app.database.writer import run_write
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.ttl_cache import TTLCache
+from app.services import events
+
+# Detached copy of a SenderRule, safe to cache across sessions and threads
+Rule = namedtuple("Rule", ["id", "sender_email", "force_priority", "auto_reply"])
+
+BOOST = {"Low": "Medium", "Medium": "High"}
+
+
+def sender_address(sender: Optional[str]) -> str:
+    """Lower-cased address of a From header ("Name <a@b.com>" -> "a@b.com")."""
+    return parseaddr(sender or "")[1].strip().lower()
+
+
+def _classify(pattern: Optional[str]):
+    """("domain" | "address" | "substring", normalized pattern) for a rule's sender text."""
+    pattern = (pattern or "").strip().lower()
+    local, at, domain = pattern.rpartition("@")
+    if at and domain and not local:
+        return "domain", domain
+    if at and domain and " " not in pattern and "<" not in pattern:
+        return "address", pattern
+    return "substring", pattern
+
+
+class _RuleIndex:
+    """First matching rule (in rule order) among a set of sender patterns."""
+
+    def __init__(self, rules: List[Rule]):
+        self._rules = rules
+        self._addresses: Dict[str, int] = {}
+        self._domains: Dict[str, int] = {}
+        substrings = [""] * len(rules)
+        for order, rule in enumerate(rules):
+            kind, pattern = _classify(rule.sender_email)
+            if kind == "domain":
+                self._domains.setdefault(pattern, order)
+            elif kind == "address":
+                self._addresses.setdefault(pattern, order)
+            else:
+                substrings[order] = pattern
+        self._substrings = AhoCorasick(substrings)
+
+    def match(self, sender: Optional[str]) -> Optional[Rule]:
+        if not self._rules:
+            return None
+        address = sender_address(sender)
+        candidates = []
+        if address:
+            if address in self._addresses:
+                candidates.append(self._addresses[address])
+            domain = address.rpartition("@")[2]
+            if domain in self._domains:
+                candidates.append(self._domains[domain])
+        if self._substrings.size:
+            order = self._substrings.first_match((sender or "").lower())
+            if order is not None:
+                candidates.append(order)
+        return self._rules[min(candidates)] if candidates else None
+
+
+class PriorityMatcher:
+    def __init__(self, interests: Iterable[str], rules: Iterable[Rule]):
+        rules = list(rules)
+        self._force = _RuleIndex([r for r in rules if r.force_priority])
+        self._auto_reply = _RuleIndex([r for r in rules if r.auto_reply])
+        self._interests = AhoCorasick([i.strip().lower() for i in interests if isinstance(i, str)])
+
+    @classmethod
+    def compile(cls, user_pref: Optional[UserPreference], sender_rules: Iterable[SenderRule]) -> "PriorityMatcher":
+        interests = []
+        if user_pref and user_pref.interests:
+            try:
+                interests = json.loads(user_pref.interests) or []
+            except ValueError:
+                interests = []
+        rules = [Rule(r.id, r.sender_email, r.force_priority, bool(r.auto_reply)) for r in sender_rules]
+        return cls(interests, rules)
+
+    def resolve_priority(self, sender: str, subject: str, body: Optional[str], ai_priority: str) -> str:
+        """
+        Resolution order:
+        1. Sender Rule (Force Priority) -> FINAL
+        2. Interest Match (a single boost: Low -> Medium -> High)
+        3. AI Priority (Fallback)
+        """
+        rule = self._force.match(sender)
+        if rule is not None:
+            return rule.force_priority
+        if self._interests.size and self._interests.contains_any(f"{subject or ''} {body or ''}".lower()):
+            return BOOST.get(ai_priority, ai_priority)
+        return ai_priority
+
+    def auto_reply_rule(self, sender: str) -> Optional[Rule]:
+        return self._auto_reply.match(sender)
+
+
+_matchers = TTLCache(maxsize=settings.SENDER_MATCHER_MAX_ENTRIES, ttl=settings.SENDER_MATCHER_TTL_SECONDS)
+
+
+def get_matcher(db: Session, user_email: str) -> PriorityMatcher:
+    """The user's compiled matcher, built from the database on a cache miss."""
+    matcher = _matchers.get(user_email)
+    if matcher is None:
+        user_pref = db.query(UserPreference).filter(UserPreference.user_email == user_email).first()
+        sender_rules = db.query(SenderRule).filter(SenderRule.user_email == user_email).order_by(SenderRule.id).all()
+        matcher = PriorityMatcher.compile(user_pref, sender_rules)
+        _matchers.set(user_email, matcher)
+    return matcher
+
+
+def invalidate(user_email: str):
+    _matchers.pop(user_email)
+
 
 def resolve_email_priority(
     sender: str,
@@ -10,61 +148,110 @@ def resolve_email_priority(
     user_pref: Optional[UserPreference],
     sender_rules: List[SenderRule]
 ) -> str:
+    """One-off form of PriorityMatcher.resolve_priority; the sync uses get_matcher()."""
+    return PriorityMatcher.compile(user_pref, sender_rules).resolve_priority(sender, subject, body, ai_priority)
+
+
+def get_auto_reply_rule(sender: str, sender_rules: List[SenderRule]) -> Optional[Rule]:
+    """
+    Check if a sender triggers an auto-reply.
+    """
+    return PriorityMatcher.compile(None, sender_rules).auto_reply_rule(sender)
+
+
+# --------------------------
+# Applying changes to existing mail
+# --------------------------
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def sender_clause(pattern: str):
+    """SQL condition on Email.sender equivalent to how the matcher applies a rule's sender text."""
+    kind, pattern = _classify(pattern)
+    sender = func.lower(Email.sender)
+    escaped = _like_escape(pattern)
+    if kind == "domain":
+        return or_(sender.like(f"%@{escaped}", escape="\\"), sender.like(f"%@{escaped}>", escape="\\"))
+    if kind == "address":
+        return or_(sender == pattern, sender.like(f"%<{escaped}>", escape="\\"))
+    return sender.like(f"%{escaped}%", escape="\\")
+
+
+def _prioritized(user_email: str):
+    # Rows still in the sync pipeline get the current rules when they reach it
+    return and_(Email.user_email == user_email, Email.sync_stage == "prioritized")
+
+
+def force_rule_priority(db: Session, user_email: str, rule: Rule) -> Dict[str, str]:
     """
-    Resolve the final priority of an email based on rules, preferences, and AI.
-    
-    Resolution Order:
-    1. Sender Rule (Force Priority) -> FINAL
-    2. Interest Match (Boost Priority)
-    3. AI Priority (Fallback)
+    Set the rule's forced priority on the user's existing mail from its
+    senders with one UPDATE, leaving senders an earlier rule forces alone.
+    Returns {email_id: new priority} for the emails changed. Does not commit.
     """
-    
-    # 1. Check Sender Rules
-    normalized_sender = sender.lower() if sender else ""
-    for rule in sender_rules:
-        if rule.sender_email.lower() in normalized_sender:
-            if rule.force_priority:
-                print(f"Priority Forced by Sender Rule ({rule.sender_email}): {rule.force_priority}")
-                return rule.force_priority
-
-    # 2. Check User Interests (Boost)
-    # ai_priority is typically "High", "Medium", "Low"
-    current_priority = ai_priority
-    
-    if user_pref and user_pref.interests:
-        try:
-            interests = json.loads(user_pref.interests)
-        except:
-            interests = []
-            
-        text_content = (subject + " " + body).lower()
-        
-        for interest in interests:
-            if interest.lower() in text_content:
-                # Boost Logic
-                if current_priority == "Low":
-                    print(f"Priority Boosted (Low -> Medium) due to interest: {interest}")
-                    current_priority = "Medium"
-                elif current_priority == "Medium":
-                    print(f"Priority Boosted (Medium -> High) due to interest: {interest}")
-                    current_priority = "High"
-                elif current_priority == "High":
-                    print(f"Priority Retained (High) due to interest: {interest}")
-                
-                # We apply one boost and exit (or cumulative? prompt implies "boost priority")
-                # Let's stick to single boost for now to avoid over-alerting
-                return current_priority
-
-    # 3. Fallback to AI
-    return current_priority
-
-
-def get_auto_reply_rule(sender: str, sender_rules: List[SenderRule]) -> Optional[SenderRule]:
+    earlier = db.scalars(
+        select(SenderRule.sender_email).where(
+            SenderRule.user_email == user_email,
+            SenderRule.id < rule.id,
+            SenderRule.force_priority.isnot(None)
+        )
+    ).all()
+    conditions = [_prioritized(user_email), sender_clause(rule.sender_email), Email.priority != rule.force_priority]
+    if earlier:
+        conditions.append(not_(or_(*[sender_clause(pattern) for pattern in earlier])))
+    changed = db.scalars(
+        update(Email).where(*conditions).values(priority=rule.force_priority)
+        .returning(Email.email_id).execution_options(synchronize_session=False)
+    ).all()
+    if changed:
+        crud.bump_mailbox_versions(db, [user_email])
+    return dict.fromkeys(changed, rule.force_priority)
+
+
+def publish_priorities(user_email: str, changes: Dict[str, str]):
+    """Tell the user's open clients about priorities changed after ingest. Call after the commit."""
+    if changes:
+        events.publish(user_email, events.EMAILS_PRIORITY, emails=[
+            {"email_id": email_id, "priority": priority} for email_id, priority in changes.items()
+        ])
+
+
+def rescore_batch(db: Session, user_email: str, matcher: PriorityMatcher, after: str = "", where=None,
+                  batch_size: int = 500):
     """
-    Check if a sender triggers an auto-reply.
+    Re-resolve the priority of the next `batch_size` emails (by email_id,
+    after `after`) from their stored ai_priority. Returns (last email_id or
+    None when done, {email_id: new priority} for the rows changed). Does not
+    commit.
     """
-    normalized_sender = sender.lower() if sender else ""
-    for rule in sender_rules:
-        if rule.sender_email.lower() in normalized_sender and rule.auto_reply:
-             return rule
-    return None
+    query = (
+        select(Email.email_id, Email.sender, Email.subject, Email.summary, Email.ai_priority, Email.priority)
+        # Mail synced before ai_priority was stored has nothing to re-score from
+        .where(_prioritized(user_email), Email.ai_priority.isnot(None), Email.email_id > after)
+        .order_by(Email.email_id)
+        .limit(batch_size)
+    )
+    if where is not None:
+        query = query.where(where)
+    rows = db.execute(query).all()
+    if not rows:
+        return None, {}
+    changes = {}
+    for email_id, sender, subject, summary, ai_priority, priority in rows:
+        resolved = matcher.resolve_priority(sender, subject, summary, ai_priority)
+        if resolved != priority:
+            changes[email_id] = resolved
+    crud.update_email_priorities(db, changes, commit=False)
+    return rows[-1].email_id, changes
+
+
+def rescore(user_email: str, matcher: PriorityMatcher, where=None) -> int:
+    """Re-score the user's existing mail (optionally only rows matching `where`), one write per batch."""
+    after, total = "", 0
+    while after is not None:
+        after, changed = run_write(lambda s, after=after: rescore_batch(
+            s, user_email, matcher, after, where, settings.REPRIORITIZE_BATCH_SIZE))
+        publish_priorities(user_email, changed)
+        total += len(changed)
+    return total
@@ -0,0 +1,226 @@
+"""
+In-memory reminder dispatcher.
+
+Upcoming reminders sit in a min-heap of (due_at, task_id). A single thread
+sleeps until the earliest one is due (or until it is woken by a change), so
+reminders fire on time without polling email_tasks every minute.
+
+The database stays the source of truth:
+  - the heap is loaded at startup and re-synced every REMINDER_RESYNC_SECONDS,
+    which recovers from crashes;
+  - in between, reminders due within the next poll window are read every
+    REMINDER_POLL_SECONDS (a range scan on ix_tasks_reminder_due), so one set
+    on a worker that doesn't run the dispatcher (RUN_SCHEDULER=false) fires
+    at most that late;
+  - a reminder is claimed with a conditional UPDATE (still due, unsent, open)
+    before it is sent, so with several workers each reminder is sent once.
+
+Rescheduling or cancelling never searches the heap: the current due time of
+each task is kept in a dict and heap entries that no longer match it are
+dropped when they reach the top. Reminder times are naive UTC, like task
+deadlines.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.database import SessionLocal
+from app.database.models import EmailTask
+from app.database.writer import run_write
+from app.services import events
+from app.services.notification import REMINDER, enqueue_notification, notification_sender
+from app.utils.deadline_parser import to_utc_naive, utc_now
+
+
+def pending_reminders(db: Session, before: Optional[datetime] = None) -> List[Tuple[int, datetime]]:
+    """Unsent reminders of open tasks, optionally only those due before `before`."""
+    query = select(EmailTask.id, EmailTask.reminder_time).where(
+        EmailTask.reminder_sent == False,
+        EmailTask.completed == False,
+        EmailTask.reminder_time.isnot(None)
+    )
+    if before is not None:
+        query = query.where(EmailTask.reminder_time < before)
+    return db.execute(query).all()
+
+
+def claim_reminders(db: Session, task_ids: List[int], now: datetime) -> List[dict]:
+    """
+    Mark each task's reminder sent if it is still due, unsent and open, queue
+    its notification, and return the claimed tasks (id, user_email, task_text).
+    Does not commit.
+    """
+    claimed = []
+    for task_id in task_ids:
+        result = db.execute(
+            update(EmailTask)
+            .where(
+                EmailTask.id == task_id,
+                EmailTask.reminder_sent == False,
+                EmailTask.completed == False,
+                EmailTask.reminder_time <= now
+            )
+            .values(reminder_sent=True)
+        )
+        if result.rowcount == 1:
+            claimed.append(task_id)
+    if not claimed:
+        return []
+    tasks = db.scalars(select(EmailTask).where(EmailTask.id.in_(claimed))).all()
+    crud.bump_mailbox_versions(db, {task.user_email for task in tasks})
+    for task in tasks:
+        # The outbox runs on server-local time
+        enqueue_notification(db, task.user_email, f"Reminder: {task.task_text}", title="Task Reminder", kind=REMINDER)
+    return [
+        {"id": task.id, "user_email": task.user_email, "task_text": task.task_text}
+        for task in tasks
+    ]
+
+
+class ReminderDispatcher:
+    def __init__(self, resync_seconds: float = 300, poll_seconds: float = 5):
+        self._resync_seconds = resync_seconds
+        self._poll_seconds = poll_seconds
+        self._heap = []
+        self._due: Dict[int, datetime] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    # --- changes from the API -------------------------------------------
+
+    def schedule(self, task_id: int, due_at: datetime):
+        due_at = to_utc_naive(due_at)
+        with self._cond:
+            self._due[task_id] = due_at
+            heapq.heappush(self._heap, (due_at, task_id))
+            self._cond.notify()
+
+    def cancel(self, task_id: int):
+        with self._cond:
+            self._due.pop(task_id, None)
+
+    def load(self, db: Session, before: Optional[datetime] = None):
+        """Merge pending reminders (all, or those due before `before`) from the database into the heap."""
+        rows = pending_reminders(db, before)
+        with self._cond:
+            for task_id, due_at in rows:
+                due_at = to_utc_naive(due_at)
+                if self._due.get(task_id) != due_at:
+                    self._due[task_id] = due_at
+                    heapq.heappush(self._heap, (due_at, task_id))
+            self._cond.notify()
+        return len(rows)
+
+    def next_due(self) -> Optional[datetime]:
+        with self._cond:
+            return self._peek()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._due)
+
+    # --- dispatch loop ----------------------------------------------------
+
+    def _peek(self) -> Optional[datetime]:
+        # Drop entries superseded by a reschedule or cancel
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        with self._cond:
+            due = []
+            while (next_at := self._peek()) is not None and next_at <= now:
+                _, task_id = heapq.heappop(self._heap)
+                del self._due[task_id]
+                due.append(task_id)
+            return due
+
+    def fire(self, task_ids: List[int], now: datetime):
+        claimed = run_write(lambda s: claim_reminders(s, task_ids, now))
+        if claimed:
+            notification_sender.wake()
+        for task in claimed:
+            print(f"⏰ Sending reminder for task: {task['id']}")
+            events.publish(task["user_email"], events.REMINDER_FIRED, task_id=task["id"], task_text=task["task_text"])
+
+    def _resync(self, before: Optional[datetime] = None):
+        db = SessionLocal()
+        try:
+            self.load(db, before)
+        except Exception as e:
+            print(f"Reminder resync failed: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        next_resync = next_poll = 0.0
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            now_mono = time.monotonic()
+            if now_mono >= next_resync:
+                self._resync()
+                next_resync = now_mono + self._resync_seconds
+                next_poll = now_mono + self._poll_seconds
+            elif now_mono >= next_poll:
+                # Reminders set on other workers that come due before the next poll
+                self._resync(before=utc_now() + timedelta(seconds=2 * self._poll_seconds))
+                next_poll = now_mono + self._poll_seconds
+
+            now = utc_now()
+            due = self.pop_due(now)
+            if due:
+                try:
+                    self.fire(due, now)
+                except Exception as e:
+                    print(f"Error sending reminders: {e}")
+                    # Put them back; the next resync would also recover them
+                    for task_id in due:
+                        self.schedule(task_id, now)
+                    self._sleep(5)
+                continue
+
+            with self._cond:
+                if self._stopping:
+                    return
+                timeout = min(next_resync, next_poll) - time.monotonic()
+                next_at = self._peek()
+                if next_at is not None:
+                    timeout = min(timeout, (next_at - utc_now()).total_seconds())
+                if timeout > 0:
+                    self._cond.wait(timeout)
+
+    def _sleep(self, seconds: float):
+        with self._cond:
+            if not self._stopping:
+                self._cond.wait(seconds)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+
+reminder_dispatcher = ReminderDispatcher(
+    resync_seconds=settings.REMINDER_RESYNC_SECONDS,
+    poll_seconds=settings.REMINDER_POLL_SECONDS
+)
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.database import IS_SQLITE
+from app.database.writer import run_write
+from app.database.models import Email, EmailAttachment, EmailBody, EmailDraft, EmailReply, EmailTask
+
+# Rows that reference emails.email_id and must go with the email
+CHILD_MODELS = [EmailAttachment, EmailTask, EmailReply, EmailDraft, EmailBody]
+
+
+def _expired_filter(kind: str, cutoff: datetime):
+    # Served by ix_emails_deleted_at / ix_emails_archived_at
+    if kind == "trash":
+        return [Email.is_deleted == True, Email.deleted_at < cutoff]
+    if kind == "archive":
+        return [Email.is_archived == True, Email.archived_at < cutoff]
+    raise ValueError(f"Unknown retention kind: {kind}")
+
+
+def purge_expired_chunk(db: Session, kind: str, cutoff: datetime, chunk_size: int) -> int:
+    """
+    Delete up to chunk_size expired emails together with their child rows.
+    Does not commit; returns the number of emails deleted.
+    """
+    rows = db.execute(
+        select(Email.email_id, Email.user_email).where(*_expired_filter(kind, cutoff)).limit(chunk_size)
+    ).all()
+    if not rows:
+        return 0
+    email_ids = [row.email_id for row in rows]
+
+    for model in CHILD_MODELS:
+        db.execute(delete(model).where(model.email_id.in_(email_ids)))
+    db.execute(delete(Email).where(Email.email_id.in_(email_ids)))
+    crud.bump_mailbox_versions(db, [row.user_email for row in rows])
+    return len(email_ids)
+
+
+def incremental_vacuum(db: Session, pages: int):
+    """Return up to `pages` free pages to the OS (SQLite with auto_vacuum=INCREMENTAL)."""
+    free_pages = db.execute(text("PRAGMA freelist_count")).scalar() or 0
+    # pysqlite steps a statement only once and each step frees a single page,
+    # so issue one PRAGMA per page instead of incremental_vacuum(N)
+    for _ in range(min(free_pages, pages)):
+        db.execute(text("PRAGMA incremental_vacuum(1)"))
+    return min(free_pages, pages)
+
+
+def purge_expired_emails(now: datetime = None, chunk_size: int = None) -> dict:
+    """
+    Scheduled retention job: trash after TRASH_RETENTION_DAYS, archive after
+    ARCHIVE_RETENTION_DAYS.
+
+    Each chunk is its own short write job, so other writes queued on the
+    writer thread run in between instead of waiting behind one big DELETE.
+    """
+    now = now or datetime.now()
+    chunk_size = chunk_size or settings.RETENTION_CHUNK_SIZE
+    cutoffs = {
+        "trash": now - timedelta(days=settings.TRASH_RETENTION_DAYS),
+        "archive": now - timedelta(days=settings.ARCHIVE_RETENTION_DAYS),
+    }
+
+    purged = {}
+    for kind, cutoff in cutoffs.items():
+        total = 0
+        while True:
+            deleted = run_write(
+                lambda s, kind=kind, cutoff=cutoff: purge_expired_chunk(s, kind, cutoff, chunk_size)
+            )
+            total += deleted
+            if deleted < chunk_size:
+                break
+        purged[kind] = total
+
+    if IS_SQLITE and any(purged.values()):
+        run_write(lambda s: incremental_vacuum(s, settings.RETENTION_VACUUM_PAGES))
+
+    if any(purged.values()):
+        print(f"🧹 Retention purge: {purged['trash']} trashed, {purged['archive']} archived emails removed")
+    return purged
@@ -0,0 +1,177 @@
+"""
+Background Gmail sync jobs.
+
+/fetch-emails submits a job and returns at once; the sync runs on a small
+thread pool and reports progress through SyncJob.progress. A user has at most
+one queued/running job: submitting again returns the job already in flight.
+The registry is per process, so status lookups must reach the worker that
+accepted the job. Across processes, a per-user lease ensures only one worker
+syncs a user at a time.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+from app.core.config import settings
+from app.database.database import SessionLocal
+from app.services import events, leases, sync_schedule
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"  # another worker holds the user's sync lease
+
+
+class SyncJob:
+    def __init__(self, user_email: str):
+        self.id = uuid.uuid4().hex
+        self.user_email = user_email
+        self.status = QUEUED
+        self.progress = {"listed": 0, "fetched": 0, "enriched": 0, "prioritized": 0, "failed": 0}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._finished_mono = None
+        self._future = None
+        self._done = threading.Event()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def update_progress(self, **counts):
+        """Progress callback for sync_user_emails; values are absolute counts."""
+        self.progress.update(counts)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class SyncJobManager:
+    def __init__(self, max_workers: int = 2, retention_seconds: int = 3600):
+        self._max_workers = max_workers
+        self._retention_seconds = retention_seconds
+        self._executor = None
+        self._jobs: Dict[str, SyncJob] = {}
+        self._active: Dict[str, SyncJob] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="sync-job")
+        return self._executor
+
+    def submit(self, user_email: str) -> SyncJob:
+        """Queue a sync for the user, or return the one already queued/running."""
+        with self._lock:
+            self._prune()
+            job = self._active.get(user_email)
+            if job is not None:
+                return job
+            job = SyncJob(user_email)
+            self._jobs[job.id] = job
+            self._active[user_email] = job
+            job._future = self._get_executor().submit(self._run, job)
+            return job
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self, user_email: str) -> Optional[SyncJob]:
+        with self._lock:
+            return self._active.get(user_email)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the pool. Jobs that never started are marked failed so their waiters return."""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+        with self._lock:
+            cancelled = [job for job in self._active.values() if job._future is not None and job._future.cancelled()]
+        for job in cancelled:
+            job.status = FAILED
+            job.error = "Cancelled: the server shut down before the sync started."
+            self._finish(job)
+
+    def _run(self, job: SyncJob):
+        # Imported here: gmail/sync pull in the Google client on first use
+        from app.services.gmail_service import authenticate_gmail
+        from app.services.sync_service import sync_user_emails
+
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        db = SessionLocal()
+        try:
+            with leases.lease(f"sync:{job.user_email}", settings.SYNC_LEASE_SECONDS, keep_alive=True) as acquired:
+                if not acquired:
+                    job.status = SKIPPED
+                    job.error = "A sync for this user is already running on another worker."
+                else:
+                    service = authenticate_gmail(job.user_email)
+                    if not service:
+                        raise RuntimeError("Authentication failed. Please re-login.")
+                    result = sync_user_emails(db, job.user_email, service, progress=job.update_progress)
+                    job.result = {
+                        "new_emails_count": result["new_emails_count"],
+                        "failed_count": result["failed_count"],
+                        "overall_summary": result["overall_summary"],
+                    }
+                    job.status = SUCCEEDED
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Sync job {job.id} for {job.user_email} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            db.close()
+            if job.status != SKIPPED:
+                try:
+                    new_emails = job.result["new_emails_count"] if job.status == SUCCEEDED else None
+                    sync_schedule.record_sync(job.user_email, new_emails)
+                except Exception as e:
+                    print(f"Failed to reschedule sync for {job.user_email}: {e}")
+            self._finish(job)
+
+    def _finish(self, job: SyncJob):
+        job.finished_at = datetime.now()
+        job._finished_mono = time.monotonic()
+        with self._lock:
+            if self._active.get(job.user_email) is job:
+                del self._active[job.user_email]
+        job._done.set()
+        events.publish(job.user_email, events.SYNC_FINISHED, job_id=job.id, status=job.status,
+                       new_emails_count=(job.result or {}).get("new_emails_count", 0))
+
+    def _prune(self):
+        cutoff = time.monotonic() - self._retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job._finished_mono is not None and job._finished_mono < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+sync_jobs = SyncJobManager(
+    max_workers=settings.SYNC_JOB_WORKERS,
+    retention_seconds=settings.SYNC_JOB_RETENTION_SECONDS
+)
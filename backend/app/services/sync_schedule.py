@@ -0,0 +1,146 @@
+"""
+Per-user sync cadence.
+
+Instead of syncing everyone on one fixed interval, each user has a row in
+sync_schedules with their next run time. The scheduler's dispatch tick starts
+the due syncs (oldest first, at most SYNC_BUDGET_PER_TICK per tick); when a
+sync finishes, its outcome sets the next interval:
+
+  - the smoothed arrival rate (new emails per hour) sets an interval that
+    would pick up about SYNC_TARGET_NEW_EMAILS per sync;
+  - recent activity (login, opening an email) caps it at
+    SYNC_ACTIVE_INTERVAL_MINUTES, and long inactivity stretches it to the max;
+  - the result is jittered so users don't fall due in lockstep.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database.dialects import insert_ignore
+from app.database.models import SyncSchedule, User
+from app.database.writer import run_write
+from app.utils.ttl_cache import TTLCache
+
+# Users whose activity was written recently; avoids a write per request
+_recent_activity = TTLCache(maxsize=10000, ttl=settings.SYNC_ACTIVITY_WRITE_SECONDS)
+
+
+def compute_interval(arrival_rate: float, last_active_at: Optional[datetime], now: datetime) -> float:
+    """Un-jittered seconds until the next sync."""
+    min_seconds = settings.SYNC_MIN_INTERVAL_MINUTES * 60
+    max_seconds = settings.SYNC_MAX_INTERVAL_MINUTES * 60
+
+    if arrival_rate > 0:
+        interval = settings.SYNC_TARGET_NEW_EMAILS / arrival_rate * 3600
+    else:
+        interval = max_seconds
+
+    if last_active_at is not None:
+        idle = now - last_active_at
+        if idle <= timedelta(minutes=settings.SYNC_ACTIVE_WINDOW_MINUTES):
+            interval = min(interval, settings.SYNC_ACTIVE_INTERVAL_MINUTES * 60)
+        elif idle >= timedelta(days=settings.SYNC_IDLE_AFTER_DAYS):
+            interval = max_seconds
+
+    return min(max(interval, min_seconds), max_seconds)
+
+
+def jittered(seconds: float) -> float:
+    spread = settings.SYNC_JITTER_FRACTION
+    return seconds * random.uniform(1 - spread, 1 + spread)
+
+
+def _ensure_row(db: Session, user_email: str, now: datetime):
+    db.execute(insert_ignore(db, SyncSchedule, ['user_email']), [{
+        "user_email": user_email,
+        "next_run_at": now,
+        "interval_seconds": settings.SYNC_MAX_INTERVAL_MINUTES * 60,
+        "arrival_rate": 0.0,
+    }])
+
+
+def add_new_users(db: Session, now: datetime) -> int:
+    """Give every user without a schedule one that is due now. Does not commit."""
+    missing = db.scalars(
+        select(User.email).where(~select(SyncSchedule.user_email).where(SyncSchedule.user_email == User.email).exists())
+    ).all()
+    for user_email in missing:
+        _ensure_row(db, user_email, now)
+    return len(missing)
+
+
+def claim_due(db: Session, now: datetime, limit: int) -> List[str]:
+    """
+    Pick up to `limit` due users, longest-overdue first, and push their next
+    run out by their current interval so later ticks don't start them again
+    while the sync runs. record_sync sets the real next run. Does not commit.
+    """
+    due = db.execute(
+        select(SyncSchedule.user_email, SyncSchedule.interval_seconds)
+        .where(SyncSchedule.next_run_at <= now)
+        .order_by(SyncSchedule.next_run_at)
+        .limit(limit)
+    ).all()
+    for user_email, interval_seconds in due:
+        db.execute(
+            update(SyncSchedule)
+            .where(SyncSchedule.user_email == user_email)
+            .values(next_run_at=now + timedelta(seconds=jittered(interval_seconds)))
+        )
+    return [user_email for user_email, _ in due]
+
+
+def _record_sync(db: Session, user_email: str, new_emails: Optional[int], now: datetime):
+    _ensure_row(db, user_email, now)
+    row = db.get(SyncSchedule, user_email, populate_existing=True)
+    rate = row.arrival_rate or 0.0
+    if new_emails is not None:
+        # A first sync covers the last 24h
+        if row.last_synced_at is None:
+            hours = 24.0
+        else:
+            hours = max((now - row.last_synced_at).total_seconds() / 3600, 1 / 60)
+        alpha = settings.SYNC_RATE_SMOOTHING
+        rate = alpha * (new_emails / hours) + (1 - alpha) * rate
+
+    interval = compute_interval(rate, row.last_active_at, now)
+    values = {
+        "arrival_rate": rate,
+        "interval_seconds": int(interval),
+        "next_run_at": now + timedelta(seconds=jittered(interval)),
+    }
+    if new_emails is not None:
+        values["last_synced_at"] = now
+    db.execute(update(SyncSchedule).where(SyncSchedule.user_email == user_email).values(**values))
+
+
+def _record_activity(db: Session, user_email: str, now: datetime):
+    _ensure_row(db, user_email, now)
+    db.execute(update(SyncSchedule).where(SyncSchedule.user_email == user_email).values(last_active_at=now))
+    # Bring a far-off next run forward; the next sync then keeps the pace up
+    soon = now + timedelta(seconds=jittered(settings.SYNC_ACTIVE_INTERVAL_MINUTES * 60))
+    db.execute(
+        update(SyncSchedule)
+        .where(SyncSchedule.user_email == user_email, SyncSchedule.next_run_at > soon)
+        .values(next_run_at=soon)
+    )
+
+
+def record_sync(user_email: str, new_emails: Optional[int], now: Optional[datetime] = None):
+    """Reschedule after a sync. new_emails=None means it failed: keep the rate, retry after one interval."""
+    now = now or datetime.now()
+    run_write(lambda s: _record_sync(s, user_email, new_emails, now))
+
+
+def record_activity(user_email: str, now: Optional[datetime] = None):
+    """Note that the user is active (throttled per process). Never raises."""
+    if _recent_activity.get(user_email):
+        return
+    _recent_activity.set(user_email, True)
+    now = now or datetime.now()
+    try:
+        run_write(lambda s: _record_activity(s, user_email, now))
+    except Exception as e:
+        print(f"Failed to record activity for {user_email}: {e}")
@@ -0,0 +1,386 @@
+import json
+from datetime import datetime
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.writer import run_write
+from app.database.models import Email, EmailBody, EmailReply, OutboundEmail, SyncState
+from app.services.gmail_service import get_last_24h_emails, get_email_details
+from app.services.ai_service import summarize_email, smart_categorize_email, analyze_emails_with_ai, generate_smart_replies
+from app.services.thread_service import assign_smart_thread_id, load_known_threads
+from app.services import priority_service
+from app.services import events
+from app.services.notification import enqueue_notification, notification_sender
+from app.services import mail_outbox
+from app.services.mail_outbox import mail_sender
+from app.services import task_queue
+from app.services.task_queue import task_extraction_worker
+
+MAX_MESSAGES_PER_SYNC = 50
+
+# Per-email pipeline stages (Email.sync_stage)
+FETCHED = "fetched"
+ENRICHED = "enriched"
+PRIORITIZED = "prioritized"
+
+# Rule-based auto-reply state (Email.auto_reply_state)
+AUTO_REPLY_PENDING = "pending"
+AUTO_REPLY_QUEUED = "queued"
+AUTO_REPLY_FAILED = "failed"
+
+
+def _no_progress(**counts):
+    pass
+
+
+def _checkpoint(user_email: str, **fields):
+    run_write(lambda s: crud.update_sync_state(s, user_email, **fields))
+
+
+def sync_user_emails(db: Session, user_email: str, service, max_messages: int = MAX_MESSAGES_PER_SYNC, progress=None) -> dict:
+    """
+    Fetch, enrich and persist the last 24h of Gmail messages for one user.
+
+    Every stage is checkpointed so an interrupted sync resumes without
+    repeating work:
+      listed      - new Gmail IDs are saved in sync_states.pending_ids
+      fetched     - downloaded messages are stored SYNC_CHECKPOINT_EVERY at a
+                    time, with one batch insert per chunk
+      enriched    - summary / category / smart thread are written with one
+                    executemany UPDATE per chunk
+      prioritized - one AI call prioritizes every enriched email, including
+                    ones left over from an earlier interrupted run; the
+                    task-extraction pre-filter, the high-priority alert and
+                    the emails owed an auto-reply are recorded in the same write
+    Pending auto-replies (this batch's and any an earlier run did not finish)
+    are then generated together and queued for the outbound sender.
+    `progress`, if given, is called with absolute counts (listed, fetched,
+    enriched, prioritized, failed) as the sync advances.
+    """
+    progress = progress or _no_progress
+    try:
+        return _run_sync(db, user_email, service, max_messages, progress)
+    except Exception as e:
+        _checkpoint(user_email, last_error=str(e)[:500])
+        raise
+
+
+def _run_sync(db: Session, user_email: str, service, max_messages: int, progress) -> dict:
+    state = db.get(SyncState, user_email)
+    resumed_ids = json.loads(state.pending_ids) if state and state.pending_ids else []
+    if resumed_ids:
+        print(f"🔁 Resuming sync for {user_email}: {len(resumed_ids)} listed messages pending")
+
+    # 1. List
+    messages = get_last_24h_emails(service) or []
+    candidate_ids = list(dict.fromkeys(resumed_ids + [msg["id"] for msg in messages]))
+    existing_ids = {
+        email_id for (email_id,) in
+        db.query(Email.email_id).filter(Email.email_id.in_(candidate_ids), Email.user_email == user_email).all()
+    } if candidate_ids else set()
+    # Cap only what is new: Gmail lists newest first, so capping the listing
+    # would make every later sync see the same already-stored messages
+    new_ids = [msg_id for msg_id in candidate_ids if msg_id not in existing_ids][:max_messages]
+    _checkpoint(user_email, stage="listed", pending_ids=new_ids, started_at=datetime.now(), last_error=None)
+    progress(listed=len(new_ids))
+
+    # 2. Fetch: store downloaded messages in chunks (stage "fetched")
+    failed_count = 0
+    fetched_count = 0
+    fetched = []
+
+    def _store_fetched():
+        nonlocal failed_count, fetched_count
+        if not fetched:
+            return
+        outcomes = run_write(lambda s: crud.save_email_batch(s, fetched), exclusive=True)
+        for outcome in outcomes:
+            if outcome["status"] == "error":
+                failed_count += 1
+                print(f"Error storing message {outcome['email_id']}: {outcome['error']}")
+            else:
+                fetched_count += 1
+        fetched.clear()
+        progress(fetched=fetched_count, failed=failed_count)
+
+    for msg_id in new_ids:
+        try:
+            sender, subject, preview, full_body, thread_id, attachments, timestamp, is_read = get_email_details(service, msg_id)
+        except Exception as e:
+            failed_count += 1
+            progress(failed=failed_count)
+            print(f"Error fetching message {msg_id}: {e}")
+            continue
+        fetched.append({
+            "email_id": msg_id,
+            "user_email": user_email,
+            "sender": sender,
+            "subject": subject,
+            "body": full_body,
+            "summary": None,
+            "priority": "Medium",
+            "category": None,
+            "thread_id": thread_id,
+            "smart_thread_id": None,
+            "attachments": attachments,
+            "timestamp": timestamp,
+            "is_read": is_read,
+            "sync_stage": FETCHED
+        })
+        if len(fetched) >= settings.SYNC_CHECKPOINT_EVERY:
+            _store_fetched()
+    _store_fetched()
+    _checkpoint(user_email, stage="enriching", pending_ids=None)
+
+    # 3. Enrich every stored-but-unenriched email (this run's and leftovers)
+    known_threads = load_known_threads(db, user_email)
+    to_enrich = (
+        db.query(Email)
+        .filter(Email.user_email == user_email, Email.sync_stage == FETCHED)
+        .order_by(Email.timestamp)
+        .all()
+    )
+    enriched_count = 0
+    enriched = []
+
+    def _store_enriched():
+        nonlocal enriched_count
+        if not enriched:
+            return
+        run_write(lambda s: _save_enrichment(s, enriched))
+        enriched_count += len(enriched)
+        enriched.clear()
+        progress(enriched=enriched_count)
+
+    for email in to_enrich:
+        try:
+            full_body = email.body
+            # Safe summary generation (handles quota errors internally in ai_service)
+            summary = summarize_email(email.subject, full_body)
+            category = smart_categorize_email(email.subject, full_body, email.sender)
+            smart_thread_id = assign_smart_thread_id(db, user_email, email.subject, known_threads=known_threads)
+            known_threads.append((email.subject, smart_thread_id))
+        except Exception as e:
+            failed_count += 1
+            progress(failed=failed_count)
+            print(f"Error enriching message {email.email_id}: {e}")
+            continue
+        enriched.append({"email_id": email.email_id, "summary": summary, "category": category,
+                         "smart_thread_id": smart_thread_id})
+        if len(enriched) >= settings.SYNC_CHECKPOINT_EVERY:
+            _store_enriched()
+    _store_enriched()
+
+    # 4. Prioritize all enriched emails with a single AI call
+    _checkpoint(user_email, stage="prioritizing")
+    batch = [
+        {
+            "email_id": row.email_id,
+            "sender": row.sender,
+            "subject": row.subject,
+            "summary": row.summary,
+            "category": row.category,
+            "is_read": row.is_read
+        }
+        for row in db.query(
+            Email.email_id, Email.sender, Email.subject, Email.summary, Email.category, Email.is_read
+        ).filter(Email.user_email == user_email, Email.sync_stage == ENRICHED).order_by(Email.timestamp)
+    ]
+    if not batch:
+        # Nothing new, but an earlier run may have left auto-replies pending
+        _auto_reply(db, user_email, priority_service.get_matcher(db, user_email))
+        _checkpoint(user_email, stage="idle")
+        progress(prioritized=0, failed=failed_count)
+        return {"new_emails_count": 0, "failed_count": failed_count, "emails": [], "overall_summary": None}
+
+    # User preferences & sender rules, compiled once and cached per user
+    matcher = priority_service.get_matcher(db, user_email)
+
+    ai_data = analyze_emails_with_ai([
+        {"from": e["sender"], "subject": e["subject"], "summary": e["summary"]}
+        for e in batch
+    ])
+    for email in batch:
+        match = next((p for p in ai_data.get("priorities", []) if p["subject"] == email["subject"]), None)
+        ai_priority = match["priority"] if match else "Medium"
+        email["ai_priority"] = ai_priority
+
+        # Resolve Final Priority using Personalization
+        email["priority"] = matcher.resolve_priority(
+            sender=email["sender"],
+            subject=email["subject"],
+            body=email["summary"],
+            ai_priority=ai_priority
+        )
+
+    auto_reply_senders = {sender for sender in {e["sender"] for e in batch} if matcher.auto_reply_rule(sender)}
+    auto_reply_ids = [e["email_id"] for e in batch if e["sender"] in auto_reply_senders]
+
+    priorities = {e["email_id"]: e["priority"] for e in batch}
+    ai_priorities = {e["email_id"]: e["ai_priority"] for e in batch}
+    high_priority = [e for e in batch if e["priority"] == "High"]
+
+    # Pre-filter for background task extraction, recorded with the priorities
+    bodies = {
+        record.email_id: record.text
+        for record in db.query(EmailBody).filter(EmailBody.email_id.in_(list(priorities)))
+    }
+    extraction = task_queue.prefilter(batch, bodies)
+
+    def _prioritize(s):
+        crud.update_email_priorities(s, priorities, commit=False, sync_stage=PRIORITIZED, ai_priorities=ai_priorities)
+        task_queue.set_status(s, extraction)
+        if auto_reply_ids:
+            # Recorded with the priorities, so a crash before the auto-reply stage can't lose them
+            s.execute(
+                update(Email).where(Email.email_id.in_(auto_reply_ids), Email.auto_reply_state.is_(None))
+                .values(auto_reply_state=AUTO_REPLY_PENDING).execution_options(synchronize_session=False)
+            )
+        if high_priority:
+            # Queued with the priorities, so a crash can't lose or repeat the alert
+            summary = ai_data.get("overall_summary") or "Urgent email detected."
+            enqueue_notification(s, user_email, summary)
+
+    run_write(_prioritize)
+    if high_priority:
+        print(f"High Priority Alert for {user_email}: {len(high_priority)} email(s)")
+        notification_sender.wake()
+    if task_queue.QUEUED in extraction.values():
+        task_extraction_worker.wake()
+    progress(prioritized=len(batch), failed=failed_count)
+
+    if "overall_summary" in ai_data:
+        run_write(lambda s: crud.save_user_summary(s, user_email, ai_data["overall_summary"]), exclusive=True)
+
+    events.publish(user_email, events.EMAILS_NEW, emails=[
+        {"email_id": e["email_id"], "from": e["sender"], "subject": e["subject"], "priority": e["priority"]}
+        for e in batch
+    ])
+
+    # 5. Auto-reply
+    _auto_reply(db, user_email, matcher)
+    _checkpoint(user_email, stage="idle")
+
+    return {
+        "new_emails_count": len(batch),
+        "failed_count": failed_count,
+        "overall_summary": ai_data.get("overall_summary"),
+        "emails": [
+            {
+                "email_id": e["email_id"],
+                "from": e["sender"],
+                "subject": e["subject"],
+                "summary": e["summary"],
+                "priority": e["priority"],
+                "is_read": e["is_read"]
+            }
+            for e in batch
+        ]
+    }
+
+
+def _save_enrichment(s: Session, rows: list):
+    """
+    Store summaries, categories and smart threads and advance the rows to
+    ENRICHED. The rows are not listed until prioritized, so the mailbox
+    version is left alone. Does not commit.
+    """
+    table = Email.__table__
+    s.execute(
+        update(table).where(table.c.email_id == bindparam("b_email_id")).values(
+            summary=bindparam("b_summary"),
+            category=bindparam("b_category"),
+            smart_thread_id=bindparam("b_smart_thread_id"),
+            sync_stage=ENRICHED
+        ),
+        [{"b_email_id": r["email_id"], "b_summary": r["summary"], "b_category": r["category"],
+          "b_smart_thread_id": r["smart_thread_id"]} for r in rows]
+    )
+
+
+def _auto_reply(db: Session, user_email: str, matcher: priority_service.PriorityMatcher):
+    # Rows stay pending if this fails; the next sync retries them
+    try:
+        auto_reply_stage(db, user_email, matcher)
+    except Exception as e:
+        print(f"Failed to auto-reply: {e}")
+
+
+def auto_reply_stage(db: Session, user_email: str, matcher: priority_service.PriorityMatcher) -> int:
+    """
+    Queue AI replies for the user's emails marked pending by the prioritize
+    write, including ones an interrupted or failed earlier run left behind.
+    Already-handled emails and bodies are each loaded in one query and replies
+    are generated concurrently. Emails whose reply could not be generated stay
+    pending for the next sync, up to AUTO_REPLY_MAX_ATTEMPTS. Returns the
+    number queued.
+    """
+    pending = db.execute(
+        select(Email.email_id, Email.sender, Email.subject, Email.category, Email.auto_reply_attempts)
+        .where(Email.user_email == user_email, Email.auto_reply_state == AUTO_REPLY_PENDING)
+        .order_by(Email.timestamp, Email.email_id)
+    ).all()
+    if not pending:
+        return 0
+
+    ids = [e.email_id for e in pending]
+    keys = [mail_outbox.auto_reply_key(email_id) for email_id in ids]
+    handled = set(db.scalars(
+        select(EmailReply.email_id).where(EmailReply.email_id.in_(ids), EmailReply.is_auto == True)
+        .union(select(OutboundEmail.email_id).where(OutboundEmail.idempotency_key.in_(keys)))
+    ).all())
+    # The rule may have been removed since the email was marked
+    ruled = {sender for sender in {e.sender for e in pending} if matcher.auto_reply_rule(sender)}
+    todo = [e for e in pending if e.email_id not in handled and e.sender in ruled]
+
+    replies = []
+    if todo:
+        bodies = {
+            record.email_id: record.text
+            for record in db.query(EmailBody).filter(EmailBody.email_id.in_([e.email_id for e in todo]))
+        }
+        print(f"🤖 Auto-reply triggered for {len(todo)} email(s)")
+        replies = generate_smart_replies([
+            {"subject": e.subject, "body": bodies.get(e.email_id) or "", "sender": e.sender, "category": e.category}
+            for e in todo
+        ], tone="Professional", max_workers=settings.AUTO_REPLY_CONCURRENCY)
+
+    def _enqueue(s):
+        states = {e.email_id: (AUTO_REPLY_QUEUED if e.email_id in handled else None, e.auto_reply_attempts)
+                  for e in pending if e.email_id in handled or e.sender not in ruled}
+        queued = 0
+        for email, reply in zip(todo, replies):
+            attempts = email.auto_reply_attempts + 1
+            if not reply:
+                failed = attempts >= settings.AUTO_REPLY_MAX_ATTEMPTS
+                states[email.email_id] = (AUTO_REPLY_FAILED if failed else AUTO_REPLY_PENDING, attempts)
+                continue
+            # Clean sender email for "To" field
+            to_email = email.sender.split("<")[-1].replace(">", "").strip()
+            # The reply is recorded once the outbound sender delivers it
+            mail_outbox.enqueue_email(
+                s, user_email, mail_outbox.AUTO_REPLY,
+                to_email=to_email,
+                subject=reply.get("subject", f"Re: {email.subject}"),
+                body=reply.get("body", "Received."),
+                email_id=email.email_id,
+                tone="Professional",
+                idempotency_key=mail_outbox.auto_reply_key(email.email_id)
+            )
+            states[email.email_id] = (AUTO_REPLY_QUEUED, attempts)
+            queued += 1
+        table = Email.__table__
+        s.execute(
+            update(table).where(table.c.email_id == bindparam("b_email_id")).values(
+                auto_reply_state=bindparam("b_state"), auto_reply_attempts=bindparam("b_attempts")
+            ),
+            [{"b_email_id": email_id, "b_state": state, "b_attempts": attempts}
+             for email_id, (state, attempts) in states.items()]
+        )
+        return queued
+
+    queued = run_write(_enqueue)
+    if queued:
+        mail_sender.wake()
+    return queued
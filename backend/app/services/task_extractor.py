@@ -1,68 +1,134 @@
 import json
 import re
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
 from app.services.ai_service import safe_chat_completion
 
-ACTION_KEYWORDS = [
-    "submit", "complete", "fill", "review", "send", "share",
-    "attend", "join", "schedule", "update", "approve",
-    "deadline", "due", "by", "before"
-]
-ACTION_REGEX = re.compile(r"\b(" + "|".join(ACTION_KEYWORDS) + r")\b", re.IGNORECASE)
+EXTRACTION_MODEL = "arcee-ai/trinity-large-preview:free"
 
-# 2. Time Indicators
-# Matches: 5 PM, 5:30 PM, 17:00, 5pm
-TIME_REGEX = re.compile(r"\b(?:[01]?\d|2[0-3]):[0-5]\d\b|\b\d{1,2}\s?(?:am|pm)\b", re.IGNORECASE)
+# Task pre-filter: one regex, one pass, a weighted score.
+#
+# Each named group is a kind of signal; a text scores the weight of every
+# kind it contains, counting at most SIGNAL_CAP hits per kind. Bare "by" /
+# "before" only count as part of a deadline phrase ("by Friday", "before
+# 5pm"): on their own they match almost every email.
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+WEEKDAYS = r"(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+CLOCK = r"\d{1,2}(?::[0-5]\d)?\s?(?:am|pm)"
 
-# 3. Date Indicators
-# Matches: today, tomorrow, EOD, ASAP, 12/09, 12-09, Sept 12
-DATE_KEYWORDS = r"today|tomorrow|eod|asap"
-DATE_NUMERIC = r"\d{1,2}[/-]\d{1,2}"
-DATE_TEXTUAL = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s\d{1,2}"
-DATE_REGEX = re.compile(rf"\b({DATE_KEYWORDS})\b|{DATE_NUMERIC}|{DATE_TEXTUAL}", re.IGNORECASE)
+# Patterns are lower-case and every one starts at the start of a word; that
+# check is added once in SIGNAL_REGEX so the scanner rejects other positions
+# cheaply (text is lower-cased up front: much faster than re.IGNORECASE)
+SIGNAL_PATTERNS = {
+    # "by Friday", "before EOD", "no later than 5pm", "deadline", "due"
+    "deadline": rf"(?:by|before|no later than|until)\s+(?:today|tomorrow|tonight|eod|cob|end of (?:the )?(?:day|week|month)|next \w+|{WEEKDAYS}|{CLOCK}|{MONTHS}\s\d{{1,2}})\b|(?:deadline|due)\b",
+    "action": r"(?:submit|complete|fill (?:out|in)|approve|sign|rsvp|register|pay|renew|attend|confirm)\b",
+    "request": r"(?:please|kindly|can you|could you|would you|let me know|action required)\b",
+    "soft_action": r"(?:review|send|share|join|schedule|update|reply|respond)\b",
+    # 5 PM, 5:30 PM, 17:00, 5pm
+    "time": rf"(?:[01]?\d|2[0-3]):[0-5]\d\b|{CLOCK}\b",
+    # today, tomorrow, EOD, ASAP, 12/09, 12-09, Sept 12
+    "date": rf"(?:today|tomorrow|eod|asap)\b|\d{{1,2}}[/-]\d{{1,2}}\b|{MONTHS}\s\d{{1,2}}\b",
+}
+SIGNAL_WEIGHTS = {
+    "deadline": 1.5,
+    "action": 1.0,
+    "request": 0.75,
+    "soft_action": 0.5,
+    "time": 0.75,
+    "date": 0.75,
+}
+PRIORITY_WEIGHTS = {"High": 1.25, "Medium": 0.5}
+SIGNAL_CAP = 2
+EXCLUDED_CATEGORIES = {"Offers", "Promotions", "Spam"}
+SCAN_CHARS = 2000
 
+SIGNAL_REGEX = re.compile(
+    r"\b(?=[a-z0-9])(?:" + "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in SIGNAL_PATTERNS.items()) + ")"
+)
+# Separates texts in batch mode; no signal pattern can match across it
+_SEPARATOR = "\n\x00\n"
 
-def should_extract_tasks(
+
+def _scan_text(subject: str, body: str) -> str:
+    return f"{subject or ''} {(body or '')[:SCAN_CHARS]}".lower()
+
+
+def _score(counts: Dict[str, int], category: Optional[str], priority: Optional[str]) -> float:
+    if category in EXCLUDED_CATEGORIES:
+        return 0.0
+    score = PRIORITY_WEIGHTS.get(priority, 0.0)
+    for kind, count in counts.items():
+        score += SIGNAL_WEIGHTS[kind] * min(count, SIGNAL_CAP)
+    return score
+
+
+def task_signal_score(
     subject: str,
     body: str,
     category: Optional[str] = None,
     priority: Optional[str] = None
+) -> float:
+    """
+    Weighted evidence that an email asks the recipient to do something.
+    Promotions/Offers/Spam always score 0.
+    """
+    if category in EXCLUDED_CATEGORIES:
+        return 0.0
+    counts: Dict[str, int] = {}
+    for match in SIGNAL_REGEX.finditer(_scan_text(subject, body)):
+        counts[match.lastgroup] = counts.get(match.lastgroup, 0) + 1
+    return _score(counts, category, priority)
+
+
+def task_signal_scores(emails: Iterable[dict]) -> List[float]:
+    """
+    task_signal_score for many emails ({"subject", "body", "category",
+    "priority"}) with a single regex pass over all of their text.
+    """
+    emails = list(emails)
+    texts, starts, position = [], [], 0
+    for email in emails:
+        text = "" if email.get("category") in EXCLUDED_CATEGORIES else _scan_text(email.get("subject"), email.get("body"))
+        starts.append(position)
+        texts.append(text)
+        position += len(text) + len(_SEPARATOR)
+
+    counts: List[Dict[str, int]] = [{} for _ in emails]
+    index, last = 0, len(starts) - 1
+    for match in SIGNAL_REGEX.finditer(_SEPARATOR.join(texts)):
+        # Matches come in order, so the owning email only moves forward
+        position = match.start()
+        while index < last and starts[index + 1] <= position:
+            index += 1
+        email_counts = counts[index]
+        email_counts[match.lastgroup] = email_counts.get(match.lastgroup, 0) + 1
+    return [
+        _score(email_counts, email.get("category"), email.get("priority"))
+        for email, email_counts in zip(emails, counts)
+    ]
+
+
+def should_extract_tasks(
+    subject: str,
+    body: str,
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    threshold: Optional[float] = None
 ) -> bool:
     """
     Deterministic pre-filter to decide if an email is eligible for AI task extraction.
-    
-    Rules:
-    - Returns False if category is Offers/Promotions/Spam.
-    - Returns True if Priority is High/Medium.
-    - Returns True if Action Keywords or Time/Date patterns are found.
-    - Otherwise returns False.
-    
+
+    True when task_signal_score reaches `threshold` (TASK_PREFILTER_THRESHOLD
+    by default). With the default weights that takes e.g. a deadline plus an
+    action or request, or a High priority plus any request; priority alone
+    is not enough.
+
     This acts as a cost-control layer before calling the expensive LLM function.
     """
-    
-    # 1. Negative Filters (Exclusions take precedence)
-    if category in ["Offers", "Promotions", "Spam"]:
-        return False
-        
-    # 2. Positive Filter: High Priority
-    # If it's important, we check it regardless of keywords (unless excluded above)
-    if priority in ["High", "Medium"]:
-        return True
-        
-    # 3. Content Analysis
-    # Combine subject and body for search (limit body to first 2000 chars for speed)
-    text_to_scan = f"{subject} {body[:2000]}"
-    
-    if ACTION_REGEX.search(text_to_scan):
-        return True
-        
-    if TIME_REGEX.search(text_to_scan):
-        return True
-        
-    if DATE_REGEX.search(text_to_scan):
-        return True
-        
-    return False
+    if threshold is None:
+        threshold = settings.TASK_PREFILTER_THRESHOLD
+    return task_signal_score(subject, body, category, priority) >= threshold
 
 
 def extract_tasks_from_email(subject: str, body: str) -> dict:
@@ -119,26 +185,18 @@ def extract_tasks_from_email(subject: str, body: str) -> dict:
     try:
         # Strict low temperature for consistent JSON
         response = safe_chat_completion(
-            model="arcee-ai/trinity-large-preview:free",
+            model=EXTRACTION_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=300,
             temperature=0.1
         )
-        
-        # Clean potential markdown wrapping
-        cleaned_response = response.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response[7:-3].strip()
-        elif cleaned_response.startswith("```"):
-            cleaned_response = cleaned_response[3:-3].strip()
-            
-        data = json.loads(cleaned_response)
+        data = _parse_json(response)
         
         # Validate critical fields
         if "has_tasks" not in data or "tasks" not in data:
             raise ValueError("Invalid JSON schema returned by AI")
-            
-        return data
+
+        return {"has_tasks": bool(data["has_tasks"]), "tasks": _clean_tasks(data["tasks"])}
 
     except Exception as e:
         print(f"Task Extraction Failed: {e}")
@@ -147,3 +205,86 @@ def extract_tasks_from_email(subject: str, body: str) -> dict:
             "has_tasks": False,
             "tasks": []
         }
+
+
+def _parse_json(response: str):
+    # Clean potential markdown wrapping
+    cleaned_response = response.strip()
+    if cleaned_response.startswith("```json"):
+        cleaned_response = cleaned_response[7:-3].strip()
+    elif cleaned_response.startswith("```"):
+        cleaned_response = cleaned_response[3:-3].strip()
+    return json.loads(cleaned_response)
+
+
+def _clean_tasks(tasks) -> List[dict]:
+    # Model output is untrusted: keep dict items with a string task_text, and
+    # drop deadlines that are not strings rather than fail the whole batch
+    if not isinstance(tasks, list):
+        return []
+    return [
+        {"task_text": task["task_text"],
+         "deadline": task.get("deadline") if isinstance(task.get("deadline"), str) else None}
+        for task in tasks
+        if isinstance(task, dict) and isinstance(task.get("task_text"), str)
+    ]
+
+
+def extract_tasks_batch(emails: List[dict]) -> Optional[List[Optional[dict]]]:
+    """
+    Extract tasks from several emails ({"subject", "body"}) with one LLM call.
+
+    Returns one {"has_tasks", "tasks"} result per email, in order, with None
+    for an email the model left out; returns None if the call itself failed.
+    Malformed task items are dropped.
+    """
+    if not emails:
+        return []
+    blocks = "\n".join(
+        f"--- EMAIL {i} ---\nSubject: {e.get('subject') or ''}\nBody:\n{(e.get('body') or '')[:1500]}"
+        for i, e in enumerate(emails)
+    )
+    prompt = f"""
+    You are a task extraction engine. For EACH email below, identify explicit actionable tasks.
+
+    RULES:
+    1. Extract ONLY specific actions the user (recipient) needs to take.
+    2. Ignore: Promotions, Newsletters, FYI-only emails, General status updates without action required.
+    3. If an email has no clear actions, return "has_tasks": false for it.
+    4. Deadlines: Extract if present (e.g., "by Friday", "tomorrow", "Jan 31st"). If none, set null.
+    5. Output MUST be valid JSON only. NO markdown, NO explanations.
+
+    JSON Schema:
+    {{
+      "results": [
+        {{
+          "email": number (the EMAIL index),
+          "has_tasks": boolean,
+          "tasks": [{{"task_text": "string (concise action)", "deadline": "string | null"}}]
+        }}
+      ]
+    }}
+
+    EMAILS:
+    {blocks}
+    """
+
+    try:
+        response = safe_chat_completion(
+            model=EXTRACTION_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=250 * len(emails),
+            temperature=0.1
+        )
+        data = _parse_json(response)
+        results: List[Optional[dict]] = [None] * len(emails)
+        for item in data.get("results", []):
+            if not isinstance(item, dict):
+                continue
+            index = item.get("email")
+            if isinstance(index, int) and 0 <= index < len(emails) and "has_tasks" in item:
+                results[index] = {"has_tasks": bool(item["has_tasks"]), "tasks": _clean_tasks(item.get("tasks"))}
+        return results
+    except Exception as e:
+        print(f"Batch Task Extraction Failed: {e}")
+        return None
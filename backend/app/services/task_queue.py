@@ -0,0 +1,215 @@
+"""
+Background task extraction.
+
+When a sync prioritizes a batch, every email goes through the task
+pre-filter (task_signal_scores) and is marked in Email.task_extraction:
+"queued" if it may contain tasks, "skipped" if not. A TaskExtractionWorker
+sends queued emails to the model TASK_EXTRACTION_BATCH_SIZE per call and
+stores their tasks, so /emails/{id}/extract-tasks normally just reads them.
+
+Tasks are saved behind a conditional UPDATE to "done", so the worker and an
+on-demand extraction of the same email never both add its tasks. Emails
+whose extraction failed stay queued and are retried with exponential
+backoff; after TASK_EXTRACTION_MAX_ATTEMPTS they are marked "failed" and
+left to the on-demand path. A failed batch call (e.g. a model outage) also
+ends the worker's run, so it doesn't burn through the whole queue.
+"""
+from datetime import datetime, timedelta, tzinfo
+from typing import Dict, List, Optional
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database import crud
+from app.database.database import SessionLocal
+from app.database.models import Email, EmailBody, EmailTask
+from app.database.writer import run_write
+from app.services import leases
+from app.services.task_extractor import extract_tasks_batch, task_signal_scores
+from app.services.workers import PollingWorker
+from app.utils.deadline_parser import parse_deadlines, resolve_timezone
+
+QUEUED = "queued"
+SKIPPED = "skipped"
+DONE = "done"
+FAILED = "failed"
+
+
+def prefilter(emails: List[dict], bodies: Dict[str, Optional[str]], threshold: Optional[float] = None) -> Dict[str, str]:
+    """QUEUED or SKIPPED for each email ({"email_id", "subject", "category", "priority"}), scored in one pass."""
+    if threshold is None:
+        threshold = settings.TASK_PREFILTER_THRESHOLD
+    scores = task_signal_scores(
+        {"subject": e.get("subject"), "body": bodies.get(e["email_id"]),
+         "category": e.get("category"), "priority": e.get("priority")}
+        for e in emails
+    )
+    return {e["email_id"]: QUEUED if score >= threshold else SKIPPED for e, score in zip(emails, scores)}
+
+
+def set_status(db: Session, statuses: Dict[str, str]):
+    """Set task_extraction for many emails in one executemany UPDATE. Does not commit."""
+    if not statuses:
+        return
+    table = Email.__table__
+    db.execute(
+        update(table).where(table.c.email_id == bindparam("b_email_id")).values(task_extraction=bindparam("b_status")),
+        [{"b_email_id": email_id, "b_status": status} for email_id, status in statuses.items()]
+    )
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(settings.TASK_EXTRACTION_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1),
+               settings.TASK_EXTRACTION_BACKOFF_MAX_SECONDS)
+
+
+def next_batch(db: Session, limit: int, now: Optional[datetime] = None) -> List[dict]:
+    """The oldest queued emails that are due, with their bodies."""
+    now = now or datetime.now()
+    rows = db.execute(
+        select(Email.email_id, Email.user_email, Email.subject, Email.timestamp, Email.task_extraction_attempts)
+        .where(Email.task_extraction == QUEUED, or_(
+            Email.task_extraction_next_attempt_at.is_(None), Email.task_extraction_next_attempt_at <= now
+        ))
+        .order_by(Email.timestamp, Email.email_id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return []
+    bodies = {
+        record.email_id: record.text
+        for record in db.query(EmailBody).filter(EmailBody.email_id.in_([row.email_id for row in rows]))
+    }
+    timezones = crud.get_user_timezones(db, [row.user_email for row in rows])
+    return [
+        {"email_id": row.email_id, "user_email": row.user_email, "subject": row.subject or "",
+         "body": bodies.get(row.email_id) or "", "timestamp": row.timestamp,
+         "timezone": timezones.get(row.user_email), "attempts": row.task_extraction_attempts}
+        for row in rows
+    ]
+
+
+def save_tasks(db: Session, email_id: str, user_email: str, result: dict, now: Optional[datetime] = None,
+               anchor: Optional[datetime] = None, tz: Optional[tzinfo] = None) -> Optional[List[EmailTask]]:
+    """
+    Mark the email done and add the extracted tasks, resolving relative
+    deadlines from `anchor` (the email's timestamp) in `tz`. Returns None
+    (adding nothing) if its tasks were already saved. Does not commit.
+    """
+    claimed = db.execute(
+        update(Email)
+        .where(Email.email_id == email_id, or_(Email.task_extraction.is_(None), Email.task_extraction != DONE))
+        .values(task_extraction=DONE)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return None
+    now = now or datetime.now()
+    extracted = [task for task in (result.get("tasks") or []) if result.get("has_tasks") and task.get("task_text")]
+    deadlines = parse_deadlines((task.get("deadline") for task in extracted), anchor or now, tz)
+    tasks = [
+        EmailTask(
+            email_id=email_id,
+            user_email=user_email,
+            task_text=task["task_text"],
+            deadline=deadline,
+            source="ai",
+            completed=False,
+            created_at=now
+        )
+        for task, deadline in zip(extracted, deadlines)
+    ]
+    if tasks:
+        db.add_all(tasks)
+        crud.bump_mailbox_versions(db, [user_email])
+        db.flush()  # assigns IDs
+    return tasks
+
+
+def schedule_retries(db: Session, jobs: List[dict], now: datetime):
+    """
+    Requeue emails whose extraction failed after a backoff, or mark them
+    FAILED once they have used TASK_EXTRACTION_MAX_ATTEMPTS. Emails whose
+    tasks were saved meanwhile (on demand) are left alone. Does not commit.
+    """
+    if not jobs:
+        return
+    params = []
+    for job in jobs:
+        attempts = job["attempts"] + 1
+        params.append({
+            "b_email_id": job["email_id"],
+            "b_status": FAILED if attempts >= settings.TASK_EXTRACTION_MAX_ATTEMPTS else QUEUED,
+            "b_attempts": attempts,
+            "b_next_attempt_at": now + timedelta(seconds=backoff_seconds(attempts)),
+        })
+    table = Email.__table__
+    db.execute(
+        update(table)
+        .where(and_(table.c.email_id == bindparam("b_email_id"), table.c.task_extraction == QUEUED))
+        .values(task_extraction=bindparam("b_status"), task_extraction_attempts=bindparam("b_attempts"),
+                task_extraction_next_attempt_at=bindparam("b_next_attempt_at")),
+        params
+    )
+
+
+def extract_pending(db: Session, limit: int) -> int:
+    """
+    Extract one batch of due queued emails. Returns the number of emails
+    handled, or 0 if the model call failed (the batch is retried later).
+    """
+    jobs = next_batch(db, limit)
+    db.rollback()  # don't hold a read snapshot during the model call
+    if not jobs:
+        return 0
+
+    results = extract_tasks_batch(jobs)
+    if results is None:
+        run_write(lambda s: schedule_retries(s, jobs, datetime.now()))
+        print(f"Task extraction failed for {len(jobs)} email(s); retrying later")
+        return 0
+
+    def _save(s):
+        now = datetime.now()
+        for job, result in zip(jobs, results):
+            if result is not None:
+                save_tasks(s, job["email_id"], job["user_email"], result, now,
+                           anchor=job["timestamp"], tz=resolve_timezone(job["timezone"]))
+        schedule_retries(s, [job for job, result in zip(jobs, results) if result is None], now)
+
+    run_write(_save)
+    print(f"🗒️ Extracted tasks from {len(jobs)} email(s)")
+    return len(jobs)
+
+
+class TaskExtractionWorker(PollingWorker):
+    """Drains queued emails every TASK_EXTRACTION_POLL_SECONDS, or sooner when woken."""
+
+    name = "task-extraction"
+
+    def __init__(self, batch_size: int = 8, poll_seconds: float = 30):
+        super().__init__(poll_seconds)
+        self._batch_size = batch_size
+
+    def run_once(self) -> int:
+        # One worker calls the model at a time, so no email is extracted twice
+        with leases.lease("task-extraction", settings.TASK_EXTRACTION_LEASE_SECONDS, keep_alive=True) as acquired:
+            if not acquired:
+                return 0
+            handled = 0
+            db = SessionLocal()
+            try:
+                while not self._stopping.is_set():
+                    count = extract_pending(db, self._batch_size)
+                    handled += count
+                    # A short batch means the queue is drained, 0 that the model call failed
+                    if count < self._batch_size:
+                        break
+            finally:
+                db.close()
+            return handled
+
+
+task_extraction_worker = TaskExtractionWorker(
+    batch_size=settings.TASK_EXTRACTION_BATCH_SIZE,
+    poll_seconds=settings.TASK_EXTRACTION_POLL_SECONDS
+)
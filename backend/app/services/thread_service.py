@@ -1,23 +1,163 @@
 import os
+from sqlalchemy import String, and_, case, cast, func, literal, or_
 from sqlalchemy.orm import Session
+from app.database import crud
+from app.database.dialects import str_position
 from app.database.models import Email
 from app.utils.subject_similarity import subject_similarity
 
-def assign_smart_thread_id(db: Session, user_email: str, subject: str) -> str:
-    emails = db.query(Email).filter(Email.user_email == user_email).all()
+def load_known_threads(db: Session, user_email: str):
+    """(subject, smart_thread_id) pairs for a user, for reuse across a sync batch."""
+    return [
+        (subject, smart_thread_id) for subject, smart_thread_id in
+        db.query(Email.subject, Email.smart_thread_id)
+        .filter(Email.user_email == user_email, Email.smart_thread_id.isnot(None))
+        .all()
+    ]
+
+def assign_smart_thread_id(db: Session, user_email: str, subject: str, known_threads=None) -> str:
+    """
+    Match a subject against the user's existing threads. Pass `known_threads`
+    (see load_known_threads) to avoid re-querying for every email in a batch.
+    """
+    if known_threads is None:
+        known_threads = load_known_threads(db, user_email)
 
     best_match = None
     best_score = 0
 
-    for email in emails:
+    for known_subject, smart_thread_id in known_threads:
         # Assuming subject_similarity returns 0-100 or similar
-        score = subject_similarity(subject, email.subject)
+        score = subject_similarity(subject, known_subject)
         if score > 85 and score > best_score:
-            best_match = email.smart_thread_id
+            best_match = smart_thread_id
             best_score = score
 
     # If no match found → create new smart thread id
     if not best_match:
         return f"smart-{os.urandom(4).hex()}"
 
-    return best_match
\ No newline at end of file
+    return best_match
+
+
+# --------------------------
+# SQL-side grouping
+# --------------------------
+
+def sender_name_expr():
+    """Display name part of the sender ("Name <addr>" -> "Name")."""
+    sender = func.coalesce(Email.sender, "")
+    bracket = str_position(sender, "<")
+    return case(
+        (bracket > 0, func.trim(func.substr(sender, 1, bracket - 1))),
+        else_=func.trim(sender),
+    )
+
+
+def group_key_expr(mode: str):
+    """SQL expression producing the group key for a threading mode."""
+    if mode == "subject":
+        return func.coalesce(Email.smart_thread_id, "Unthreaded")
+    if mode == "category":
+        return func.coalesce(Email.category, "Uncategorized")
+    if mode == "priority":
+        return func.coalesce(Email.priority, "Medium")
+    if mode == "sender":
+        return sender_name_expr()
+    if mode == "date":
+        return cast(func.date(Email.timestamp), String)
+    return literal("Other", String)
+
+
+def list_thread_groups(db: Session, user_email: str, mode: str, limit: int, after=None):
+    """
+    Return one page of thread groups (key, count, latest timestamp) for a user,
+    newest group first. `after` is the (latest_timestamp, group_key) of the last
+    group on the previous page.
+    """
+    key = group_key_expr(mode).label("group_key")
+    latest = func.max(Email.timestamp).label("latest_timestamp")
+    email_count = func.count(Email.email_id).label("email_count")
+
+    query = (
+        db.query(key, email_count, latest)
+        .filter(crud.visible_emails(user_email))
+        .group_by(key)
+    )
+
+    if after is not None:
+        after_ts, after_key = after
+        query = query.having(or_(
+            latest < after_ts,
+            and_(latest == after_ts, key > after_key)
+        ))
+
+    rows = query.order_by(latest.desc(), key.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
+
+
+def get_group_previews(db: Session, user_email: str, mode: str, keys):
+    """Latest email (id, subject, summary) of each of the given groups, in one query."""
+    if not keys:
+        return {}
+
+    key = group_key_expr(mode)
+    ranked = (
+        db.query(
+            key.label("group_key"),
+            Email.email_id,
+            Email.subject,
+            Email.summary,
+            func.row_number().over(
+                partition_by=key,
+                order_by=(Email.timestamp.desc(), Email.email_id.desc())
+            ).label("rn")
+        )
+        .filter(crud.visible_emails(user_email), key.in_(list(keys)))
+        .subquery()
+    )
+
+    rows = (
+        db.query(ranked.c.group_key, ranked.c.email_id, ranked.c.subject, ranked.c.summary)
+        .filter(ranked.c.rn == 1)
+        .all()
+    )
+    return {
+        r.group_key: {"email_id": r.email_id, "subject": r.subject, "summary": r.summary}
+        for r in rows
+    }
+
+
+def list_group_emails(db: Session, user_email: str, mode: str, group_key: str, limit: int, after=None):
+    """
+    Return one page of the emails in a single group, newest first, using projected
+    columns only. `after` is the (timestamp, email_id) of the last email on the
+    previous page.
+    """
+    query = (
+        db.query(
+            Email.email_id,
+            Email.sender,
+            Email.subject,
+            Email.summary,
+            Email.priority,
+            Email.category,
+            Email.thread_id,
+            Email.smart_thread_id,
+            Email.timestamp,
+            Email.is_read,
+        )
+        .filter(crud.visible_emails(user_email), group_key_expr(mode) == group_key)
+    )
+
+    if after is not None:
+        after_ts, after_id = after
+        query = query.filter(or_(
+            Email.timestamp < after_ts,
+            and_(Email.timestamp == after_ts, Email.email_id < after_id)
+        ))
+
+    rows = query.order_by(Email.timestamp.desc(), Email.email_id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
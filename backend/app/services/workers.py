@@ -0,0 +1,51 @@
+"""
+Poll loop shared by the background workers (notification sender, outbound
+mail sender, task extraction).
+
+A worker calls run_once() every poll_seconds, or sooner when woken. The wake
+flag is cleared before each pass, not after it, so a wake() that arrives
+while a pass is running starts another pass straight away instead of waiting
+out a full interval.
+"""
+import threading
+from typing import Optional
+
+
+class PollingWorker:
+    """Runs run_once() on a daemon thread; subclasses implement run_once."""
+
+    name = "worker"
+
+    def __init__(self, poll_seconds: float):
+        self._poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"{self.name} worker error: {e}")
+            self._wake.wait(self._poll_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
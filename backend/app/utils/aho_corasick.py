@@ -0,0 +1,74 @@
+from collections import deque
+from typing import Iterable, Optional
+
+_NO_MATCH = float("inf")
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher: one pass over the text finds every
+    pattern, however many there are.
+
+    Patterns are identified by their position in the input; first_match()
+    returns the lowest position that occurs in the text, so callers can keep
+    "first rule wins" semantics. Empty patterns are ignored.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        # Lowest pattern index ending at each node, including via fail links
+        self._best = [_NO_MATCH]
+        self.size = 0
+
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(_NO_MATCH)
+                node = nxt
+            self._best[node] = min(self._best[node], index)
+            self.size += 1
+
+        # Breadth-first: a node's fail link is always shallower than the node
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._best[child] = min(self._best[child], self._best[self._fail[child]])
+                queue.append(child)
+
+    def _step(self, node: int, char: str) -> int:
+        while node and char not in self._goto[node]:
+            node = self._fail[node]
+        return self._goto[node].get(char, 0)
+
+    def first_match(self, text: str) -> Optional[int]:
+        """Lowest index of a pattern found in `text`, or None."""
+        best = _NO_MATCH
+        node = 0
+        for char in text:
+            node = self._step(node, char)
+            if self._best[node] < best:
+                best = self._best[node]
+        return None if best == _NO_MATCH else int(best)
+
+    def contains_any(self, text: str) -> bool:
+        """True as soon as any pattern is found in `text`."""
+        node = 0
+        for char in text:
+            node = self._step(node, char)
+            if self._best[node] != _NO_MATCH:
+                return True
+        return False
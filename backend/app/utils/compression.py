@@ -0,0 +1,21 @@
+import zlib
+from typing import Optional, Tuple
+
+DEFAULT_CODEC = "zlib"
+ZLIB_LEVEL = 6
+
+
+def compress_text(text: Optional[str]) -> Tuple[str, Optional[bytes]]:
+    """Compress a text blob for storage. Returns (codec, data)."""
+    if text is None:
+        return DEFAULT_CODEC, None
+    return DEFAULT_CODEC, zlib.compress(text.encode("utf-8"), ZLIB_LEVEL)
+
+
+def decompress_text(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    """Inverse of compress_text."""
+    if data is None:
+        return None
+    if codec in (None, "zlib"):
+        return zlib.decompress(data).decode("utf-8", errors="ignore")
+    raise ValueError(f"Unknown body codec: {codec}")
@@ -0,0 +1,237 @@
+"""
+Deadline phrases from the task extractor ("tomorrow 5 PM", "by Friday",
+"EOD", "Jan 31st", "in 2 days") turned into datetimes.
+
+Relative phrases are resolved against the email's timestamp in the user's
+timezone, not against the moment of parsing. Common shapes are handled by
+compiled patterns; anything else falls back to dateutil, still anchored to
+the email. Results are naive UTC, like EmailTask.deadline.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Time used when a phrase names a day but no time: end of the working day
+DEFAULT_TIME = time(17, 0)
+TONIGHT_TIME = time(20, 0)
+
+WEEKDAYS = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1, "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5, "sun": 6, "sunday": 6,
+}
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+NAMED_TIMES = {
+    "noon": time(12, 0), "midday": time(12, 0), "midnight": time(23, 59),
+    "eod": DEFAULT_TIME, "end of day": DEFAULT_TIME, "end of the day": DEFAULT_TIME,
+    "cob": DEFAULT_TIME, "close of business": DEFAULT_TIME,
+}
+
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+_TIME = (
+    r"(?:(?P<hour>\d{1,2})(?::(?P<minute>[0-5]\d))?\s*(?P<ampm>[ap])\.?m\.?"
+    r"|(?P<hour24>[01]?\d|2[0-3]):(?P<minute24>[0-5]\d)"
+    r"|(?P<named_time>noon|midday|midnight|eod|end of (?:the )?day|cob|close of business))"
+)
+_DATE = (
+    r"(?:(?P<rel>today|tonight|tomorrow|tmrw|tmr|end of (?:the )?week|eow|this week|next week|end of (?:the )?month|eom)"
+    r"|(?:(?P<wd_mod>this|next|coming)\s+)?(?P<weekday>" + "|".join(sorted(WEEKDAYS, key=len, reverse=True)) + r")"
+    r"|in\s+(?P<in_n>\d+|a|an|one|two|three|four|five)\s+(?P<in_unit>minute|hour|day|week)s?"
+    r"|(?P<month>" + _MONTH + r")\s+(?P<md_day>\d{1,2})" + _ORDINAL + r"(?:,?\s+(?P<md_year>\d{4}))?"
+    r"|(?P<dm_day>\d{1,2})" + _ORDINAL + r"\s+(?:of\s+)?(?P<dm_month>" + _MONTH + r")(?:,?\s+(?P<dm_year>\d{4}))?"
+    r"|(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})"
+    r"|(?P<num_m>\d{1,2})/(?P<num_d>\d{1,2})(?:/(?P<num_y>\d{2}|\d{4}))?)"
+)
+# "tomorrow 5pm", "Friday at noon", "2026-03-06 17:00", "Jan 31st"
+DATE_FIRST = re.compile(r"^" + _DATE + r"(?:[,\s]+(?:at\s+|by\s+)?" + _TIME + r")?$")
+# "5pm tomorrow", "noon on Friday", "EOD"
+TIME_FIRST = re.compile(r"^" + _TIME + r"(?:[,\s]+(?:on\s+)?" + _DATE + r")?$")
+_PREFIX = re.compile(r"^(?:(?:by|before|due|on|until|till|no later than|at|deadline:?)\s+)+")
+
+
+def resolve_timezone(name: Optional[str]) -> tzinfo:
+    """The user's timezone (an IANA name), or the server's local timezone."""
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return datetime.now().astimezone().tzinfo
+
+
+def utc_now() -> datetime:
+    """The current time as naive UTC, the way deadlines and reminder times are stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """An aware datetime as naive UTC; naive values are taken to be UTC already."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _local_anchor(anchor: Optional[datetime], tz: tzinfo) -> datetime:
+    # Naive anchors are server-local wall time (how Email.timestamp is stored)
+    anchor = anchor or datetime.now()
+    if anchor.tzinfo is None:
+        anchor = anchor.astimezone()
+    return anchor.astimezone(tz)
+
+
+def _to_utc(day: date, at: time, tz: tzinfo) -> datetime:
+    return datetime.combine(day, at, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _year_for(month: int, day: int, anchor: date) -> int:
+    # A month/day more than a week before the email is next year's
+    try:
+        candidate = date(anchor.year, month, day)
+    except ValueError:
+        return anchor.year
+    return anchor.year + 1 if candidate < anchor - timedelta(days=7) else anchor.year
+
+
+def _time_of(groups: dict) -> Optional[time]:
+    if groups["named_time"]:
+        return NAMED_TIMES[groups["named_time"]]
+    if groups["hour24"]:
+        return time(int(groups["hour24"]), int(groups["minute24"]))
+    if groups["hour"]:
+        hour = int(groups["hour"])
+        if not 1 <= hour <= 12:
+            raise ValueError("hour out of range")
+        hour = hour % 12 + (12 if groups["ampm"] == "p" else 0)
+        return time(hour, int(groups["minute"] or 0))
+    return None
+
+
+def _normalize(text: str) -> str:
+    text = " ".join(text.lower().replace(" ", " ").split()).strip(" .,;!")
+    return _PREFIX.sub("", text)
+
+
+@lru_cache(maxsize=4096)
+def _compile_phrase(text: str) -> Optional[Tuple[dict, Optional[time]]]:
+    """
+    The anchor-independent part of parsing: (match groups, time of day), or
+    None when the patterns don't cover the phrase. Cached, since the model
+    keeps returning the same few phrases.
+    """
+    normalized = _normalize(text)
+    match = DATE_FIRST.match(normalized) or TIME_FIRST.match(normalized)
+    if not match:
+        return None
+    groups = match.groupdict()
+    try:
+        return groups, _time_of(groups)
+    except ValueError:
+        return None
+
+
+def _resolve(groups: dict, at: Optional[time], local: datetime, tz: tzinfo) -> Optional[datetime]:
+    today = local.date()
+
+    if groups["rel"]:
+        rel = groups["rel"]
+        if rel in ("today", "tonight"):
+            day = today
+            at = at or (TONIGHT_TIME if rel == "tonight" else None)
+        elif rel in ("tomorrow", "tmrw", "tmr"):
+            day = today + timedelta(days=1)
+        elif rel in ("next week",):
+            day = today + timedelta(days=7 + 4 - today.weekday())
+        elif rel in ("end of month", "end of the month", "eom"):
+            first_next = date(today.year + today.month // 12, today.month % 12 + 1, 1)
+            day = first_next - timedelta(days=1)
+        else:  # this week / end of (the) week / eow: the coming Friday
+            day = today + timedelta(days=(4 - today.weekday()) % 7)
+    elif groups["weekday"]:
+        ahead = (WEEKDAYS[groups["weekday"]] - today.weekday()) % 7
+        if groups["wd_mod"] == "next":
+            ahead = ahead or 7
+            # "next Friday" said on a Monday means the Friday after this one
+            if today.weekday() + ahead < 7:
+                ahead += 7
+        day = today + timedelta(days=ahead)
+    elif groups["in_unit"]:
+        n = int(groups["in_n"]) if groups["in_n"].isdigit() else NUMBERS[groups["in_n"]]
+        unit = groups["in_unit"]
+        if unit in ("minute", "hour"):
+            moment = local + timedelta(**{unit + "s": n})
+            return moment.astimezone(timezone.utc).replace(tzinfo=None)
+        day = today + timedelta(days=n * (7 if unit == "week" else 1))
+    elif groups["month"] or groups["dm_month"]:
+        month = MONTHS[(groups["month"] or groups["dm_month"])[:3]]
+        day_num = int(groups["md_day"] or groups["dm_day"])
+        year = groups["md_year"] or groups["dm_year"]
+        day = date(int(year) if year else _year_for(month, day_num, today), month, day_num)
+    elif groups["iso_y"]:
+        day = date(int(groups["iso_y"]), int(groups["iso_m"]), int(groups["iso_d"]))
+    elif groups["num_m"]:
+        month, day_num, year = int(groups["num_m"]), int(groups["num_d"]), groups["num_y"]
+        if year:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+        day = date(year or _year_for(month, day_num, today), month, day_num)
+    else:
+        # A time on its own: today, or tomorrow if that time had already passed
+        day = today
+        if at is not None and datetime.combine(day, at) < local.replace(tzinfo=None):
+            day += timedelta(days=1)
+
+    return _to_utc(day, at or DEFAULT_TIME, tz)
+
+
+def _fallback(text: str, local: datetime, tz: tzinfo) -> Optional[datetime]:
+    # Imported here: only needed for phrases the patterns above don't cover
+    from dateutil import parser
+
+    default = datetime.combine(local.date(), DEFAULT_TIME)
+    try:
+        parsed = parser.parse(text, fuzzy=True, default=default)
+    except (ValueError, OverflowError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_deadline(text: Optional[str], anchor: Optional[datetime] = None, tz: Optional[tzinfo] = None) -> Optional[datetime]:
+    """
+    Naive-UTC deadline for `text`, with relative phrases resolved from
+    `anchor` (the email's timestamp) in `tz` (default: server local).
+    Returns None for empty or unparseable text.
+    """
+    if not text or not text.strip():
+        return None
+    tz = tz or resolve_timezone(None)
+    local = _local_anchor(anchor, tz)
+    compiled = _compile_phrase(text)
+    if compiled:
+        try:
+            return _resolve(*compiled, local, tz)
+        except ValueError:
+            pass
+    return _fallback(text, local, tz)
+
+
+def parse_deadlines(texts: Iterable[Optional[str]], anchor: Optional[datetime] = None,
+                    tz: Optional[tzinfo] = None) -> List[Optional[datetime]]:
+    """parse_deadline for many phrases sharing one anchor and timezone; repeated phrases are parsed once."""
+    tz = tz or resolve_timezone(None)
+    anchor = _local_anchor(anchor, tz)
+    seen: Dict[Optional[str], Optional[datetime]] = {}
+    results = []
+    for text in texts:
+        if text not in seen:
+            seen[text] = parse_deadline(text, anchor, tz)
+        results.append(seen[text])
+    return results
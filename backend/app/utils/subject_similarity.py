@@ -1,7 +1,3 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-
 def subject_similarity(subject1, subject2):
     # ---------- Safety checks ----------
     if not subject1 or not subject2:
@@ -15,6 +11,10 @@ def subject_similarity(subject1, subject2):
 
     texts = [subject1, subject2]
 
+    # scikit-learn is slow to import; load it on first comparison, not at startup
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     try:
         vectorizer = TfidfVectorizer(stop_words="english")
         tfidf = vectorizer.fit_transform(texts)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+# Add backend to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db_session(request, tmp_path):
+    """
+    A session on a fresh schema, once per backend.
+    PostgreSQL runs only when TEST_POSTGRES_URL points at a scratch database.
+    """
+    if request.param == "postgresql":
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL not set")
+    else:
+        url = f"sqlite:///{tmp_path}/test.db"
+
+    from app.database.database import Base, create_db_engine
+    import app.database.models  # noqa: F401  (registers tables)
+
+    engine = create_db_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
+@pytest.fixture
+def inline_writer(db_session, monkeypatch):
+    """
+    Call inline_writer(module, ...) to run those modules' run_write jobs
+    directly on db_session, committing (or rolling back) after each one,
+    instead of going through the writer thread.
+    """
+    def run_write(fn, exclusive=False, timeout=30):
+        try:
+            result = fn(db_session)
+            db_session.commit()
+            return result
+        except Exception:
+            db_session.rollback()
+            raise
+
+    def patch(*modules):
+        for module in modules:
+            monkeypatch.setattr(module, "run_write", run_write)
+        return run_write
+
+    return patch
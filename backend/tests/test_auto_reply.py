@@ -0,0 +1,68 @@
+import pytest
+
+from app.core.config import settings
+from app.database.models import Email, EmailReply, OutboundEmail, SenderRule
+from app.services import sync_service
+from app.services.priority_service import PriorityMatcher
+
+USER = "u@x.com"
+
+
+@pytest.fixture
+def stage(db_session, monkeypatch, inline_writer):
+    generated = []
+
+    def generate_smart_replies(emails, tone, max_workers=4):
+        generated.append([e["subject"] for e in emails])
+        return [None if "fail" in e["subject"] else {"subject": f"Re: {e['subject']}", "body": f"Thanks for {e['body']}"}
+                for e in emails]
+
+    inline_writer(sync_service)
+    monkeypatch.setattr(sync_service, "generate_smart_replies", generate_smart_replies)
+    monkeypatch.setattr(sync_service.mail_sender, "wake", lambda: None)
+    return db_session, generated
+
+
+def _seed(db, emails):
+    for email_id, sender, subject in emails:
+        email = Email(email_id=email_id, user_email=USER, sender=sender, subject=subject, category="Work",
+                      auto_reply_state=sync_service.AUTO_REPLY_PENDING)
+        email.body = f"body {email_id}"
+        db.add(email)
+
+
+def _states(db):
+    db.expire_all()
+    return {e.email_id: (e.auto_reply_state, e.auto_reply_attempts) for e in db.query(Email)}
+
+
+def test_pending_auto_replies_are_generated_together_and_queued_once(stage):
+    db, generated = stage
+    _seed(db, [
+        ("m1", "News <a@news.com>", "Issue 1"),
+        ("m2", "News <a@news.com>", "Issue 2"),
+        ("m3", "friend@x.org", "Lunch"),
+        ("m4", "News <a@news.com>", "Issue fail"),
+        ("m5", "News <a@news.com>", "Already answered"),
+    ])
+    db.add(Email(email_id="m6", user_email=USER, sender="a@news.com", subject="Not pending"))
+    db.add(EmailReply(email_id="m5", user_email=USER, reply_text="hi", tone="Professional", is_auto=True))
+    matcher = PriorityMatcher.compile(None, [SenderRule(user_email=USER, sender_email="@news.com", auto_reply=True)])
+    db.commit()
+
+    assert sync_service.auto_reply_stage(db, USER, matcher) == 2
+    assert generated == [["Issue 1", "Issue 2", "Issue fail"]]
+    queued = {row.email_id: row for row in db.query(OutboundEmail)}
+    assert set(queued) == {"m1", "m2"}
+    assert queued["m1"].to_email == "a@news.com" and queued["m1"].body == "Thanks for body m1"
+    assert _states(db) == {
+        "m1": ("queued", 1), "m2": ("queued", 1),
+        "m3": (None, 0),  # its sender no longer has a rule
+        "m4": ("pending", 1), "m5": ("queued", 0), "m6": (None, 0),
+    }
+
+    # Later syncs only retry the failed one, until it runs out of attempts
+    for _ in range(settings.AUTO_REPLY_MAX_ATTEMPTS):
+        assert sync_service.auto_reply_stage(db, USER, matcher) == 0
+    assert generated[1:] == [["Issue fail"]] * (settings.AUTO_REPLY_MAX_ATTEMPTS - 1)
+    assert _states(db)["m4"] == ("failed", settings.AUTO_REPLY_MAX_ATTEMPTS)
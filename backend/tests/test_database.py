@@ -0,0 +1,213 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from app.database import crud
+from app.database.dialects import insert_ignore
+from app.database.models import Email, EmailAttachment, EmailBody, EmailTask
+from app.services.retention_service import purge_expired_chunk
+from app.services.thread_service import list_thread_groups, list_group_emails
+
+
+def make_email(email_id, user_email="test@example.com", **overrides):
+    row = {
+        "email_id": email_id,
+        "user_email": user_email,
+        "sender": "Alice <alice@example.com>",
+        "subject": f"Subject {email_id}",
+        "body": f"Body of {email_id}",
+        "summary": "Summary",
+        "priority": "Medium",
+        "category": "Work",
+        "thread_id": None,
+        "smart_thread_id": None,
+        "attachments": [],
+        "timestamp": datetime(2026, 1, 1),
+        "is_read": False,
+    }
+    row.update(overrides)
+    return row
+
+
+def test_save_email_batch_outcomes(db_session):
+    crud.save_email_batch(db_session, [make_email("existing")])
+
+    batch = [
+        make_email("a", attachments=[{"filename": "f.pdf", "mime_type": "application/pdf", "size": 10, "attachment_id": "att-a"}]),
+        make_email("b"),
+        make_email("existing"),
+        make_email("a"),
+    ]
+    outcomes = crud.save_email_batch(db_session, batch, priority_updates={"existing": "High"})
+
+    assert [o["status"] for o in outcomes] == ["inserted", "inserted", "exists", "exists"]
+    assert db_session.query(Email).count() == 3
+    assert db_session.query(EmailAttachment).count() == 1
+    assert db_session.get(Email, "existing").priority == "High"
+    assert db_session.get(Email, "b").body == "Body of b"
+
+
+def test_save_email_batch_isolates_bad_rows(db_session):
+    outcomes = crud.save_email_batch(db_session, [make_email("good"), make_email("bad", user_email=None)])
+
+    assert [o["status"] for o in outcomes] == ["inserted", "error"]
+    assert db_session.query(Email.email_id).all() == [("good",)]
+
+
+def test_insert_ignore_skips_conflicts(db_session):
+    crud.save_email_batch(db_session, [make_email("dup")])
+    db_session.execute(insert_ignore(db_session, EmailBody, ["email_id"]), [{"email_id": "dup", "codec": "zlib", "data": None}])
+    db_session.commit()
+
+    assert db_session.get(Email, "dup").body == "Body of dup"
+
+
+def test_thread_groups_paginate_by_sender(db_session):
+    base = datetime(2026, 1, 1)
+    crud.save_email_batch(db_session, [
+        make_email(f"m{i}", sender=f"Sender{i % 3} <s{i % 3}@example.com>", timestamp=base + timedelta(hours=i))
+        for i in range(9)
+    ])
+
+    first, has_more = list_thread_groups(db_session, "test@example.com", "sender", limit=2)
+    assert has_more
+    assert [r.group_key for r in first] == ["Sender2", "Sender1"]
+
+    last = first[-1]
+    rest, has_more = list_thread_groups(db_session, "test@example.com", "sender", limit=2, after=(last.latest_timestamp, last.group_key))
+    assert not has_more
+    assert [(r.group_key, r.email_count) for r in rest] == [("Sender0", 3)]
+
+    members, _ = list_group_emails(db_session, "test@example.com", "sender", "Sender0", limit=10)
+    assert [m.email_id for m in members] == ["m6", "m3", "m0"]
+
+
+def test_run_migrations_upgrades_legacy_schema(tmp_path):
+    from sqlalchemy import inspect, text
+    from app.database.database import create_db_engine
+    from app.database.migrations import MIGRATIONS, run_migrations, vacuum, vacuum_pending
+
+    # Written without the app's connection pragmas, like a database from before them
+    legacy = sqlite3.connect(tmp_path / "legacy.db")
+    with legacy:
+        legacy.execute(
+            "CREATE TABLE emails (id INTEGER PRIMARY KEY, email_id VARCHAR UNIQUE, user_email VARCHAR, "
+            "sender VARCHAR, subject VARCHAR, body TEXT, summary TEXT, priority VARCHAR, category VARCHAR, "
+            "thread_id VARCHAR, smart_thread_id VARCHAR, timestamp DATETIME)"
+        )
+        legacy.execute("INSERT INTO emails (email_id, user_email, body) VALUES ('legacy', 'u@example.com', 'Old body')")
+    legacy.close()
+    engine = create_db_engine(f"sqlite:///{tmp_path}/legacy.db")
+
+    assert run_migrations(engine) == sorted(version for version, *_ in MIGRATIONS)
+    assert run_migrations(engine) == []
+
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("emails")}
+    assert "body" not in columns and "is_read" in columns
+    assert "ix_emails_user_state_ts" in {i["name"] for i in inspector.get_indexes("emails")}
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT codec, data FROM email_bodies WHERE email_id = 'legacy'")).one()
+    assert EmailBody(codec=row.codec, data=row.data).text == "Old body"
+
+    # The full VACUUM is left to migrate_db.py, never run at startup
+    assert vacuum_pending(engine)
+    assert vacuum(engine)
+    assert not vacuum_pending(engine) and not vacuum(engine)
+    engine.dispose()
+
+    # A new database gets incremental auto-vacuum from the start
+    fresh = create_db_engine(f"sqlite:///{tmp_path}/fresh.db")
+    run_migrations(fresh)
+    assert not vacuum_pending(fresh)
+    fresh.dispose()
+
+
+def test_task_times_migrate_from_server_local_to_utc(db_session, monkeypatch):
+    from app.database.migrations import convert_task_times_to_utc
+
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        db_session.add(EmailTask(id=1, user_email="u@x.com", task_text="t", deadline=datetime(2026, 3, 2, 9, 0),
+                                 reminder_time=datetime(2026, 3, 2, 8, 0), reminder_sent=False, completed=False))
+        db_session.add(EmailTask(id=2, user_email="u@x.com", task_text="undated", completed=False))
+        db_session.commit()
+        convert_task_times_to_utc(db_session.connection())
+        db_session.commit()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    db_session.expire_all()
+    task = db_session.get(EmailTask, 1)
+    assert (task.deadline, task.reminder_time) == (datetime(2026, 3, 2, 3, 30), datetime(2026, 3, 2, 2, 30))
+    assert db_session.get(EmailTask, 2).deadline is None
+
+
+def test_purge_expired_chunk_cascades(db_session):
+    old = datetime(2026, 1, 1)
+    crud.save_email_batch(db_session, [make_email(f"t{i}") for i in range(3)] + [make_email("kept")])
+    db_session.query(Email).filter(Email.email_id.like("t%")).update(
+        {Email.is_deleted: True, Email.deleted_at: old}, synchronize_session=False
+    )
+    db_session.add(EmailAttachment(email_id="t0", filename="a.pdf", attachment_id="att-t0"))
+    db_session.commit()
+
+    cutoff = old + timedelta(days=1)
+    assert purge_expired_chunk(db_session, "trash", cutoff, chunk_size=2) == 2
+    assert purge_expired_chunk(db_session, "trash", cutoff, chunk_size=2) == 1
+    assert purge_expired_chunk(db_session, "trash", cutoff, chunk_size=2) == 0
+    db_session.commit()
+
+    assert [e.email_id for e in db_session.query(Email).all()] == ["kept"]
+    assert db_session.query(EmailBody).count() == 1
+    assert db_session.query(EmailAttachment).count() == 0
+
+
+def test_writes_bump_mailbox_version(db_session):
+    assert crud.get_mailbox_version(db_session, "test@example.com") == 0
+
+    crud.save_email_batch(db_session, [make_email("v1"), make_email("v2")])
+    assert crud.get_mailbox_version(db_session, "test@example.com") == 1
+
+    crud.update_email_priorities(db_session, {"v1": "High"})
+    crud.bump_mailbox_versions(db_session, ["test@example.com", "other@example.com"])
+    db_session.commit()
+    assert crud.get_mailbox_version(db_session, "test@example.com") == 3
+    assert crud.get_mailbox_version(db_session, "other@example.com") == 1
+
+
+def test_search_matches_bodies_only_when_asked(db_session):
+    from app.api.deps import Identity
+    from app.api.emails import search_emails
+
+    crud.save_email_batch(db_session, [
+        make_email("s1", body="The invoice number is 4471"),
+        make_email("s2", subject="Invoice attached"),
+        make_email("s3"),
+    ])
+    user = Identity(id=1, email="test@example.com")
+
+    assert [e["email_id"] for e in search_emails(q="4471", body=False, current_user=user, db=db_session)] == []
+    found = search_emails(q="INVOICE", body=True, current_user=user, db=db_session)
+    assert sorted(e["email_id"] for e in found) == ["s1", "s2"]
+
+
+def test_rows_still_syncing_are_not_listed(db_session):
+    from app.api.deps import Identity
+    from app.api.emails import _email_list, search_emails
+
+    crud.save_email_batch(db_session, [
+        make_email("done"),
+        make_email("fetched", sync_stage="fetched", summary=None),
+        make_email("enriched", sync_stage="enriched"),
+    ])
+    user = Identity(id=1, email="test@example.com")
+
+    assert [e["email_id"] for e in _email_list(db_session, user, "All", "inbox", 0, 50)["emails"]] == ["done"]
+    assert [e["email_id"] for e in search_emails(q="subject", body=True, current_user=user, db=db_session)] == ["done"]
+    groups, _ = list_thread_groups(db_session, "test@example.com", "sender", limit=10)
+    assert [g.email_count for g in groups] == [1]
+    rows, _ = list_group_emails(db_session, "test@example.com", "sender", "Alice", limit=10)
+    assert [r.email_id for r in rows] == ["done"]
@@ -0,0 +1,75 @@
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.utils.deadline_parser import parse_deadline, parse_deadlines, resolve_timezone
+
+BERLIN = ZoneInfo("Europe/Berlin")
+# Wednesday 4 March 2026, 10:00 in Berlin (09:00 UTC)
+SENT = datetime(2026, 3, 4, 10, 0, tzinfo=BERLIN)
+
+# Bulk parsing must beat dateutil's fuzzy parser by at least this factor.
+# Wall-clock timing is flaky on shared CI, so it only runs with RUN_BENCHMARKS=1.
+SPEEDUP_FLOOR = float(os.getenv("DEADLINE_PARSER_SPEEDUP_FLOOR", "3"))
+benchmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="RUN_BENCHMARKS not set")
+
+
+@pytest.mark.parametrize("phrase, expected_utc", [
+    ("tomorrow 5 PM", datetime(2026, 3, 5, 16, 0)),
+    ("by Friday", datetime(2026, 3, 6, 16, 0)),
+    ("EOD", datetime(2026, 3, 4, 16, 0)),
+    ("5pm tomorrow", datetime(2026, 3, 5, 16, 0)),
+    ("9am", datetime(2026, 3, 5, 8, 0)),  # already past when the email was sent
+    ("noon on Friday", datetime(2026, 3, 6, 11, 0)),
+    ("next Friday", datetime(2026, 3, 13, 16, 0)),
+    ("in 2 days", datetime(2026, 3, 6, 16, 0)),
+    ("in 3 hours", datetime(2026, 3, 4, 12, 0)),
+    ("end of the week", datetime(2026, 3, 6, 16, 0)),
+    ("Jan 31st", datetime(2027, 1, 31, 16, 0)),
+    ("March 10, 2026 at 14:30", datetime(2026, 3, 10, 13, 30)),
+    ("3/15", datetime(2026, 3, 15, 16, 0)),
+    ("2026-04-01 09:00", datetime(2026, 4, 1, 7, 0)),  # summer time
+])
+def test_phrases_resolve_from_the_email_in_the_users_timezone(phrase, expected_utc):
+    assert parse_deadline(phrase, SENT, BERLIN) == expected_utc
+
+
+def test_unknown_shapes_fall_back_to_dateutil_anchored_to_the_email():
+    assert parse_deadline("the 20th", SENT, BERLIN) == datetime(2026, 3, 20, 16, 0)
+    assert parse_deadline("whenever you can", SENT, BERLIN) is None
+    assert parse_deadline("Feb 30", SENT, BERLIN) is None
+    assert parse_deadline(None, SENT, BERLIN) is None
+
+
+def test_batch_matches_single_and_unknown_timezone_falls_back():
+    phrases = ["tomorrow 5 PM", None, "by Friday", "tomorrow 5 PM"]
+    assert parse_deadlines(phrases, SENT, BERLIN) == [parse_deadline(p, SENT, BERLIN) for p in phrases]
+    assert resolve_timezone("Not/AZone") == resolve_timezone(None)
+
+
+@benchmark
+def test_benchmark_compiled_patterns_beat_dateutil():
+    from dateutil import parser
+
+    phrases = ["tomorrow 5 PM", "by Friday", "EOD", "Jan 31st", "in 2 days", "next Monday 9am", "3/15", "noon"]
+    # Distinct anchors so nothing is served from the batch's phrase memo
+    anchors = [SENT + timedelta(minutes=i) for i in range(250)]
+
+    start = time.perf_counter()
+    for anchor in anchors:
+        parse_deadlines(phrases, anchor, BERLIN)
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for anchor in anchors:
+        for phrase in phrases:
+            try:
+                parser.parse(phrase, fuzzy=True)
+            except (ValueError, OverflowError):
+                pass
+    fuzzy = time.perf_counter() - start
+
+    assert compiled * SPEEDUP_FLOOR < fuzzy, f"compiled {compiled:.3f}s vs dateutil {fuzzy:.3f}s"
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+from app.services.events import InMemoryBroker, format_sse
+
+
+def test_publish_from_worker_thread_reaches_subscriber():
+    broker = InMemoryBroker(queue_size=2)
+
+    async def scenario():
+        sub = broker.subscribe("a@example.com")
+        other = broker.subscribe("b@example.com")
+
+        def worker():
+            for i in range(3):
+                broker.publish("a@example.com", {"type": "emails.new", "n": i})
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        # Queue holds 2: the oldest event was dropped
+        first = await sub.get(timeout=1)
+        second = await sub.get(timeout=1)
+        assert [first["n"], second["n"]] == [1, 2]
+        assert await other.get(timeout=0.05) is None
+
+        broker.unsubscribe(sub)
+        broker.unsubscribe(other)
+        assert broker.subscriber_count("a@example.com") == 0
+
+    asyncio.run(scenario())
+
+
+def test_format_sse():
+    assert format_sse({"type": "reminder.fired", "task_id": 1}) == (
+        'event: reminder.fired\ndata: {"type": "reminder.fired", "task_id": 1}\n\n'
+    )
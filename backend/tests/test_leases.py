@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database.models import JobLease
+from app.services import leases
+
+
+def test_only_one_owner_holds_a_lease(db_session):
+    assert leases._acquire(db_session, "reminders", "worker-a", 60)
+    db_session.commit()
+    assert not leases._acquire(db_session, "reminders", "worker-b", 60)
+    db_session.commit()
+
+    # Re-acquiring and renewing our own lease succeeds; renewing someone else's does not
+    assert leases._acquire(db_session, "reminders", "worker-a", 60)
+    assert leases._renew(db_session, "reminders", "worker-a", 60)
+    assert not leases._renew(db_session, "reminders", "worker-b", 60)
+    db_session.commit()
+
+
+def test_expired_lease_is_taken_over(db_session):
+    assert leases._acquire(db_session, "sync:u@x.com", "worker-a", 60)
+    db_session.commit()
+
+    # worker-a died; its lease runs out
+    db_session.get(JobLease, "sync:u@x.com").expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+
+    assert leases._acquire(db_session, "sync:u@x.com", "worker-b", 60)
+    db_session.commit()
+    assert db_session.get(JobLease, "sync:u@x.com").owner == "worker-b"
+    assert not leases._renew(db_session, "sync:u@x.com", "worker-a", 60)
+
+
+def test_release_frees_the_lease(db_session):
+    assert leases._acquire(db_session, "retention", "worker-a", 600)
+    db_session.commit()
+
+    # Only the holder can release it
+    leases._release(db_session, "retention", "worker-b")
+    db_session.commit()
+    assert not leases._acquire(db_session, "retention", "worker-b", 600)
+
+    leases._release(db_session, "retention", "worker-a")
+    db_session.commit()
+    assert leases._acquire(db_session, "retention", "worker-b", 600)
+    db_session.commit()
+
+
+def test_scheduled_job_keeps_its_lease_for_the_interval(db_session, inline_writer):
+    inline_writer(leases)
+    with leases.lease("retention", 60, hold_seconds=3600) as acquired:
+        assert acquired
+    # Another worker's tick later in the same interval skips the job
+    assert not leases.try_acquire("retention", 60, owner="worker-b")
+    assert db_session.get(JobLease, "retention").expires_at > datetime.utcnow() + timedelta(minutes=59)
+
+    # A failed run gives the lease up so another worker can retry
+    with pytest.raises(RuntimeError):
+        with leases.lease("sync-dispatch", 60, hold_seconds=3600):
+            raise RuntimeError("boom")
+    assert leases.try_acquire("sync-dispatch", 60, owner="worker-b")
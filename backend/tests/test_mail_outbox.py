@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+import sys
+import threading
+import types
+
+import pytest
+
+from app.core.config import settings
+from app.database.models import Email, EmailReply, OutboundEmail
+from app.services import leases, mail_outbox
+from app.services.mail_outbox import FAILED, QUEUED, SENDING, SENT, claim_batch, enqueue_email
+from app.utils.ttl_cache import TTLCache
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+@pytest.fixture
+def outbox(db_session, inline_writer):
+    inline_writer(mail_outbox)
+    return db_session
+
+
+@pytest.fixture
+def gmail(monkeypatch):
+    """Stand-in for app.services.gmail_service that records sends by Message-ID."""
+    fake = types.SimpleNamespace(sent={}, fail=False)
+
+    def send_email_via_gmail(user_email, to_email, subject, body, message_id=None, service=None):
+        fake.sent[message_id] = {"id": f"gm-{len(fake.sent)}", "threadId": "t1"}
+        if fake.fail:
+            raise TimeoutError("read timed out")  # reached Gmail, response lost
+        return fake.sent[message_id]
+
+    module = types.SimpleNamespace(
+        get_gmail_service=lambda user_email: object(),
+        forget_gmail_service=lambda user_email: None,
+        send_email_via_gmail=send_email_via_gmail,
+        find_sent_message=lambda service, message_id: fake.sent.get(message_id),
+    )
+    monkeypatch.setitem(sys.modules, "app.services.gmail_service", module)
+    return fake
+
+
+def test_same_idempotency_key_queues_once(outbox):
+    first = enqueue_email(outbox, "u@x.com", mail_outbox.NEW, "a@y.com", "Hi", "Body", idempotency_key="k1", now=NOW)
+    again = enqueue_email(outbox, "u@x.com", mail_outbox.NEW, "a@y.com", "Hi", "Body", idempotency_key="k1", now=NOW)
+    outbox.commit()
+    assert first.id == again.id
+    assert outbox.query(OutboundEmail).count() == 1
+
+
+def test_claims_respect_per_user_concurrency(outbox):
+    for i in range(3):
+        enqueue_email(outbox, "a@x.com", mail_outbox.NEW, "z@y.com", f"A{i}", "Body", now=NOW)
+    enqueue_email(outbox, "b@x.com", mail_outbox.NEW, "z@y.com", "B0", "Body", now=NOW)
+    outbox.commit()
+
+    claimed = claim_batch(outbox, NOW, limit=10, per_user=1)
+    outbox.commit()
+    assert [job["subject"] for job in claimed] == ["A0", "B0"]
+    # a@x.com already has a send in flight
+    assert claim_batch(outbox, NOW, limit=10, per_user=1) == []
+
+    # A crashed worker's claim expires and the row is picked up again
+    later = NOW + timedelta(seconds=settings.MAIL_CLAIM_SECONDS)
+    reclaimed = claim_batch(outbox, later, limit=10, per_user=1)
+    assert sorted((job["subject"], job["attempts"]) for job in reclaimed) == [("A0", 2), ("B0", 2)]
+
+
+def test_workers_claim_one_at_a_time(outbox, inline_writer):
+    inline_writer(leases)
+    enqueue_email(outbox, "a@x.com", mail_outbox.NEW, "z@y.com", "A0", "Body", now=NOW)
+    outbox.commit()
+    sender = mail_outbox.OutboundMailSender()
+
+    # Another worker is counting and claiming right now
+    assert leases.try_acquire("mail-claim", 30, owner="other-worker")
+    assert sender.run_once() == 0
+    assert outbox.query(OutboundEmail).one().status == QUEUED
+
+
+def test_delivery_records_sent_copy_and_reply(outbox, gmail):
+    outbox.add(Email(email_id="m1", user_email="u@x.com", sender="a@y.com", subject="Q"))
+    enqueue_email(outbox, "u@x.com", mail_outbox.NEW, "a@y.com", "Hello", "Body", now=NOW)
+    enqueue_email(outbox, "u@x.com", mail_outbox.AUTO_REPLY, "a@y.com", "Re: Q", "Thanks",
+                  email_id="m1", tone="Professional", idempotency_key=mail_outbox.auto_reply_key("m1"), now=NOW)
+    outbox.commit()
+
+    for job in claim_batch(outbox, NOW, limit=10, per_user=10):
+        assert mail_outbox.deliver(job) == SENT
+
+    assert {row.status for row in outbox.query(OutboundEmail)} == {SENT}
+    sent_copy = outbox.query(Email).filter(Email.email_id != "m1").one()
+    assert (sent_copy.sender, sent_copy.subject, sent_copy.body) == ("u@x.com", "Hello", "Body")
+    reply = outbox.query(EmailReply).one()
+    assert (reply.email_id, reply.is_auto, reply.reply_text) == ("m1", True, "Thanks")
+
+
+def test_retry_after_lost_response_does_not_send_twice(outbox, gmail, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SEND_MAX_ATTEMPTS", 3)
+    outbox.add(Email(email_id="m1", user_email="u@x.com", sender="a@y.com", subject="Q"))
+    enqueue_email(outbox, "u@x.com", mail_outbox.REPLY, "a@y.com", "Re: Q", "Sure", email_id="m1", now=NOW)
+    outbox.commit()
+
+    gmail.fail = True
+    [job] = claim_batch(outbox, NOW, limit=1, per_user=1)
+    assert mail_outbox.deliver(job) == QUEUED
+    row = outbox.query(OutboundEmail).one()
+    assert row.attempts == 1 and "timed out" in row.last_error
+
+    gmail.fail = False
+    [job] = claim_batch(outbox, row.next_attempt_at, limit=1, per_user=1)
+    assert mail_outbox.deliver(job) == SENT
+    assert len(gmail.sent) == 1
+
+
+def test_gives_up_after_max_attempts(outbox, gmail, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SEND_MAX_ATTEMPTS", 1)
+    gmail.fail = True
+    enqueue_email(outbox, "u@x.com", mail_outbox.NEW, "a@y.com", "Hi", "Body", now=NOW)
+    outbox.commit()
+    [job] = claim_batch(outbox, NOW, limit=1, per_user=1)
+    assert job["status"] == SENDING
+    assert mail_outbox.deliver(job) == FAILED
+
+
+def test_gmail_clients_are_cached_per_thread(monkeypatch):
+    from app.services import gmail_service
+
+    monkeypatch.setattr(gmail_service, "authenticate_gmail", lambda user_email: object())
+    monkeypatch.setattr(gmail_service, "_gmail_services", TTLCache(maxsize=8, ttl=60))
+
+    mine = gmail_service.get_gmail_service("a@x.com")
+    assert gmail_service.get_gmail_service("a@x.com") is mine
+    other = []
+    thread = threading.Thread(target=lambda: other.append(gmail_service.get_gmail_service("a@x.com")))
+    thread.start()
+    thread.join()
+    assert other[0] is not mine
+
+    gmail_service.forget_gmail_service("a@x.com")
+    assert gmail_service.get_gmail_service("a@x.com") is not mine
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.database.models import NotificationOutbox
+from app.services import notification
+from app.services.notification import ALERT, FAILED, PENDING, REMINDER, deliver_pending, enqueue_notification
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+class FakeTransport:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, title, message):
+        if self.fail:
+            raise RuntimeError("ntfy unreachable")
+        self.sent.append((title, message))
+
+
+@pytest.fixture
+def outbox(db_session, monkeypatch, inline_writer):
+    inline_writer(notification)
+    monkeypatch.setattr(settings, "NOTIFICATION_TOPIC", "test-topic")
+    return db_session
+
+
+def test_alerts_wait_for_the_digest_window_and_coalesce(outbox):
+    for i in range(3):
+        enqueue_notification(outbox, "a@x.com", f"alert {i}", kind=ALERT, now=NOW)
+    enqueue_notification(outbox, "b@x.com", "only one", kind=ALERT, now=NOW)
+    outbox.commit()
+
+    transport = FakeTransport()
+    assert deliver_pending(outbox, transport, now=NOW) == 0
+
+    later = NOW + timedelta(seconds=settings.NOTIFY_DIGEST_WINDOW_SECONDS)
+    assert deliver_pending(outbox, transport, now=later) == 2
+    digests = dict(transport.sent)
+    assert digests["3 notifications"].splitlines() == [f"• High Alert Emails: alert {i}" for i in range(3)]
+    assert digests["High Alert Emails"] == "only one"
+    assert outbox.query(NotificationOutbox).count() == 0
+
+
+def test_reminder_goes_out_at_once_with_pending_alerts(outbox):
+    enqueue_notification(outbox, "a@x.com", "alert", kind=ALERT, now=NOW)
+    enqueue_notification(outbox, "a@x.com", "Reminder: pay rent", title="Task Reminder", kind=REMINDER, now=NOW)
+    outbox.commit()
+
+    transport = FakeTransport()
+    assert deliver_pending(outbox, transport, now=NOW) == 1
+    assert transport.sent == [("2 notifications", "• High Alert Emails: alert\n• Task Reminder: Reminder: pay rent")]
+
+
+def test_failures_back_off_then_give_up(outbox, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_MAX_ATTEMPTS", 2)
+    enqueue_notification(outbox, "a@x.com", "Reminder", kind=REMINDER, now=NOW)
+    outbox.commit()
+    transport = FakeTransport(fail=True)
+
+    assert deliver_pending(outbox, transport, now=NOW) == 0
+    row = outbox.query(NotificationOutbox).one()
+    assert (row.status, row.attempts) == (PENDING, 1)
+    assert row.next_attempt_at == NOW + timedelta(seconds=settings.NOTIFY_BACKOFF_BASE_SECONDS)
+
+    # Not retried before the backoff expires
+    assert deliver_pending(outbox, transport, now=NOW + timedelta(seconds=1)) == 0
+    outbox.refresh(row)
+    assert row.attempts == 1
+
+    deliver_pending(outbox, transport, now=row.next_attempt_at)
+    outbox.refresh(row)
+    assert (row.status, row.attempts) == (FAILED, 2)
+    assert "unreachable" in row.last_error
@@ -0,0 +1,114 @@
+import json
+
+from app.core.config import settings
+from app.database.models import Email, SenderRule, UserPreference
+from app.services import priority_service
+from app.services.priority_service import PriorityMatcher
+from app.utils.aho_corasick import AhoCorasick
+
+
+def test_aho_corasick_reports_lowest_pattern_index():
+    automaton = AhoCorasick(["hers", "she", "he", ""])
+    assert automaton.first_match("ushers") == 0
+    assert automaton.first_match("ushe") == 1
+    assert automaton.first_match("the") == 2
+    assert automaton.first_match("xyz") is None
+    assert automaton.contains_any("aaahe")
+    assert not AhoCorasick([]).contains_any("anything")
+
+
+def _matcher(*rules, interests=()):
+    pref = UserPreference(user_email="u@x.com", interests=json.dumps(list(interests)))
+    return PriorityMatcher.compile(pref, [
+        SenderRule(id=i, sender_email=pattern, force_priority=force, auto_reply=auto)
+        for i, (pattern, force, auto) in enumerate(rules)
+    ])
+
+
+def test_addresses_domains_and_substrings_resolve_in_rule_order():
+    matcher = _matcher(
+        ("@corp.com", "Low", False),
+        ("boss@corp.com", "High", False),
+        ("billing", "Medium", True),
+        ("Alerts@Bank.com", "High", False),
+    )
+    assert matcher.resolve_priority("The Boss <boss@corp.com>", "Hi", "", "Medium") == "Low"
+    assert matcher.resolve_priority("alerts@bank.com", "Hi", "", "Low") == "High"
+    # Addresses and domains match exactly, not as substrings
+    assert matcher.resolve_priority("noalerts@bank.com.evil", "Hi", "", "Low") == "Low"
+    assert matcher.resolve_priority("a@sub.corp.com", "Hi", "", "Low") == "Low"
+    assert matcher.resolve_priority("Billing Team <team@shop.com>", "Hi", "", "Low") == "Medium"
+    assert matcher.auto_reply_rule("billing@shop.com").sender_email == "billing"
+    assert matcher.auto_reply_rule("boss@corp.com") is None
+
+
+def test_interests_boost_once():
+    matcher = _matcher(interests=["Python", "", "Startup"])
+    assert matcher.resolve_priority("a@b.com", "PYTHON and startup news", None, "Low") == "Medium"
+    assert matcher.resolve_priority("a@b.com", "Hi", "a startup idea", "Medium") == "High"
+    assert matcher.resolve_priority("a@b.com", "Hi", "lunch", "Medium") == "Medium"
+
+
+def test_matchers_are_cached_until_invalidated(db_session):
+    db_session.add(SenderRule(user_email="u@x.com", sender_email="boss@corp.com", force_priority="High"))
+    db_session.commit()
+    priority_service.invalidate("u@x.com")
+    matcher = priority_service.get_matcher(db_session, "u@x.com")
+    assert priority_service.get_matcher(db_session, "u@x.com") is matcher
+    assert matcher.resolve_priority("boss@corp.com", "Hi", "", "Low") == "High"
+
+    db_session.query(SenderRule).delete()
+    db_session.commit()
+    priority_service.invalidate("u@x.com")
+    assert priority_service.get_matcher(db_session, "u@x.com").resolve_priority("boss@corp.com", "Hi", "", "Low") == "Low"
+
+
+def _seed(db, *rows):
+    for email_id, sender, subject, ai_priority, priority in rows:
+        db.add(Email(email_id=email_id, user_email="u@x.com", sender=sender, subject=subject,
+                     ai_priority=ai_priority, priority=priority))
+    db.commit()
+
+
+def _priorities(db):
+    return {e.email_id: e.priority for e in db.query(Email)}
+
+
+def test_forced_rule_is_applied_to_existing_mail_in_one_update(db_session):
+    _seed(db_session,
+          ("m1", "News <a@news.com>", "Hi", "Medium", "Medium"),
+          ("m2", "a@news.com", "Hi", "Medium", "Medium"),
+          ("m3", "VIP <vip@news.com>", "Hi", "Medium", "High"),
+          ("m4", "a@newsXcom.org", "Hi", "Medium", "Medium"),
+          ("m5", "a@sub.news.com", "Hi", "Medium", "Medium"),
+          ("m6", "a@news.com", "Synced before ai_priority", None, "High"))
+    db_session.add(SenderRule(id=1, user_email="u@x.com", sender_email="vip@news.com", force_priority="High"))
+    db_session.commit()
+    rule = priority_service.Rule(2, "@news.com", "Low", False)
+
+    assert priority_service.force_rule_priority(db_session, "u@x.com", rule) == {"m1": "Low", "m2": "Low", "m6": "Low"}
+    db_session.commit()
+    assert _priorities(db_session) == {
+        "m1": "Low", "m2": "Low", "m3": "High", "m4": "Medium", "m5": "Medium", "m6": "Low",
+    }
+
+
+def test_rescore_uses_stored_ai_priority(db_session, monkeypatch, inline_writer):
+    inline_writer(priority_service)
+    monkeypatch.setattr(settings, "REPRIORITIZE_BATCH_SIZE", 2)
+    published = []
+    monkeypatch.setattr(priority_service.events, "publish",
+                        lambda user, event_type, **data: published.append((event_type, data["emails"])))
+    _seed(db_session,
+          ("m1", "a@b.com", "Python news", "Low", "Low"),
+          ("m2", "a@b.com", "Lunch", "Low", "Medium"),
+          ("m3", "a@b.com", "Python again", "Medium", "Medium"),
+          ("m4", "a@b.com", "Python", None, "Medium"))
+
+    assert priority_service.rescore("u@x.com", _matcher(interests=["python"])) == 3
+    assert _priorities(db_session) == {"m1": "Medium", "m2": "Low", "m3": "High", "m4": "Medium"}
+    # One event per batch that changed something
+    assert published == [
+        ("emails.priority", [{"email_id": "m1", "priority": "Medium"}, {"email_id": "m2", "priority": "Low"}]),
+        ("emails.priority", [{"email_id": "m3", "priority": "High"}]),
+    ]
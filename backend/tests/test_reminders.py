@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import EmailTask
+from app.services import reminders
+from app.services.reminders import ReminderDispatcher
+from app.utils.deadline_parser import utc_now
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+def test_heap_orders_reschedules_and_cancels():
+    dispatcher = ReminderDispatcher()
+    dispatcher.schedule(1, NOW + timedelta(minutes=5))
+    dispatcher.schedule(2, NOW + timedelta(minutes=1))
+    dispatcher.schedule(3, NOW + timedelta(minutes=3))
+    dispatcher.schedule(2, NOW + timedelta(minutes=10))  # rescheduled later
+    dispatcher.cancel(3)
+
+    assert dispatcher.next_due() == NOW + timedelta(minutes=5)
+    assert dispatcher.pop_due(NOW + timedelta(minutes=6)) == [1]
+    assert dispatcher.pop_due(NOW + timedelta(minutes=6)) == []
+    assert dispatcher.pop_due(NOW + timedelta(minutes=10)) == [2]
+    assert len(dispatcher) == 0 and dispatcher.next_due() is None
+
+
+def test_load_and_claim_reminders_once(db_session):
+    db_session.add_all([
+        EmailTask(id=1, user_email="u@x.com", task_text="due", reminder_time=NOW - timedelta(seconds=1), reminder_sent=False, completed=False),
+        EmailTask(id=2, user_email="u@x.com", task_text="later", reminder_time=NOW + timedelta(hours=1), reminder_sent=False, completed=False),
+        EmailTask(id=3, user_email="u@x.com", task_text="done", reminder_time=NOW, reminder_sent=False, completed=True),
+        EmailTask(id=4, user_email="u@x.com", task_text="sent", reminder_time=NOW, reminder_sent=True, completed=False),
+    ])
+    db_session.commit()
+
+    dispatcher = ReminderDispatcher()
+    assert dispatcher.load(db_session, before=NOW + timedelta(minutes=1)) == 1
+    assert dispatcher.load(db_session) == 2
+    assert dispatcher.pop_due(NOW) == [1]
+
+    # Only the first claim wins (e.g. two workers with the same heap)
+    claimed = reminders.claim_reminders(db_session, [1, 2], NOW)
+    db_session.commit()
+    assert [t["id"] for t in claimed] == [1]
+    assert reminders.claim_reminders(db_session, [1], NOW) == []
+    db_session.commit()
+    assert db_session.get(EmailTask, 1).reminder_sent
+
+
+def test_dispatcher_wakes_when_reminder_is_due(monkeypatch):
+    fired = []
+    done = threading.Event()
+    dispatcher = ReminderDispatcher(resync_seconds=3600)
+    monkeypatch.setattr(dispatcher, "_resync", lambda before=None: None)
+
+    def fire(task_ids, now):
+        fired.extend(task_ids)
+        done.set()
+
+    monkeypatch.setattr(dispatcher, "fire", fire)
+    dispatcher.start()
+    try:
+        # Scheduled after the thread is already sleeping: schedule() wakes it
+        dispatcher.schedule(7, utc_now() + timedelta(milliseconds=200))
+        assert done.wait(5)
+        assert fired == [7]
+    finally:
+        dispatcher.stop()
+
+
+def test_reminder_set_on_another_worker_is_polled(db_session, monkeypatch):
+    fired, loads = [], []
+    done = threading.Event()
+    monkeypatch.setattr(reminders, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    dispatcher = ReminderDispatcher(resync_seconds=3600, poll_seconds=0.1)
+    load = dispatcher.load
+    monkeypatch.setattr(dispatcher, "load", lambda db, before=None: loads.append(before) or load(db, before))
+
+    def fire(task_ids, now):
+        fired.extend(task_ids)
+        done.set()
+
+    monkeypatch.setattr(dispatcher, "fire", fire)
+    dispatcher.start()
+    try:
+        while not loads:  # the startup resync found nothing
+            time.sleep(0.01)
+        # Written by another process: nothing calls schedule() here
+        db_session.add(EmailTask(id=9, user_email="u@x.com", task_text="elsewhere", reminder_sent=False,
+                                 completed=False, reminder_time=utc_now() + timedelta(milliseconds=300)))
+        db_session.commit()
+        assert done.wait(5)
+        assert fired == [9]
+        assert loads[-1] is not None  # picked up by the short poll, not a full resync
+    finally:
+        dispatcher.stop()
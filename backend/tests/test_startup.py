@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+# Cold import of app.main, measured in a fresh interpreter
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "2.0"))
+
+HEAVY_MODULES = [
+    "sklearn",
+    "scipy",
+    "openai",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "bs4",
+    "apscheduler",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _import_app(tmp_path):
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_CLIENT_ID", "test")
+    env.setdefault("GOOGLE_CLIENT_SECRET", "test")
+    env.setdefault("GOOGLE_REDIRECT_URI", "http://localhost/callback")
+    env.setdefault("TOKEN_ENCRYPTION_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+    env["DATABASE_URL"] = f"sqlite:///{tmp_path}/startup.db"
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_is_fast_and_side_effect_free(tmp_path):
+    probe = _import_app(tmp_path)
+
+    assert probe["loaded"] == [], f"heavy modules imported at startup: {probe['loaded']}"
+    # Schema setup belongs to the lifespan hook, not to import
+    assert not (tmp_path / "startup.db").exists()
+    assert probe["elapsed"] < IMPORT_BUDGET_SECONDS, (
+        f"importing app.main took {probe['elapsed']:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    )
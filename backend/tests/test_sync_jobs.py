@@ -0,0 +1,99 @@
+import threading
+from contextlib import nullcontext
+
+import pytest
+
+from app.services import gmail_service, leases, sync_schedule, sync_service
+from app.services.sync_jobs import SyncJobManager, SUCCEEDED, FAILED, SKIPPED
+
+
+@pytest.fixture(autouse=True)
+def free_leases(monkeypatch):
+    """No other workers: every per-user sync lease is ours (see test_leases.py)."""
+    held = set()
+    monkeypatch.setattr(leases, "lease", lambda name, ttl_seconds, keep_alive=False: nullcontext(name not in held))
+    monkeypatch.setattr(sync_schedule, "record_sync", lambda user_email, new_emails: None)
+    return held
+
+
+def test_submissions_for_same_user_coalesce(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def fake_sync(db, user_email, service, progress=None):
+        calls.append(user_email)
+        progress(listed=2, fetched=2, enriched=2)
+        release.wait(5)
+        progress(prioritized=2)
+        return {"new_emails_count": 2, "failed_count": 0, "overall_summary": None, "emails": []}
+
+    monkeypatch.setattr(gmail_service, "authenticate_gmail", lambda user_email: object())
+    monkeypatch.setattr(sync_service, "sync_user_emails", fake_sync)
+
+    manager = SyncJobManager(max_workers=2)
+    try:
+        first = manager.submit("a@example.com")
+        second = manager.submit("a@example.com")
+        other = manager.submit("b@example.com")
+        assert first is second
+        assert other is not first
+
+        release.set()
+        assert first.wait(5) and other.wait(5)
+        assert first.status == SUCCEEDED
+        assert first.progress["prioritized"] == 2 and first.result["new_emails_count"] == 2
+        assert sorted(calls) == ["a@example.com", "b@example.com"]
+
+        # Finished jobs no longer absorb new submissions
+        assert manager.submit("a@example.com") is not first
+    finally:
+        release.set()
+        manager.shutdown(wait=True)
+
+
+def test_failed_authentication_marks_job_failed(monkeypatch):
+    monkeypatch.setattr(gmail_service, "authenticate_gmail", lambda user_email: None)
+    manager = SyncJobManager(max_workers=1)
+    try:
+        job = manager.submit("a@example.com")
+        assert job.wait(5)
+        assert job.status == FAILED and "re-login" in job.error
+        assert manager.get(job.id) is job
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_shutdown_fails_jobs_that_never_started(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def fake_sync(db, user_email, service, progress=None):
+        started.set()
+        release.wait(5)
+        return {"new_emails_count": 0, "failed_count": 0, "overall_summary": None, "emails": []}
+
+    monkeypatch.setattr(gmail_service, "authenticate_gmail", lambda user_email: object())
+    monkeypatch.setattr(sync_service, "sync_user_emails", fake_sync)
+
+    manager = SyncJobManager(max_workers=1)
+    running = manager.submit("a@example.com")
+    queued = manager.submit("b@example.com")
+    assert started.wait(5)
+    manager.shutdown(wait=False)
+
+    assert queued.wait(1)
+    assert queued.status == FAILED and "shut down" in queued.error
+    assert manager.active_job("b@example.com") is None
+    release.set()
+    assert running.wait(5) and running.status == SUCCEEDED
+
+
+def test_sync_held_by_another_worker_is_skipped(monkeypatch, free_leases):
+    free_leases.add("sync:a@example.com")
+    monkeypatch.setattr(gmail_service, "authenticate_gmail", lambda user_email: pytest.fail("should not sync"))
+    manager = SyncJobManager(max_workers=1)
+    try:
+        job = manager.submit("a@example.com")
+        assert job.wait(5)
+        assert job.status == SKIPPED
+    finally:
+        manager.shutdown(wait=True)
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.database.models import Email, OutboundEmail, SenderRule, SyncState
+from app.services import sync_service
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-sync (not caught by the pipeline)."""
+
+
+@pytest.fixture
+def pipeline(db_session, monkeypatch, inline_writer):
+    calls = {"fetched": [], "summarized": [], "analyzed": 0}
+    crash = {"stage": None, "after": None}
+
+    def get_email_details(service, msg_id):
+        if crash["stage"] == "fetch" and len(calls["fetched"]) == crash["after"]:
+            raise Crash()
+        calls["fetched"].append(msg_id)
+        return (f"Sender <{msg_id}@example.com>", f"Subject {msg_id}", "", f"Body {msg_id}",
+                None, [], datetime(2026, 1, 1), False)
+
+    def summarize_email(subject, body):
+        if crash["stage"] == "enrich" and len(calls["summarized"]) == crash["after"]:
+            raise Crash()
+        calls["summarized"].append(subject)
+        return f"Summary of {subject}"
+
+    def analyze_emails_with_ai(emails):
+        calls["analyzed"] += 1
+        return {"overall_summary": "Overview", "priorities": [{"subject": e["subject"], "priority": "High"} for e in emails]}
+
+    inline_writer(sync_service)
+    monkeypatch.setattr(settings, "SYNC_CHECKPOINT_EVERY", 2)
+    monkeypatch.setattr(sync_service, "get_last_24h_emails", lambda service: [{"id": f"m{i}"} for i in range(4)])
+    monkeypatch.setattr(sync_service, "get_email_details", get_email_details)
+    monkeypatch.setattr(sync_service, "summarize_email", summarize_email)
+    monkeypatch.setattr(sync_service, "smart_categorize_email", lambda *args: "Work")
+    monkeypatch.setattr(sync_service, "analyze_emails_with_ai", analyze_emails_with_ai)
+    monkeypatch.setattr(sync_service.events, "publish", lambda *args, **kwargs: None)
+    monkeypatch.setattr(sync_service.mail_sender, "wake", lambda: None)
+
+    def generate_smart_replies(emails, tone, max_workers=4):
+        if crash["stage"] == "auto_reply":
+            raise Crash()
+        return [{"subject": f"Re: {e['subject']}", "body": "Thanks"} for e in emails]
+
+    monkeypatch.setattr(sync_service, "generate_smart_replies", generate_smart_replies)
+
+    def sync(crash_stage=None, crash_after=None):
+        crash.update(stage=crash_stage, after=crash_after)
+        return sync_service.sync_user_emails(db_session, "test@example.com", service=object())
+
+    return sync, calls, db_session
+
+
+def test_interrupted_sync_resumes_without_repeating_work(pipeline):
+    sync, calls, db = pipeline
+
+    with pytest.raises(Crash):
+        sync(crash_stage="fetch", crash_after=2)
+    assert db.get(SyncState, "test@example.com").stage == "listed"
+    assert {e.sync_stage for e in db.query(Email)} == {"fetched"}
+
+    calls["fetched"].clear()
+    with pytest.raises(Crash):
+        sync(crash_stage="enrich", crash_after=2)
+    assert calls["fetched"] == ["m2", "m3"]  # only what the first run had not stored
+    assert sorted(e.email_id for e in db.query(Email).filter(Email.sync_stage == "enriched")) == ["m0", "m1"]
+
+    calls["fetched"].clear()
+    calls["summarized"].clear()
+    result = sync()
+
+    assert result["new_emails_count"] == 4
+    assert calls["fetched"] == []
+    assert calls["summarized"] == ["Subject m2", "Subject m3"]
+    assert calls["analyzed"] == 1
+    db.expire_all()
+    assert {(e.sync_stage, e.priority) for e in db.query(Email)} == {("prioritized", "High")}
+    assert db.get(SyncState, "test@example.com").stage == "idle"
+
+
+def test_auto_reply_marked_with_the_priorities_survives_a_crash(pipeline):
+    sync, calls, db = pipeline
+    db.add(SenderRule(user_email="test@example.com", sender_email="m1@example.com", auto_reply=True))
+    db.commit()
+    sync_service.priority_service.invalidate("test@example.com")
+
+    with pytest.raises(Crash):
+        sync(crash_stage="auto_reply")
+    db.expire_all()
+    assert {e.email_id: e.auto_reply_state for e in db.query(Email)} == {
+        "m0": None, "m1": "pending", "m2": None, "m3": None,
+    }
+
+    # The next sync has nothing new but still drains it
+    sync()
+    db.expire_all()
+    assert db.get(Email, "m1").auto_reply_state == "queued"
+    assert [row.email_id for row in db.query(OutboundEmail)] == ["m1"]
+
+
+def test_messages_past_the_cap_are_synced_by_the_next_run(pipeline, monkeypatch):
+    sync, calls, db = pipeline
+    monkeypatch.setattr(sync_service, "get_last_24h_emails", lambda service: [{"id": f"n{i:02}"} for i in range(60)])
+
+    assert sync()["new_emails_count"] == sync_service.MAX_MESSAGES_PER_SYNC
+    assert sync()["new_emails_count"] == 60 - sync_service.MAX_MESSAGES_PER_SYNC
+    assert db.query(Email).count() == 60
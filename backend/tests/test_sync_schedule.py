@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.database.models import SyncSchedule, User
+from app.services import sync_schedule
+
+NOW = datetime(2026, 3, 2, 12, 0)
+MINUTE = 60
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(sync_schedule, "jittered", lambda seconds: seconds)
+
+
+def test_interval_follows_arrival_rate_and_activity():
+    busy = sync_schedule.compute_interval(60.0, None, NOW)
+    quiet = sync_schedule.compute_interval(0.5, None, NOW)
+    assert busy == settings.SYNC_MIN_INTERVAL_MINUTES * MINUTE
+    assert busy < quiet <= settings.SYNC_MAX_INTERVAL_MINUTES * MINUTE
+    assert sync_schedule.compute_interval(0.0, None, NOW) == settings.SYNC_MAX_INTERVAL_MINUTES * MINUTE
+
+    # Active users are synced at least every SYNC_ACTIVE_INTERVAL_MINUTES
+    active = sync_schedule.compute_interval(0.5, NOW - timedelta(minutes=5), NOW)
+    assert active == settings.SYNC_ACTIVE_INTERVAL_MINUTES * MINUTE
+    # Long-idle users drop to the slowest cadence however busy their inbox
+    idle = sync_schedule.compute_interval(60.0, NOW - timedelta(days=30), NOW)
+    assert idle == settings.SYNC_MAX_INTERVAL_MINUTES * MINUTE
+
+
+def test_jitter_stays_within_bounds():
+    spread = settings.SYNC_JITTER_FRACTION
+    values = [sync_schedule.jittered(1000) for _ in range(200)]
+    assert all(1000 * (1 - spread) <= v <= 1000 * (1 + spread) for v in values)
+    assert len(set(values)) > 1
+
+
+def test_due_users_are_claimed_oldest_first_within_budget(db_session, no_jitter):
+    db_session.add_all([User(email=f"u{i}@x.com") for i in range(3)])
+    db_session.commit()
+
+    assert sync_schedule.add_new_users(db_session, NOW) == 3
+    assert sync_schedule.add_new_users(db_session, NOW) == 0
+    db_session.get(SyncSchedule, "u2@x.com").next_run_at = NOW - timedelta(hours=1)
+    db_session.get(SyncSchedule, "u1@x.com").next_run_at = NOW + timedelta(hours=1)
+    db_session.commit()
+
+    assert sync_schedule.claim_due(db_session, NOW, limit=1) == ["u2@x.com"]
+    assert sync_schedule.claim_due(db_session, NOW, limit=10) == ["u0@x.com"]
+    assert sync_schedule.claim_due(db_session, NOW, limit=10) == []
+    db_session.commit()
+
+
+def test_sync_outcomes_and_activity_set_next_run(db_session, no_jitter):
+    # First sync: 48 emails over the last 24h -> 2/h, smoothed
+    sync_schedule._record_sync(db_session, "u@x.com", 48, NOW)
+    db_session.commit()
+    row = db_session.get(SyncSchedule, "u@x.com")
+    assert row.arrival_rate == pytest.approx(settings.SYNC_RATE_SMOOTHING * 2)
+    assert row.last_synced_at == NOW
+    assert row.next_run_at == NOW + timedelta(seconds=row.interval_seconds)
+
+    # A quiet stretch lengthens the interval
+    later = NOW + timedelta(hours=2)
+    sync_schedule._record_sync(db_session, "u@x.com", 0, later)
+    db_session.commit()
+    db_session.refresh(row)
+    slower = row.interval_seconds
+    assert slower > 0 and row.arrival_rate < settings.SYNC_RATE_SMOOTHING * 2
+
+    # Failure keeps the rate and last sync time
+    sync_schedule._record_sync(db_session, "u@x.com", None, later + timedelta(minutes=1))
+    db_session.commit()
+    db_session.refresh(row)
+    assert row.last_synced_at == later
+
+    # Opening the app pulls the next run forward
+    active_at = later + timedelta(minutes=2)
+    sync_schedule._record_activity(db_session, "u@x.com", active_at)
+    db_session.commit()
+    db_session.refresh(row)
+    assert row.last_active_at == active_at
+    assert row.next_run_at == active_at + timedelta(minutes=settings.SYNC_ACTIVE_INTERVAL_MINUTES)
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from app.database.models import Email, EmailTask
+from app.schemas.task import EmailTaskResponse
+from app.services import agenda
+
+USER = "u@x.com"
+# A Wednesday
+NOW = datetime(2026, 3, 4, 12, 0, tzinfo=timezone.utc)
+
+
+def _add(db, text, deadline=None, completed=False, user=USER):
+    db.add(EmailTask(email_id="m1", user_email=user, task_text=text, deadline=deadline, completed=completed))
+
+
+def _seed(db):
+    db.add(Email(email_id="m1", user_email=USER, subject="Plans"))
+    db.flush()
+    _add(db, "late", datetime(2026, 3, 1, 9, 0))
+    _add(db, "this morning", datetime(2026, 3, 4, 9, 0))
+    _add(db, "tonight", datetime(2026, 3, 4, 20, 0))
+    _add(db, "friday", datetime(2026, 3, 6, 17, 0))
+    _add(db, "sunday", datetime(2026, 3, 8, 23, 0))
+    _add(db, "next monday", datetime(2026, 3, 9, 0, 0))
+    _add(db, "someday")
+    _add(db, "whenever")
+    _add(db, "done", datetime(2026, 3, 5, 9, 0), completed=True)
+    _add(db, "not mine", datetime(2026, 3, 5, 9, 0), user="v@x.com")
+    db.commit()
+
+
+def test_bounds_follow_the_users_timezone():
+    bounds = agenda.Bounds(NOW, ZoneInfo("Asia/Kolkata"))
+    assert bounds.now == datetime(2026, 3, 4, 12, 0)
+    # Local midnight in UTC+5:30
+    assert bounds.tomorrow == datetime(2026, 3, 4, 18, 30)
+    assert bounds.next_week == datetime(2026, 3, 8, 18, 30)
+
+
+def test_counts_bucket_open_tasks_in_sql(db_session):
+    _seed(db_session)
+    bounds = agenda.Bounds(NOW, timezone.utc)
+
+    assert agenda.bucket_counts(db_session, USER, bounds) == {
+        "overdue": 2, "today": 1, "week": 2, "later": 1, "no_deadline": 2,
+    }
+    assert agenda.bucket_counts(db_session, USER, bounds, completed=True)["week"] == 1
+
+
+def test_pages_walk_dated_then_undated_tasks(db_session):
+    _seed(db_session)
+    bounds = agenda.Bounds(NOW, timezone.utc)
+
+    seen, after = [], None
+    while True:
+        rows, has_more = agenda.agenda_page(db_session, USER, bounds, 3, after=after)
+        seen += [(task.task_text, bucket) for task, bucket in rows]
+        if not has_more:
+            break
+        after = (rows[-1][0].deadline, rows[-1][0].id)
+
+    assert seen == [
+        ("late", "overdue"), ("this morning", "overdue"), ("tonight", "today"),
+        ("friday", "week"), ("sunday", "week"), ("next monday", "later"),
+        ("someday", "no_deadline"), ("whenever", "no_deadline"),
+    ]
+
+
+def test_bucket_filter_limits_the_range(db_session):
+    _seed(db_session)
+    bounds = agenda.Bounds(NOW, timezone.utc)
+
+    rows, has_more = agenda.agenda_page(db_session, USER, bounds, 10, bucket="week")
+    assert [task.task_text for task, _ in rows] == ["friday", "sunday"]
+    assert not has_more
+
+    rows, _ = agenda.agenda_page(db_session, USER, bounds, 1, bucket="no_deadline")
+    after = (None, rows[0][0].id)
+    rows, has_more = agenda.agenda_page(db_session, USER, bounds, 1, bucket="no_deadline", after=after)
+    assert [task.task_text for task, _ in rows] == ["whenever"]
+    assert not has_more
+
+
+def test_task_times_are_sent_with_their_utc_offset(db_session):
+    _seed(db_session)
+    task = db_session.query(EmailTask).filter(EmailTask.task_text == "friday").one()
+    task.reminder_time = datetime(2026, 3, 6, 9, 0)
+    body = EmailTaskResponse.model_validate(task).model_dump(mode="json")
+    assert datetime.fromisoformat(body["deadline"]) == datetime(2026, 3, 6, 17, 0, tzinfo=timezone.utc)
+    assert datetime.fromisoformat(body["reminder_time"]) == datetime(2026, 3, 6, 9, 0, tzinfo=timezone.utc)
@@ -0,0 +1,32 @@
+from app.services.task_extractor import should_extract_tasks, task_signal_score, task_signal_scores
+
+SAMPLES = [
+    ("Quarterly report", "Please submit the report by Friday.", "Work", "Low", True),
+    ("Invoice", "Payment is due 03/15, kindly pay before EOD.", "Bank/Finance", "Medium", True),
+    ("Call?", "Can you call me back?", "Work", "High", True),
+    ("Big sale", "Submit your order by Friday and save 50%!", "Promotions", "High", False),
+    ("Weekly digest", "Posted by Anna, shared by Bob, written by Carl.", "Work", "Medium", False),
+    ("Hello", "Just checking in.", "Work", "High", False),
+    ("Lunch", "Lunch is at 12:30 today.", "Personal", "Low", False),
+]
+
+
+def test_bare_by_and_priority_alone_do_not_pass():
+    for subject, body, category, priority, expected in SAMPLES:
+        assert should_extract_tasks(subject, body, category, priority) is expected, subject
+
+
+def test_threshold_is_tunable():
+    assert task_signal_score("Lunch", "Lunch is at 12:30 today.") == 1.5
+    assert should_extract_tasks("Lunch", "Lunch is at 12:30 today.", threshold=1.5)
+
+
+def test_batch_scores_match_single_scores():
+    emails = [
+        {"subject": subject, "body": body, "category": category, "priority": priority}
+        for subject, body, category, priority, _ in SAMPLES
+    ] * 500
+    emails.append({"subject": None, "body": None})
+    expected = [task_signal_score(e["subject"], e["body"], e.get("category"), e.get("priority")) for e in emails]
+    assert task_signal_scores(emails) == expected
+    assert task_signal_scores([]) == []
@@ -0,0 +1,121 @@
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.database.models import Email, EmailTask, UserPreference
+from app.services import task_extractor, task_queue
+from app.services.task_queue import DONE, FAILED, QUEUED, SKIPPED
+
+USER = "u@x.com"
+
+
+@pytest.fixture
+def queue(db_session, monkeypatch, inline_writer):
+    calls = []
+
+    def extract_tasks_batch(emails):
+        calls.append([e["subject"] for e in emails])
+        if any("down" in e["subject"] for e in emails):
+            return None
+        return [
+            None if "lost" in e["subject"] else
+            {"has_tasks": "report" in e["body"], "tasks": [{"task_text": "Send the report", "deadline": "2026-03-06 17:00"}]}
+            for e in emails
+        ]
+
+    inline_writer(task_queue)
+    monkeypatch.setattr(task_queue, "extract_tasks_batch", extract_tasks_batch)
+    return db_session, calls
+
+
+def _add(db, email_id, subject, body, status=QUEUED):
+    email = Email(email_id=email_id, user_email=USER, subject=subject, task_extraction=status)
+    email.body = body
+    db.add(email)
+
+
+def test_prefilter_queues_only_likely_task_emails():
+    statuses = task_queue.prefilter([
+        {"email_id": "m1", "subject": "Report", "category": "Work", "priority": "High"},
+        {"email_id": "m2", "subject": "Sale", "category": "Promotions", "priority": "High"},
+        {"email_id": "m3", "subject": "Hello", "category": "Work", "priority": "Low"},
+    ], {"m1": "Please send the report", "m3": "Just saying hi"})
+    assert statuses == {"m1": QUEUED, "m2": SKIPPED, "m3": SKIPPED}
+
+
+def test_queued_emails_are_extracted_in_one_batched_call(queue):
+    db, calls = queue
+    _add(db, "m1", "Q1", "please send the report")
+    _add(db, "m2", "Q2", "nothing to do")
+    _add(db, "m3", "Q3 lost", "send the report")
+    _add(db, "m4", "Old", "send the report", status=SKIPPED)
+    db.add(UserPreference(user_email=USER, timezone="Europe/Berlin"))
+    db.commit()
+
+    assert task_queue.extract_pending(db, limit=10) == 3
+    assert calls == [["Q1", "Q2", "Q3 lost"]]
+    statuses = {e.email_id: (e.task_extraction, e.task_extraction_attempts) for e in db.query(Email)}
+    assert statuses == {"m1": (DONE, 0), "m2": (DONE, 0), "m3": (QUEUED, 1), "m4": (SKIPPED, 0)}
+    tasks = db.query(EmailTask).all()
+    assert [(t.email_id, t.task_text) for t in tasks] == [("m1", "Send the report")]
+    assert tasks[0].deadline.hour == 16  # 17:00 in Berlin, stored as UTC
+
+    # Nothing due until m3's backoff passes; saving again (e.g. on demand) adds nothing
+    assert task_queue.extract_pending(db, limit=10) == 0
+    assert task_queue.save_tasks(db, "m1", USER, {"has_tasks": True, "tasks": [{"task_text": "again"}]}) is None
+
+
+def test_failed_batch_call_is_retried_with_backoff(queue, monkeypatch):
+    db, calls = queue
+    monkeypatch.setattr(settings, "TASK_EXTRACTION_MAX_ATTEMPTS", 3)
+    _add(db, "m1", "Service down", "send the report")
+    db.commit()
+
+    before = datetime.now()
+    assert task_queue.extract_pending(db, limit=10) == 0
+    email = db.query(Email).one()
+    assert (email.task_extraction, email.task_extraction_attempts) == (QUEUED, 1)
+    assert email.task_extraction_next_attempt_at >= before + timedelta(seconds=task_queue.backoff_seconds(1))
+    # Not due yet
+    assert task_queue.next_batch(db, 10) == []
+    assert len(task_queue.next_batch(db, 10, now=email.task_extraction_next_attempt_at)) == 1
+
+    for attempts in (2, 3):
+        db.query(Email).update({Email.task_extraction_next_attempt_at: None})
+        db.commit()
+        task_queue.extract_pending(db, limit=10)
+        db.expire_all()
+        assert db.query(Email).one().task_extraction_attempts == attempts
+    assert db.query(Email).one().task_extraction == FAILED
+    assert db.query(EmailTask).count() == 0
+
+
+def test_worker_stops_when_the_model_call_fails(queue, monkeypatch):
+    db, calls = queue
+    for i in range(3):
+        _add(db, f"m{i}", f"Service down {i}", "send the report")
+    db.commit()
+    worker = task_queue.TaskExtractionWorker(batch_size=1)
+    monkeypatch.setattr(task_queue, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(task_queue.leases, "lease", lambda *args, **kwargs: nullcontext(True))
+
+    assert worker.run_once() == 0
+    assert calls == [["Service down 0"]]
+
+
+def test_malformed_task_items_from_the_model_are_dropped(monkeypatch):
+    response = """{"results": [
+        {"email": 0, "has_tasks": true, "tasks": ["Send it", {"task_text": 5}, {"task_text": "Pay", "deadline": 7},
+                                                  {"task_text": "Sign", "deadline": "Friday"}]},
+        "junk",
+        {"email": 1, "has_tasks": true, "tasks": "none"}
+    ]}"""
+    monkeypatch.setattr(task_extractor, "safe_chat_completion", lambda **kwargs: response)
+
+    assert task_extractor.extract_tasks_batch([{"subject": "A"}, {"subject": "B"}]) == [
+        {"has_tasks": True, "tasks": [{"task_text": "Pay", "deadline": None}, {"task_text": "Sign", "deadline": "Friday"}]},
+        {"has_tasks": True, "tasks": []},
+    ]
@@ -0,0 +1,26 @@
+import time
+
+from app.utils.ttl_cache import TTLCache
+
+
+def test_lru_eviction_and_pop():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.pop("a") == 1
+    assert cache.get("a") is None
+
+
+def test_entries_expire():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", "x", expires_at=time.monotonic() - 1)
+    cache.set("long", "y")
+
+    assert cache.get("short") is None
+    assert cache.get("long") == "y"
+    assert len(cache) == 1
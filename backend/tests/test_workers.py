@@ -0,0 +1,26 @@
+import threading
+
+from app.services.workers import PollingWorker
+
+
+class Worker(PollingWorker):
+    def __init__(self):
+        super().__init__(poll_seconds=3600)
+        self.passes = 0
+        self.second_pass = threading.Event()
+
+    def run_once(self):
+        self.passes += 1
+        if self.passes == 1:
+            self.wake()  # e.g. new work queued while this pass was running
+        else:
+            self.second_pass.set()
+
+
+def test_wake_during_a_pass_is_not_lost():
+    worker = Worker()
+    worker.start()
+    try:
+        assert worker.second_pass.wait(5)
+    finally:
+        worker.stop()
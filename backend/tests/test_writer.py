@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Feedback
+from app.database.writer import DatabaseWriter
+
+
+@pytest.fixture
+def writer(db_session):
+    sessions = []
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False, expire_on_commit=False)
+
+    def session_factory():
+        session = factory()
+        sessions.append(session)
+        return session
+
+    instance = DatabaseWriter(session_factory=session_factory, max_batch=64, max_wait=0.05)
+    instance.sessions = sessions
+    yield instance
+    instance.stop()
+
+
+def _hold(writer):
+    """Occupy the writer thread until the returned event is set."""
+    release, started = threading.Event(), threading.Event()
+
+    def blocker(s):
+        started.set()
+        release.wait(5)
+
+    future = writer.submit(blocker, exclusive=True)
+    assert started.wait(5)
+    return release, future
+
+
+def _add(email_id):
+    def job(s):
+        s.add(Feedback(email_id=email_id, priority="High", is_correct=True))
+        s.flush()
+        return id(s)
+    return job
+
+
+def _saved(db_session):
+    db_session.rollback()
+    return sorted(f.email_id for f in db_session.query(Feedback))
+
+
+def test_concurrent_jobs_share_one_commit(writer, db_session):
+    release, blocker = _hold(writer)
+    futures = []
+    threads = [threading.Thread(target=lambda i=i: futures.append(writer.submit(_add(f"m{i}")))) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    sessions = {future.result(5) for future in futures}
+    blocker.result(5)
+    assert len(sessions) == 1
+    assert len(writer.sessions) == 2  # the blocker's and the group's
+    assert _saved(db_session) == sorted(f"m{i}" for i in range(16))
+
+
+def test_failing_job_is_rolled_back_alone(writer, db_session):
+    def fails(s):
+        s.add(Feedback(email_id="bad", priority="High", is_correct=True))
+        s.flush()
+        raise ValueError("boom")
+
+    release, _ = _hold(writer)
+    first, bad, last = writer.submit(_add("a")), writer.submit(fails), writer.submit(_add("b"))
+    release.set()
+
+    assert first.result(5) == last.result(5)
+    with pytest.raises(ValueError):
+        bad.result(5)
+    assert _saved(db_session) == ["a", "b"]
+
+
+def test_exclusive_job_runs_in_its_own_transaction(writer, db_session):
+    release, _ = _hold(writer)
+    before = writer.submit(_add("before"))
+    exclusive = writer.submit(_add("exclusive"), exclusive=True)
+    after = writer.submit(_add("after"))
+    release.set()
+
+    sessions = [before.result(5), exclusive.result(5), after.result(5)]
+    assert len(set(sessions)) == 3
+    assert _saved(db_session) == ["after", "before", "exclusive"]
+
+
+def test_run_times_out_while_the_writer_is_busy(writer, db_session):
+    release, _ = _hold(writer)
+    try:
+        with pytest.raises(FutureTimeout):
+            writer.run(_add("late"), timeout=0.05)
+    finally:
+        release.set()
+    # The job was already queued, so it still commits afterwards
+    writer.run(lambda s: None, timeout=5)
+    assert _saved(db_session) == ["late"]
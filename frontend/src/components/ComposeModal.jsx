@@ -13,6 +13,8 @@ const ComposeModal = ({ onClose, initialData }) => {
     const [subject, setSubject] = useState(initialData?.subject || '');
     const [body, setBody] = useState(initialData?.body || '');
     const [sending, setSending] = useState(false);
+    // One key per compose window: retrying a failed request never queues a second copy
+    const [idempotencyKey] = useState(() => crypto.randomUUID());
 
     const handleSend = async () => {
         if (!to || !subject || !body) {
@@ -22,8 +24,8 @@ const ComposeModal = ({ onClose, initialData }) => {
 
         try {
             setSending(true);
-            await api.sendNewEmail(to, subject, body);
-            addToast("Email sent successfully", "success");
+            await api.sendNewEmail(to, subject, body, idempotencyKey);
+            addToast("Email queued for sending", "success");
             onClose();
         } catch (error) {
             console.error(error);
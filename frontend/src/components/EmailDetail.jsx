@@ -14,6 +14,8 @@ const EmailDetail = ({ emailId, onClose, onCompose, onActionComplete }) => {
     const [generating, setGenerating] = useState(false);
     const [sending, setSending] = useState(false);
     const [toast, setToast] = useState(null);
+    // One key per reply, so a retried send is queued only once
+    const [replyKey, setReplyKey] = useState(() => crypto.randomUUID());
     const [tasks, setTasks] = useState(null);
     const [extracting, setExtracting] = useState(false);
     const [taskMessage, setTaskMessage] = useState(null);
@@ -21,6 +23,7 @@ const EmailDetail = ({ emailId, onClose, onCompose, onActionComplete }) => {
     useEffect(() => {
         if (emailId) {
             setReplyText(''); // Clear previous AI text or drafts
+            setReplyKey(crypto.randomUUID());
             setTasks(null);
             setTaskMessage(null);
             loadEmail();
@@ -152,8 +155,10 @@ const EmailDetail = ({ emailId, onClose, onCompose, onActionComplete }) => {
     const actuallySend = async () => {
         try {
             setToast({ state: 'sending' });
-            await api.sendReply(emailId, replyText);
-            setToast({ state: 'sent' });
+            await api.sendReply(emailId, replyText, replyKey);
+            // Delivery happens in the background
+            setToast({ state: 'queued' });
+            setReplyKey(crypto.randomUUID());
             setTimeout(() => {
                 onClose();
                 setToast(null);
@@ -404,6 +409,11 @@ const EmailDetail = ({ emailId, onClose, onCompose, onActionComplete }) => {
                             <button onClick={handleUndo} className={styles.undoLink}>Undo</button>
                         </div>
                     )}
+                    {toast?.state === 'queued' && (
+                        <div className={styles.toast} style={{ background: 'var(--success)' }}>
+                            <span>Reply queued for sending</span>
+                        </div>
+                    )}
                     {toast?.state === 'saved' && (
                         <div className={styles.toast} style={{ background: 'var(--success)' }}>
                             <span>Draft Saved!</span>
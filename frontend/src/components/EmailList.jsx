@@ -73,11 +73,17 @@ const EmailList = ({ type = 'inbox', onSelectEmail, onCompose }) => {
         try {
             setRefreshing(true);
             // addToast("Syncing...", "info"); // Optional, but rotation is enough visual feedback
-            const data = await api.fetchEmails(userEmail);
-            if (data && data.emails) {
-                await loadEmailsFromDB();
-                addToast("Inbox updated", "success");
+            // The sync runs as a background job; poll it until it finishes
+            let job = await api.fetchEmails(userEmail);
+            if (!job || !job.job_id) throw new Error(job?.error || 'Sync could not start');
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise((resolve) => setTimeout(resolve, 1500));
+                job = await api.getSyncJob(job.job_id);
             }
+            // 'skipped': another server worker is already syncing this inbox
+            if (!['succeeded', 'skipped'].includes(job.status)) throw new Error(job.error || 'Sync failed');
+            await loadEmailsFromDB();
+            addToast("Inbox updated", "success");
         } catch (err) {
             console.error("Refresh Error:", err);
             addToast("Sync failed", "error");
@@ -97,6 +103,33 @@ const EmailList = ({ type = 'inbox', onSelectEmail, onCompose }) => {
         }
     }, [userEmail, type, priorityFilter, refreshKey]);
 
+    // Reload when the server pushes a change instead of polling
+    useEffect(() => {
+        if (!userEmail || !['inbox', 'sent', 'archive', 'trash'].includes(type)) return;
+        return api.subscribeToEvents((event) => {
+            if (event.type === 'emails.new') {
+                addToast(`${event.emails.length} new email(s)`, 'info');
+                loadEmailsFromDB();
+            } else if (event.type === 'email.updated') {
+                loadEmailsFromDB();
+            } else if (event.type === 'emails.priority') {
+                if (priorityFilter !== 'All') {
+                    // Changed emails may move in or out of the filtered list
+                    loadEmailsFromDB();
+                } else {
+                    const changed = Object.fromEntries(event.emails.map((e) => [e.email_id, e.priority]));
+                    setEmails(prev => prev.map(em => em.email_id in changed ? { ...em, priority: changed[em.email_id] } : em));
+                }
+            } else if (event.type === 'outbound.updated') {
+                if (event.status === 'failed') {
+                    addToast(`Couldn't send "${event.subject}"`, 'error');
+                } else if (type === 'sent') {
+                    loadEmailsFromDB();
+                }
+            }
+        });
+    }, [userEmail, type, priorityFilter]);
+
     if (isError) return <div className={styles.error}>Connection error. Please retry.</div>;
 
     const priorities = ['All', 'High', 'Medium', 'Low'];
@@ -75,7 +75,8 @@ const Profile = () => {
             await api.savePreferences({
                 primary_role: role,
                 interests: myInterests,
-                about_user: about
+                about_user: about,
+                timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
             });
             addToast('Preferences saved successfully', 'success');
         } catch (e) {
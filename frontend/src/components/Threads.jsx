@@ -11,27 +11,33 @@ const Threads = () => {
     const [loading, setLoading] = useState(true);
     const [mode, setMode] = useState('category'); // subject, smart, sender, category, priority
     const [expanded, setExpanded] = useState({});
+    const [members, setMembers] = useState({}); // group key -> { emails, nextCursor }
+    const [nextCursor, setNextCursor] = useState(null);
 
     useEffect(() => {
         console.log(`Threads component mounted.User: ${userEmail}, Mode: ${mode} `);
+        setExpanded({});
+        setMembers({});
         if (userEmail) loadThreads();
     }, [userEmail, mode]);
 
-    const loadThreads = async () => {
+    const loadThreads = async (cursor = null) => {
         try {
-            setLoading(true);
+            setLoading(!cursor);
             console.log(`Loading threads for ${userEmail} in mode ${mode} `);
 
-            let data;
+            let data, page;
             if (mode === 'smart') {
-                data = await api.getSmartThreads(userEmail);
-                // Backend returns { smart_threads: [...] }
-                setThreads(data.smart_threads || []);
+                data = await api.getSmartThreads(userEmail, cursor);
+                // Backend returns { smart_threads: [...], next_cursor }
+                page = data.smart_threads || [];
             } else {
-                data = await api.getThreads(userEmail, mode);
-                // Backend returns { threads: [...] }
-                setThreads(data.threads || []);
+                data = await api.getThreads(userEmail, mode, cursor);
+                // Backend returns { threads: [...], next_cursor }
+                page = data.threads || [];
             }
+            setThreads(prev => cursor ? [...prev, ...page] : page);
+            setNextCursor(data.next_cursor || null);
             console.log("Threads loaded:", data);
         } catch (error) {
             console.error("Failed to load threads:", error);
@@ -40,7 +46,25 @@ const Threads = () => {
         }
     };
 
+    const loadMembers = async (key, cursor = null) => {
+        try {
+            const data = mode === 'smart'
+                ? await api.getSmartThreadEmails(key, cursor)
+                : await api.getThreadEmails(mode, key, cursor);
+            setMembers(prev => ({
+                ...prev,
+                [key]: {
+                    emails: [...(cursor ? prev[key]?.emails || [] : []), ...(data.emails || [])],
+                    nextCursor: data.next_cursor || null
+                }
+            }));
+        } catch (error) {
+            console.error("Failed to load thread emails:", error);
+        }
+    };
+
     const toggleExpand = (key) => {
+        if (!expanded[key] && !members[key]) loadMembers(key);
         setExpanded(prev => ({ ...prev, [key]: !prev[key] }));
     };
 
@@ -73,12 +97,12 @@ const Threads = () => {
                         threads.map((thread) => {
                             if (!thread) return null;
                             const key = thread.group_key || thread.smart_thread_id || Math.random().toString();
+                            const groupEmails = members[key]?.emails || [];
                             // Determine a human-readable title
                             let label = thread.group_key;
                             if (!label || label.startsWith('smart-') || label.startsWith('thread-')) {
                                 // If it's a technical ID, use the subject of the newest email as the thread title
-                                const newestEmail = thread.emails?.[0]; // Assuming sorted by newest first
-                                label = newestEmail?.subject || 'No Subject';
+                                label = thread.latest?.subject || 'No Subject';
                             }
                             // Fallback
                             if (!label) label = 'Unnamed Thread';
@@ -110,19 +134,19 @@ const Threads = () => {
                                             borderRadius: '12px',
                                             fontSize: '0.75rem'
                                         }}>
-                                            {thread.emails?.length || 0}
+                                            {thread.count || 0}
                                         </span>
                                     </div>
                                     {/* Preview of latest email if not expanded */}
-                                    {!expanded[key] && thread.emails?.length > 0 && (
+                                    {!expanded[key] && thread.latest && (
                                         <div style={{ marginLeft: '2.5rem', fontSize: '0.85rem', color: 'var(--text-secondary)', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis', paddingBottom: '0.5rem' }}>
-                                            {thread.emails[0].summary || thread.emails[0].subject}
+                                            {thread.latest.summary || thread.latest.subject}
                                         </div>
                                     )}
 
                                     {expanded[key] && (
                                         <div style={{ marginLeft: '1.5rem', marginTop: '0.5rem', display: 'flex', flexDirection: 'column', gap: '0.5rem' }}>
-                                            {thread.emails?.map(email => (
+                                            {groupEmails.map(email => (
                                                 <div
                                                     key={email.email_id || Math.random()}
                                                     className={styles.emailItem}
@@ -140,12 +164,22 @@ const Threads = () => {
                                                     </div>
                                                 </div>
                                             ))}
+                                            {members[key]?.nextCursor && (
+                                                <button className="btn-press" style={{ padding: '0.5rem', background: 'none', border: '1px solid var(--border)', borderRadius: '4px', cursor: 'pointer' }} onClick={() => loadMembers(key, members[key].nextCursor)}>
+                                                    Load more
+                                                </button>
+                                            )}
                                         </div>
                                     )}
                                 </div>
                             );
                         })
                     )}
+                    {nextCursor && (
+                        <button className="btn-press" style={{ padding: '0.5rem', background: 'none', border: '1px solid var(--border)', borderRadius: '4px', cursor: 'pointer' }} onClick={() => loadThreads(nextCursor)}>
+                            Load more threads
+                        </button>
+                    )}
                 </div>
             )}
         </div>
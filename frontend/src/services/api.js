@@ -50,13 +50,19 @@ export const api = {
 
     fetchEmails: (userEmail) => request(`/fetch-emails?user_email=${userEmail}`),
 
+    getSyncJob: (jobId) => request(`/sync-jobs/${jobId}`),
+
     getEmailsFromDB: (userEmail, priority = 'All', folder = 'inbox') => request(`/emails?user_email=${userEmail}&priority=${priority}&folder=${folder}`),
 
-    getThreads: (userEmail, mode = 'subject') => request(`/threads?user_email=${userEmail}&mode=${mode}`),
+    getThreads: (userEmail, mode = 'subject', cursor = null) => request(`/threads?user_email=${userEmail}&mode=${mode}${cursor ? `&cursor=${cursor}` : ''}`),
+
+    getThreadEmails: (mode, groupKey, cursor = null) => request(`/threads/emails?mode=${mode}&group_key=${encodeURIComponent(groupKey)}${cursor ? `&cursor=${cursor}` : ''}`),
 
-    getSmartThreads: (userEmail) => request(`/smart-threads?user_email=${userEmail}`),
+    getSmartThreads: (userEmail, cursor = null) => request(`/smart-threads?user_email=${userEmail}${cursor ? `&cursor=${cursor}` : ''}`),
 
-    getSearch: (userEmail, query) => request(`/search?user_email=${userEmail}&q=${encodeURIComponent(query)}`),
+    getSmartThreadEmails: (smartThreadId, cursor = null) => request(`/smart-threads/${encodeURIComponent(smartThreadId)}/emails${cursor ? `?cursor=${cursor}` : ''}`),
+
+    getSearch: (userEmail, query) => request(`/search?user_email=${userEmail}&q=${encodeURIComponent(query)}&body=true`),
 
     getEmail: (emailId) => request(`/email/${emailId}`),
 
@@ -85,10 +91,15 @@ export const api = {
     getDraft: (emailId, userEmail) => request(`/drafts?email_id=${emailId}&user_email=${userEmail}`),
 
     // Let's try sending as Query Params for all POSTs as per likely FastAPI default behavior for scalar args
-    sendReply: (emailId, replyText) => request(`/send-reply?email_id=${emailId}&reply_text=${encodeURIComponent(replyText)}`, { method: 'POST' }),
+    // idempotencyKey: reuse it when retrying so the email is queued only once
+    sendReply: (emailId, replyText, idempotencyKey) => request(`/send-reply?email_id=${emailId}&reply_text=${encodeURIComponent(replyText)}`, {
+        method: 'POST',
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}
+    }),
 
-    sendNewEmail: (to, subject, body) => request('/send-email', {
+    sendNewEmail: (to, subject, body, idempotencyKey) => request('/send-email', {
         method: 'POST',
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
         body: JSON.stringify({
             to_email: to,
             subject: subject,
@@ -96,7 +107,10 @@ export const api = {
         })
     }),
 
-    autoReply: (emailId, tone) => request(`/auto-reply?email_id=${emailId}&tone=${tone}`, { method: 'POST' }),
+    autoReply: (emailId, tone, idempotencyKey) => request(`/auto-reply?email_id=${emailId}&tone=${tone}`, {
+        method: 'POST',
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}
+    }),
 
     getUserAnalytics: (userEmail) => request(`/analytics/user?user_email=${userEmail}`),
 
@@ -130,6 +144,15 @@ export const api = {
         body: JSON.stringify({ reminder_time: reminderTime })
     }),
 
+    // Push updates (Server-Sent Events). Returns a function that closes the stream.
+    subscribeToEvents: (onEvent) => {
+        const source = new EventSource(`${API_BASE_URL}/events`, { withCredentials: true });
+        ['emails.new', 'email.updated', 'emails.priority', 'reminder.fired', 'outbound.updated'].forEach((type) => {
+            source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)));
+        });
+        return () => source.close();
+    },
+
     // Personalization
     getPreferences: () => request('/user/preferences'),
 